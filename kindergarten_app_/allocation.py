@@ -0,0 +1,114 @@
+"""
+Места на мероприятиях с ограниченной вместимостью (Event.capacity) и лист ожидания.
+
+Event.count_participants - число занятых мест, то есть записей со статусом registered.
+Место занимается одним условным UPDATE счётчика:
+
+    UPDATE event SET count_participants = count_participants + 1
+    WHERE id = %s AND (capacity IS NULL OR count_participants < capacity)
+      AND NOT EXISTS (ожидающая запись на это мероприятие с меньшим id)
+
+Проверка и увеличение выполняются в БД одним оператором, без SELECT ... FOR UPDATE и чтения
+счётчика в Python. Строка мероприятия блокируется с этого UPDATE до конца транзакции, поэтому
+транзакция записи состоит только из вставки и admit, а ответ API собирается после её фиксации.
+Если UPDATE не изменил строку, запись остаётся в листе ожидания (waitlisted). Очередь упорядочена по id записей. Условие NOT EXISTS не даёт
+новой записи занять место раньше тех, кто уже ждёт.
+
+Удаление занятой записи (отмена, админка, каскад) передаёт место в сигнале (release_seat) первому
+из листа ожидания, счётчик при этом не меняется. Первый ожидающий выбирается с FOR UPDATE SKIP LOCKED:
+блокируется строка записи из очереди, а не мероприятия, и параллельные отмены забирают разных
+ожидающих по порядку, не дожидаясь друг друга. Если ждущих нет, место освобождается уменьшением
+счётчика. После фиксации транзакции fill_seats переводит ожидающих на свободные места тем же условным
+UPDATE счётчика и UPDATE статуса с условием status = waitlisted. fill_seats вызывается и после записи
+в лист ожидания, и после изменения capacity: место, освободившееся, пока новая запись ещё не была
+видна, не пропадёт.
+"""
+from django.db import transaction
+from django.db.models import Exists, F, Q
+from django.utils import timezone
+
+from . import counters
+from .models import Event, ListParticipants, ParticipantStatus
+
+
+def _claim_seat(event_id, participant_id):
+    # Ожидающие с меньшим id стоят в очереди раньше записи participant_id
+    earlier = ListParticipants.objects.filter(event_id=event_id, status=ParticipantStatus.WAITLISTED,
+                                              id__lt=participant_id)
+    queryset = Event.objects.filter(Q(capacity__isnull=True) | Q(count_participants__lt=F('capacity')), id=event_id)
+    return queryset.filter(~Exists(earlier)).update(
+        count_participants=F('count_participants') + 1, updated_at=timezone.now()) == 1
+
+
+def _promote(participant_ids):
+    return ListParticipants.objects.filter(id__in=participant_ids, status=ParticipantStatus.WAITLISTED).update(
+        status=ParticipantStatus.REGISTERED, updated_at=timezone.now())
+
+
+def admit(created):
+    """
+    Занимает места для новых записей из register_for_parent: created - (id, event_id, child_id)
+    записей в листе ожидания. Вызывается в транзакции вставки: пока она не зафиксирована, записи
+    не видны другим запросам. Возвращает множество id записей, получивших место.
+    """
+    admitted, full = set(), set()
+    # Строки мероприятий блокируются в порядке id - параллельные пакетные записи не ждут друг друга по кругу
+    for participant_id, event_id, _ in sorted(created, key=lambda row: (row[1], row[0])):
+        # Статус меняется сразу: следующая запись пакета на то же мероприятие не должна ждать эту
+        if event_id not in full and _claim_seat(event_id, participant_id):
+            _promote([participant_id])
+            admitted.add(participant_id)
+        else:
+            full.add(event_id)
+    # Места могли освободиться, пока записи ещё не были видны отменам, - тогда их раздаст fill_seats
+    free = _with_free_seats(full)
+    if free:
+        schedule_fill(free)
+    return admitted
+
+
+def _with_free_seats(event_ids):
+    if not event_ids:
+        return []
+    return list(Event.objects.filter(Q(capacity__isnull=True) | Q(count_participants__lt=F('capacity')),
+                                     id__in=event_ids).values_list('id', flat=True))
+
+
+def release_seat(event_id):
+    """
+    Место удалённой занятой записи: отдаётся первому из листа ожидания или освобождается, если ждущих нет.
+    Возвращает id переведённой записи или None.
+    """
+    with transaction.atomic():
+        first = (ListParticipants.objects.select_for_update(skip_locked=True)
+                 .filter(event_id=event_id, status=ParticipantStatus.WAITLISTED)
+                 .order_by('id').values_list('id', flat=True).first())
+        if first is not None and _promote([first]):
+            return first
+        counters.participants_removed([event_id])
+    schedule_fill([event_id])
+    return None
+
+
+def schedule_fill(event_ids):
+    """Вызывает fill_seats после фиксации текущей транзакции."""
+    event_ids = sorted(set(event_ids))
+    transaction.on_commit(lambda: fill_seats(event_ids))
+
+
+def fill_seats(event_ids):
+    """Переводит ожидающих на свободные места мероприятий в порядке записи. Возвращает id переведённых."""
+    promoted = []
+    for event_id in sorted(set(event_ids)):
+        while True:
+            with transaction.atomic():
+                first = (ListParticipants.objects.filter(event_id=event_id, status=ParticipantStatus.WAITLISTED)
+                         .order_by('id').values_list('id', flat=True).first())
+                if first is None or not _claim_seat(event_id, first):
+                    break
+                if _promote([first]):
+                    promoted.append(first)
+                else:
+                    # Запись перевёл или удалил параллельный запрос - место возвращается
+                    counters.participants_removed([event_id])
+    return promoted
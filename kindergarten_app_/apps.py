@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class KindergartenAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'kindergarten_app_'
+
+    def ready(self):
+        from . import signals  # noqa: F401
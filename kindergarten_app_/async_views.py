@@ -0,0 +1,261 @@
+"""
+Асинхронные версии представлений для запуска через ASGI (kindergarten_project/asgi.py).
+
+Вход, регистрация и смена пароля выполняют PBKDF2 в ограниченном пуле hashing_pool,
+поэтому всплеск входов не занимает обработчики остальных запросов API.
+Представления чтения используют асинхронный ORM, и ожидание БД или медленного клиента
+не держит отдельный поток на каждое соединение.
+Ответы совпадают с синхронными представлениями из views.py.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from . import event_ranges, feeds
+from .authentication import CachedTokenAuthentication, token_cache
+from .conditional import async_conditional_view, event_validators, EVENT_VIEW_ROLES
+from .hashing import hashing_pool, HashingPoolBusy
+from .models import User, Group, Event, Parent, ParentsChilds, ListParticipants, ParticipantStatus
+from .pagination import apaginated_data
+from .serializers import UserSerializer, GroupSerializer, EventSerializer, ListParticipantsSerializer
+
+HASHING_RETRY_AFTER = 1
+
+
+def _json_response(data, status=200):
+    # Кириллица без \u-экранирования, как в JSONRenderer DRF
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _busy_response():
+    response = _json_response({'error': 'Сервер перегружен, повторите попытку позже'}, status=503)
+    response['Retry-After'] = str(HASHING_RETRY_AFTER)
+    return response
+
+
+def _invalid_body_response():
+    return _json_response({'error': 'Тело запроса должно быть JSON-объектом'}, status=400)
+
+
+def _not_found_response(model):
+    # Текст как у DRF для Http404 из get_object_or_404
+    return _json_response({'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
+
+
+def async_authenticated(view):
+    """Аналог @permission_classes([IsAuthenticated]) для async-представлений: ставит request.user или отвечает 401."""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        try:
+            result = await CachedTokenAuthentication().aauthenticate(request)
+        except exceptions.AuthenticationFailed as exc:
+            return _json_response({'detail': exc.detail}, status=401)
+        if result is None:
+            return _json_response({'detail': exceptions.NotAuthenticated.default_detail}, status=401)
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+@csrf_exempt
+@require_POST
+async def register_user_async(request):
+    data = _json_body(request)
+    if data is None:
+        return _invalid_body_response()
+
+    serializer = UserSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return _json_response(serializer.errors, status=400)
+
+    validated_data = dict(serializer.validated_data)
+    password = validated_data.pop('password')
+    try:
+        password_hash = await hashing_pool.make_password(password)
+    except HashingPoolBusy:
+        return _busy_response()
+    user = User(password=password_hash, **validated_data)
+    await user.asave()
+    return _json_response(UserSerializer(user).data, status=201)
+
+
+@csrf_exempt
+@require_POST
+async def user_login_async(request):
+    data = _json_body(request)
+    if data is None:
+        return _invalid_body_response()
+
+    username = data.get('username')
+    password = data.get('password')
+    if not username or not isinstance(password, str):
+        return _json_response({'error': 'Invalid credentials'}, status=401)
+
+    user = await User.objects.filter(username=username).only('id', 'password', 'is_active').afirst()
+    try:
+        if user is None:
+            # Хешируем и для несуществующего пользователя, чтобы время ответа не выдавало имена (как ModelBackend)
+            await hashing_pool.make_password(password)
+            valid = False
+        else:
+            valid = await hashing_pool.check_password(password, user.password)
+    except HashingPoolBusy:
+        return _busy_response()
+
+    if not valid or not user.is_active:
+        return _json_response({'error': 'Invalid credentials'}, status=401)
+    token, created = await Token.objects.aget_or_create(user=user)
+    return _json_response({'token': token.key}, status=200)
+
+
+@csrf_exempt
+@require_POST
+@async_authenticated
+async def change_password_async(request):
+    user = request.user
+
+    data = _json_body(request)
+    if data is None:
+        return _invalid_body_response()
+
+    old_password = data.get('old_password')
+    new_password = data.get('new_password')
+    new_password_confirm = data.get('new_password_confirm')
+
+    if not old_password or not new_password or not new_password_confirm:
+        return _json_response({'error': 'Все поля обязательны'}, status=400)
+
+    if new_password != new_password_confirm:
+        return _json_response({'error': 'Новый пароль и подтверждение не совпадают'}, status=400)
+
+    # Пользователь из кэша токенов загружен без пароля, читаем хеш отдельным запросом
+    current_hash = await User.objects.filter(pk=user.pk).values_list('password', flat=True).aget()
+    try:
+        if not await hashing_pool.check_password(old_password, current_hash):
+            return _json_response({'error': 'Старый пароль указан неверно'}, status=400)
+        new_hash = await hashing_pool.make_password(new_password)
+    except HashingPoolBusy:
+        return _busy_response()
+
+    await User.objects.filter(pk=user.pk).aupdate(password=new_hash)
+    token_cache.invalidate_user(user.pk)
+
+    return _json_response({'success': 'Пароль успешно изменен'}, status=200)
+
+
+@require_GET
+@async_authenticated
+async def list_groups_async(request):
+    if request.user.role not in ['Admin', 'Employee']:
+        return _json_response({'error': 'Доступ запрещен'}, status=403)
+
+    groups = GroupSerializer.optimize_queryset(Group.objects.all(), request)
+    page = await apaginated_data(request, groups, GroupSerializer)
+    if page is not None:
+        return _json_response(page)
+
+    serializer = GroupSerializer([group async for group in groups], many=True, context={'request': request})
+    return _json_response(serializer.data)
+
+
+@require_GET
+@async_authenticated
+@async_conditional_view(event_validators, roles=EVENT_VIEW_ROLES)
+async def get_event_async(request, event_id):
+    if request.user.role not in EVENT_VIEW_ROLES:
+        return _json_response({'error': 'Доступ запрещён'}, status=403)
+
+    try:
+        event = await EventSerializer.optimize_queryset(Event.objects.all(), request).aget(id=event_id)
+    except Event.DoesNotExist:
+        return _not_found_response(Event)
+    return _json_response(EventSerializer(event, context={'request': request}).data)
+
+
+@require_GET
+@async_authenticated
+async def get_events_by_parent_async(request):
+    if request.user.role != 'Parent':
+        return _json_response({'error': 'Доступ запрещён'}, status=403)
+
+    try:
+        start, end = event_ranges.parse_range(request.GET)
+    except event_ranges.RangeError as error:
+        return _json_response({'error': str(error)}, status=400)
+
+    # Попадание в кэш ленты не обращается к БД; один переход в поток дешевле,
+    # чем отдельные асинхронные обращения к кэшу (у бэкендов кэша Django они тоже идут через поток)
+    try:
+        events = await sync_to_async(feeds.get_parent_event_feed)(request.user.id, start, end)
+    except Parent.DoesNotExist:
+        return _json_response({'error': 'Родитель не определён'}, status=400)
+
+    if events is None:
+        return _json_response({'error': 'У родителя нет детей'}, status=404)
+
+    return _json_response(events)
+
+
+@require_GET
+@async_authenticated
+async def get_group_by_parent_async(request):
+    if request.user.role != 'Parent':
+        return _json_response({'error': 'Доступ запрещён'}, status=403)
+
+    parent_id = await Parent.objects.filter(user_id=request.user.id).values_list('id', flat=True).afirst()
+    if parent_id is None:
+        return _json_response({'error': 'Родитель не определён'}, status=400)
+
+    child_ids = [child_id async for child_id in
+                 ParentsChilds.objects.filter(parent_id=parent_id).values_list('child_id', flat=True)]
+    if not child_ids:
+        return _json_response({'error': 'У родителя нет детей'}, status=404)
+
+    groups = GroupSerializer.optimize_queryset(Group.objects.filter(child__id__in=child_ids).distinct(), request)
+    groups = [group async for group in groups]
+    if not groups:
+        return _json_response({'error': 'Группы не найдены'}, status=404)
+
+    serializer = GroupSerializer(groups, many=True, context={'request': request})
+    return _json_response(serializer.data)
+
+
+@require_GET
+@async_authenticated
+async def participants_list_by_event_async(request, event_id):
+    if request.user.role != 'Employee':
+        return _json_response({'error': 'Доступ запрещён'}, status=403)
+
+    if not await Event.objects.filter(id=event_id).aexists():
+        return _json_response({'error': 'Мероприятие не найдено'}, status=404)
+
+    participants = ListParticipants.objects.filter(event_id=event_id)
+    participant_status = request.GET.get('status')
+    if participant_status:
+        if participant_status not in ParticipantStatus.values:
+            return _json_response({'error': f'Параметр status должен быть одним из: {", ".join(ParticipantStatus.values)}'},
+                                  status=400)
+        participants = participants.filter(status=participant_status)
+    participants = ListParticipantsSerializer.optimize_queryset(participants, request)
+    page = await apaginated_data(request, participants, ListParticipantsSerializer)
+    if page is not None:
+        return _json_response(page)
+
+    # async for выполняет запрос вместе с prefetch_related в одном переходе в поток
+    serializer = ListParticipantsSerializer([participant async for participant in participants], many=True,
+                                            context={'request': request})
+    return _json_response(serializer.data)
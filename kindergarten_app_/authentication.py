@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+# Поля пользователя, которые хранятся в кэше. Остальные поля остаются
+# отложенными (deferred) и подгружаются из БД только при обращении к ним.
+CACHED_USER_FIELDS = ('id', 'username', 'role', 'is_active')
+
+
+class TokenCache:
+    """Потокобезопасный LRU-кэш token -> данные пользователя с ограничением по времени жизни."""
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, user_data):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user_data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [k for k, (_, data) in self._entries.items() if data['id'] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_config = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+token_cache = TokenCache(max_size=_config.get('MAX_SIZE', 10000), ttl=_config.get('TTL', 60))
+
+
+def _user_from_cache(user_data):
+    # from_db создаёт объект так же, как ORM после SELECT по части полей
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in user_data]
+    return User.from_db('default', fields, [user_data[name] for name in fields])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который не обращается к БД, если токен уже есть в кэше.
+    Записи сбрасываются сигналами при сохранении и удалении пользователя и удалении токена
+    (signals.py), а обновления в обход сигналов (смена пароля в async_views) сбрасывают их явно.
+    В остальных процессах запись живёт не дольше TOKEN_AUTH_CACHE['TTL'] секунд.
+    """
+
+    def authenticate_credentials(self, key):
+        user_data = token_cache.get(key)
+        if user_data is None:
+            return self._load_credentials(key)
+        return self._cached_credentials(key, user_data)
+
+    def _load_credentials(self, key):
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, {name: getattr(user, name) for name in CACHED_USER_FIELDS})
+        return user, token
+
+    def _cached_credentials(self, key, user_data):
+        user = _user_from_cache(user_data)
+        return user, Token(key=key, user=user)
+
+    async def aauthenticate(self, request):
+        """
+        authenticate для async-представлений. При попадании в кэш токенов обходится без БД
+        и без потока sync_to_async; промах и некорректный заголовок обрабатываются синхронным кодом DRF.
+        """
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            return await sync_to_async(self.authenticate)(request)
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            return await sync_to_async(self.authenticate)(request)
+
+        user_data = token_cache.get(key)
+        if user_data is None:
+            return await sync_to_async(self._load_credentials)(key)
+        return self._cached_credentials(key, user_data)
@@ -0,0 +1,237 @@
+"""
+Пакет запросов к API одним HTTP-запросом: api/batch/.
+
+Тело - упорядоченный список операций к маршрутам из urls.py:
+
+    {"atomic": true, "operations": [
+        {"id": "parent", "method": "POST", "path": "/api/parent/add/", "body": {...}},
+        {"id": "child", "method": "POST", "path": "/api/child/add/",
+         "body": {"child": {...}, "parent_id": "{{parent.id}}"}},
+        {"method": "GET", "path": "/api/child/{{child.id}}/?fields=id,lname"}
+    ]}
+
+Операции выполняются по порядку от имени пользователя пакета: представление маршрута вызывается
+напрямую с уже проверенным пользователем, без повторной аутентификации и без middleware.
+Права проверяет каждое представление, как при отдельном запросе. Ответ - {"results": [...]}
+со статусом и телом каждой операции.
+
+Ссылка {{id.путь}} в path или в строках body подставляет значение из тела ответа более ранней
+операции с этим id: путь - ключи словарей и номера элементов списков через точку. Строка, которая
+целиком состоит из ссылки, заменяется значением как есть (число остаётся числом). Ссылка на
+неуспешную операцию или на отсутствующий ключ делает операцию неуспешной (400) без её выполнения.
+
+Каждая операция выполняется в своей транзакции (в пакете с atomic - в точке сохранения):
+исключение представления откатывает только её изменения, и операция получает статус 500.
+Без atomic каждая операция фиксируется сама, как отдельный запрос, и ошибка одной не останавливает
+следующие. С atomic: true пакет выполняется в одной транзакции: первая неуспешная операция
+откатывает все изменения, оставшиеся операции не выполняются, ответ - 400. В таком пакете
+допускаются только изменяющие методы: чтение внутри транзакции заполнило бы кэши лент и поиска
+(feeds.py, search.py) данными, которые затем откатятся.
+"""
+import io
+import json
+import logging
+import re
+from dataclasses import dataclass
+from urllib.parse import unquote_to_bytes, urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from django.utils.encoding import iri_to_uri
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+BATCH_MAX_OPERATIONS = 50
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+# Вход и смена учётных данных, выгрузки файлов и загрузка через multipart в пакет не входят
+EXCLUDED_ROUTES = {
+    'batch', 'register', 'login', 'logout', 'change_password', 'import_roster_file',
+    'export_children', 'export_event_participants', 'export_employees',
+}
+# Заголовки пакета, которые не передаются операциям: тело и условный GET у каждой операции свои
+_SKIPPED_HEADERS = ('HTTP_IF_', 'HTTP_CONTENT_')
+_COPIED_META = ('SERVER_NAME', 'SERVER_PORT', 'REMOTE_ADDR', 'SERVER_PROTOCOL', 'wsgi.url_scheme')
+
+# Исключения операций записываются туда же, куда Django пишет ошибки 500 отдельных запросов
+logger = logging.getLogger('django.request')
+
+_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+_REFERENCE = re.compile(r'\{\{\s*([A-Za-z0-9_-]+)((?:\.[A-Za-z0-9_-]+)*)\s*\}\}')
+
+
+class BatchError(ValueError):
+    pass
+
+
+@dataclass
+class Operation:
+    index: int
+    id: str
+    method: str
+    path: str
+    body: object = None
+
+
+def _route(path):
+    """Представление DRF для пути операции. BatchError, если маршрута нет или он не допускается в пакете."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        raise BatchError(f'Маршрут {path} не найден')
+    # Представления @api_view имеют атрибут cls; календарь и async-представления отдают ответ не DRF
+    if match.url_name in EXCLUDED_ROUTES or not hasattr(match.func, 'cls'):
+        raise BatchError(f'Маршрут {path} не поддерживается в пакете')
+    return match
+
+
+def parse_operations(data):
+    """(operations, atomic) из тела запроса. BatchError при неверном описании пакета."""
+    if not isinstance(data, dict):
+        raise BatchError('Тело запроса должно быть объектом с полем operations')
+    atomic = data.get('atomic', False)
+    if not isinstance(atomic, bool):
+        raise BatchError('atomic должен быть true или false')
+    items = data.get('operations')
+    if not isinstance(items, list) or not items:
+        raise BatchError('operations должен быть непустым списком')
+    if len(items) > BATCH_MAX_OPERATIONS:
+        raise BatchError(f'В пакете не больше {BATCH_MAX_OPERATIONS} операций')
+
+    operations, ids = [], set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BatchError(f'Операция {index}: ожидается объект с method и path')
+        operation_id = item.get('id')
+        if operation_id is not None:
+            if not isinstance(operation_id, str) or not _ID.match(operation_id):
+                raise BatchError(f'Операция {index}: id - строка из латинских букв, цифр, _ и -')
+            if operation_id in ids:
+                raise BatchError(f'Операция {index}: id {operation_id} уже используется')
+            ids.add(operation_id)
+        method = str(item.get('method', '')).upper()
+        if method not in BATCH_METHODS:
+            raise BatchError(f'Операция {index}: method должен быть одним из: {", ".join(BATCH_METHODS)}')
+        if atomic and method not in WRITE_METHODS:
+            raise BatchError(f'Операция {index}: в пакете с atomic допускаются только {", ".join(WRITE_METHODS)}')
+        path = item.get('path')
+        if not isinstance(path, str) or not path.startswith('/api/'):
+            raise BatchError(f'Операция {index}: path должен начинаться с /api/')
+        if '{{' not in path:
+            # Путь со ссылками проверяется при выполнении, после подстановки
+            try:
+                _route(path)
+            except BatchError as error:
+                raise BatchError(f'Операция {index}: {error}')
+        operations.append(Operation(index, operation_id, method, path, item.get('body')))
+    return operations, atomic
+
+
+def _lookup(results, operation_id, keys):
+    result = results.get(operation_id)
+    if result is None:
+        raise BatchError(f'Ссылка на неизвестную или ещё не выполненную операцию {operation_id}')
+    if result['status'] >= 400:
+        raise BatchError(f'Операция {operation_id} завершилась ошибкой')
+    value = result['body']
+    for key in keys:
+        if isinstance(value, dict) and key in value:
+            value = value[key]
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            raise BatchError(f'В ответе операции {operation_id} нет {".".join(keys)}')
+    return value
+
+
+def _substitute(value, results):
+    """Подставляет ссылки {{id.путь}} во все строки value."""
+    if isinstance(value, dict):
+        return {key: _substitute(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, results) for item in value]
+    if not isinstance(value, str) or '{{' not in value:
+        return value
+
+    def resolve_match(match):
+        return _lookup(results, match.group(1), [key for key in match.group(2).split('.') if key])
+
+    whole = _REFERENCE.fullmatch(value.strip())
+    if whole:
+        return resolve_match(whole)
+    return _REFERENCE.sub(lambda match: str(resolve_match(match)), value)
+
+
+def _sub_request(request, method, path, body):
+    split = urlsplit(path)
+    content = b'' if body is None else json.dumps(body, cls=JSONEncoder).encode()
+    environ = {key: value for key, value in request.META.items()
+               if key.startswith('HTTP_') and not key.startswith(_SKIPPED_HEADERS) or key in _COPIED_META}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        # Значения окружения WSGI - байты в строке latin-1, запрос - в процентной кодировке
+        'PATH_INFO': unquote_to_bytes(split.path).decode('iso-8859-1'),
+        'QUERY_STRING': iri_to_uri(split.query),
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': io.BytesIO(content),
+    })
+    environ.setdefault('wsgi.url_scheme', request.scheme)
+    sub_request = WSGIRequest(environ)
+    # Пользователь уже аутентифицирован запросом пакета - DRF возьмёт его без обращения к токенам
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def _run(request, operation, results):
+    try:
+        path = _substitute(operation.path, results)
+        body = _substitute(operation.body, results)
+        match = _route(path)
+    except BatchError as error:
+        return {'status': 400, 'body': {'error': str(error)}}
+    try:
+        # Своя точка сохранения: исключение представления откатывает только изменения этой операции
+        with transaction.atomic():
+            response = match.func(_sub_request(request, operation.method, path, body), *match.args, **match.kwargs)
+    except Exception:
+        logger.exception('Операция %s пакета: ошибка при выполнении %s %s', operation.index, operation.method, path)
+        return {'status': 500, 'body': {'error': 'Внутренняя ошибка сервера'}}
+    if not isinstance(response, Response):
+        return {'status': 400, 'body': {'error': f'Ответ маршрута {path} нельзя включить в пакет'}}
+    return {'status': response.status_code, 'body': response.data}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def execute(request, operations, atomic):
+    """
+    Выполняет операции пакета. Возвращает (results, failed): failed - номер операции, которая
+    откатила пакет с atomic, иначе None.
+    """
+    results, by_id = [], {}
+
+    def run_all():
+        for operation in operations:
+            result = _run(request, operation, by_id)
+            if operation.id is not None:
+                by_id[operation.id] = result
+                result = {'id': operation.id, **result}
+            results.append(result)
+            if atomic and result['status'] >= 400:
+                raise _Rollback(operation.index)
+
+    if not atomic:
+        run_all()
+        return results, None
+    try:
+        with transaction.atomic():
+            run_all()
+    except _Rollback as rollback:
+        return results, rollback.args[0]
+    return results, None
@@ -0,0 +1,632 @@
+"""
+Нагрузочный прогон всех маршрутов API (manage.py benchmark_api).
+
+Заполняет базу синтетическими данными, затем вызывает каждый маршрут из urls.py
+через тестовый клиент Django с токеном пользователя нужной роли и считает
+задержки (p50/p95/p99), число SQL-запросов на запрос и пропускную способность.
+run_concurrency_comparison сравнивает синхронные представления чтения с их async-вариантами
+при нескольких одновременных запросах через ASGI-обработчик (AsyncClient).
+run_connection_modes сравнивает задержку коротких запросов при новом соединении на каждый запрос,
+постоянных соединениях (CONN_MAX_AGE) и пуле psycopg.
+run_signup_benchmark проверяет распределение мест (allocation.py) при сотнях одновременных записей
+на одно мероприятие с ограниченной вместимостью и последующих отменах.
+"""
+import asyncio
+import datetime
+import math
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import django
+from asgiref.sync import sync_to_async
+from django.db import connection, connections, close_old_connections, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import allocation, ical
+from .dataset import GeneratorConfig, generate
+from .models import User, Parent, Employee, EducationalProgram, Group, Child, Event, QualificationEmployees, \
+    AgeGroups, Roles, ParentsChilds, ListParticipants, ParticipantStatus
+
+BENCH_PASSWORD = 'bench-password-1'
+BENCH_PASSWORD_ALT = 'bench-password-2'
+
+
+@dataclass
+class DatasetConfig:
+    groups: int = 10
+    parents: int = 400
+    children: int = 500
+    events: int = 50
+    participants_per_event: int = 20
+    seed: int = 1
+
+
+@dataclass
+class BenchContext:
+    """Объекты, на которые ссылаются маршруты (id, клиенты по ролям)."""
+    clients: dict
+    admin: User
+    employee: Employee
+    parent: Parent
+    child: Child
+    group: Group
+    program: EducationalProgram
+    event: Event
+    password_user: User
+    event_ids: list
+    password: str = BENCH_PASSWORD
+    counter: int = 0
+    # Мероприятие, подготовленное prepare для следующего вызова записи или отмены
+    target_event_id: Optional[int] = None
+
+    def next(self):
+        self.counter += 1
+        return self.counter
+
+
+@dataclass
+class Route:
+    name: str
+    method: str
+    role: Optional[str]
+    kwargs: Callable[[BenchContext], dict] = lambda ctx: {}
+    query: Callable[[BenchContext], dict] = lambda ctx: {}  # параметры строки запроса
+    payload: Optional[Callable[[BenchContext], dict]] = None
+    prepare: Optional[Callable[[BenchContext], None]] = None
+    format: str = 'json'  # multipart - для загрузки файлов
+    # Причина, по которой маршрут не замеряется: ответ с ошибкой не даёт осмысленной задержки
+    skip: Optional[str] = None
+
+
+def seed_dataset(config):
+    """Заполняет пустую базу генератором dataset.generate и возвращает BenchContext."""
+    result = generate(GeneratorConfig(
+        parents=config.parents, children=config.children, groups=config.groups,
+        programs=max(1, config.groups // 2), employees=max(1, config.groups // 2), events=config.events,
+        participants_per_event=config.participants_per_event, seed=config.seed, password=BENCH_PASSWORD,
+        prefix='bench',
+    ))
+    admin = User.objects.get(id=result.admin_user_ids[0])
+    employee = Employee.objects.select_related('user').get(id=result.employee_ids[0])
+    # Родитель с ребёнком, чтобы маршруты родителя возвращали данные
+    parent = Parent.objects.select_related('user').filter(parentschilds__isnull=False).order_by('id').first()
+    return make_context(admin, employee, parent, result.event_ids)
+
+
+def make_context(admin, employee, parent, event_ids):
+    child = Child.objects.filter(parentschilds__parent=parent).first()
+    password_user = User.objects.create_user(username='bench_password_user', password=BENCH_PASSWORD,
+                                             role=Roles.PARENT)
+    clients = {
+        Roles.ADMIN: _client_for(admin),
+        Roles.EMPLOYEE: _client_for(employee.user),
+        Roles.PARENT: _client_for(parent.user),
+        None: APIClient(raise_request_exception=False),
+        'password_user': _client_for(password_user),
+    }
+    program = child.group.educational_program
+    event = Event.objects.filter(listsevents__educational_program=program).first() or Event.objects.get(id=event_ids[0])
+    return BenchContext(clients=clients, admin=admin, employee=employee, parent=parent, child=child,
+                        group=child.group, program=program, event=event, password_user=password_user,
+                        event_ids=event_ids)
+
+
+def _client_for(user):
+    client = APIClient(raise_request_exception=False)
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def _child_payload(ctx):
+    n = ctx.next()
+    return {'fname': 'Пётр', 'lname': f'Новый{n}', 'gender': True, 'birthday': '2021-05-01',
+            'group': ctx.group.id, 'transfer_date': '2024-09-01'}
+
+
+def _user_payload(ctx, role):
+    return {'username': f'bench_new_{ctx.next()}', 'password': BENCH_PASSWORD, 'role': role}
+
+
+def _rotate_password(ctx):
+    # Пароль меняется по кругу между двумя значениями
+    old = ctx.password
+    new = BENCH_PASSWORD_ALT if old == BENCH_PASSWORD else BENCH_PASSWORD
+    ctx.password = new
+    return {'old_password': old, 'new_password': new, 'new_password_confirm': new}
+
+
+def _fresh_token(ctx):
+    # logout удаляет токен, поэтому перед каждым вызовом выдаём новый (вне замера)
+    Token.objects.filter(user=ctx.password_user).delete()
+    token = Token.objects.create(user=ctx.password_user)
+    ctx.clients['password_user'].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+def _roster_upload(ctx, rows=20):
+    # Ростер CSV с детьми существующего родителя в группе контекста (edit_group меняет её название)
+    group_name = Group.objects.values_list('name', flat=True).get(id=ctx.group.id)
+    lines = ['fname,lname,gender,birthday,group,transfer_date,parent_phone']
+    lines += [f'Пётр,Импорт{ctx.next()},м,2021-05-01,{group_name},2024-09-01,{ctx.parent.phone_number}'
+              for _ in range(rows)]
+    return {'file': SimpleUploadedFile('roster.csv', '\n'.join(lines).encode(), content_type='text/csv')}
+
+
+def _free_qualification(ctx):
+    # Квалификация сотрудника уникальна: удаляем сотрудника, добавленного предыдущим вызовом (вне замера)
+    User.objects.filter(employee__qualification=QualificationEmployees.values[-1],
+                        username__startswith='bench_new_').delete()
+
+
+def _next_event(ctx):
+    ctx.target_event_id = ctx.event_ids[ctx.next() % len(ctx.event_ids)]
+    return ctx.target_event_id
+
+
+def _unregistered_event(ctx):
+    # Ребёнок ещё не записан на мероприятие следующего вызова записи
+    ListParticipants.objects.filter(child=ctx.child, event_id=_next_event(ctx)).delete()
+
+
+def _registered_event(ctx):
+    # Ребёнок записан на мероприятие следующего вызова отмены
+    with transaction.atomic():
+        allocation.admit(ListParticipants.objects.register_for_parent(
+            ctx.parent.id, [(ctx.child.id, _next_event(ctx))]))
+
+
+ROUTES = [
+    Route('register', 'post', None, payload=lambda ctx: _user_payload(ctx, Roles.PARENT)),
+    Route('login', 'post', None, payload=lambda ctx: {'username': ctx.admin.username, 'password': BENCH_PASSWORD}),
+    Route('add_employee', 'post', Roles.ADMIN, prepare=_free_qualification, payload=lambda ctx: {
+        'user': _user_payload(ctx, Roles.EMPLOYEE),
+        'employee': {'fname': 'Олег', 'lname': 'Новый', 'gender': True, 'birthday': '1990-01-01',
+                     'phone_number': 82000000000 + ctx.next(), 'qualification': QualificationEmployees.values[-1],
+                     'work_experience': 1}}),
+    Route('add_parent', 'post', Roles.ADMIN, payload=lambda ctx: {
+        'user': _user_payload(ctx, Roles.PARENT),
+        'parent': {'fname': 'Ольга', 'lname': 'Новая', 'phone_number': 83000000000 + ctx.next()}}),
+    Route('list_parents', 'get', Roles.ADMIN),
+    Route('edit_parent', 'patch', Roles.ADMIN, kwargs=lambda ctx: {'parent_id': ctx.parent.id},
+          payload=lambda ctx: {'patronymic': f'Отчество{ctx.next()}'}),
+    Route('list_employees', 'get', Roles.EMPLOYEE),
+    Route('get_employee_by_user_id', 'get', Roles.EMPLOYEE, kwargs=lambda ctx: {'user_id': ctx.employee.user_id}),
+    Route('edit_employee', 'patch', Roles.ADMIN, kwargs=lambda ctx: {'employee_id': ctx.employee.id},
+          payload=lambda ctx: {'work_experience': ctx.next() % 40}),
+    Route('get_parent_by_user_id', 'get', Roles.ADMIN, kwargs=lambda ctx: {'user_id': ctx.parent.user_id}),
+    Route('create_educational_program', 'post', Roles.EMPLOYEE,
+          payload=lambda ctx: {'description': f'Новая программа {ctx.next()}', 'age_category_children': 4}),
+    Route('get_education_program_by_id', 'get', Roles.EMPLOYEE, kwargs=lambda ctx: {'program_id': ctx.program.id}),
+    Route('create_group', 'post', Roles.ADMIN,
+          payload=lambda ctx: {'name': f'Новая группа {ctx.next()}', 'age_group': AgeGroups.JUNIOR},
+          skip='create_group отвечает 500: educational_program в GroupSerializer только для чтения, '
+               'а столбец обязателен'),
+    Route('list_groups', 'get', Roles.EMPLOYEE),
+    Route('get_group_by_id', 'get', Roles.EMPLOYEE, kwargs=lambda ctx: {'group_id': ctx.group.id}),
+    Route('edit_group', 'patch', Roles.ADMIN, kwargs=lambda ctx: {'group_id': ctx.group.id},
+          payload=lambda ctx: {'name': f'Группа {ctx.group.id}-{ctx.next()}'}),
+    Route('add_child', 'post', Roles.ADMIN, payload=lambda ctx: {
+        'child': _child_payload(ctx), 'parent_id': ctx.parent.id}),
+    Route('add_children_bulk', 'post', Roles.ADMIN, payload=lambda ctx: {'children': [
+        {'child': _child_payload(ctx), 'parent_id': ctx.parent.id} for _ in range(20)]}),
+    Route('import_roster_file', 'post', Roles.ADMIN, payload=_roster_upload, format='multipart'),
+    Route('get_child', 'get', Roles.EMPLOYEE, kwargs=lambda ctx: {'child_id': ctx.child.id}),
+    Route('list_children', 'get', Roles.EMPLOYEE),
+    Route('edit_child', 'patch', Roles.ADMIN, kwargs=lambda ctx: {'child_id': ctx.child.id},
+          payload=lambda ctx: {'patronymic': f'Отчество{ctx.next()}'}),
+    Route('assign_employee_role', 'post', Roles.ADMIN, payload=lambda ctx: {
+        'group_id': ctx.group.id, 'employee_id': ctx.employee.id, 'role': QualificationEmployees.TEACHER}),
+    Route('create_event', 'post', Roles.EMPLOYEE, payload=lambda ctx: {
+        'educational_program_id': ctx.program.id,
+        'event': {'name': f'Новое мероприятие {ctx.next()}', 'date_event': '2030-01-01T10:00:00Z'}}),
+    Route('events_by_educational_program', 'get', Roles.EMPLOYEE,
+          kwargs=lambda ctx: {'educational_program_id': ctx.program.id}),
+    Route('view_event_by_id_for_parent', 'get', Roles.PARENT, kwargs=lambda ctx: {'event_id': ctx.event.id}),
+    Route('edit_event', 'patch', Roles.EMPLOYEE, kwargs=lambda ctx: {'event_id': ctx.event.id},
+          payload=lambda ctx: {'name': f'Мероприятие {ctx.event.id}-{ctx.next()}'}),
+    Route('events_by_parent_children_groups', 'get', Roles.PARENT),
+    Route('group_info_by_parent_children', 'get', Roles.PARENT),
+    # Каждый вызов записывает ребёнка на следующее мероприятие, запись перед вызовом удаляется
+    Route('add_child_to_additional_event', 'post', Roles.PARENT, prepare=_unregistered_event,
+          payload=lambda ctx: {'child_id': ctx.child.id, 'event_id': ctx.target_event_id}),
+    # Каждый вызов отменяет запись, созданную перед ним
+    Route('cancel_event_participation', 'post', Roles.PARENT, prepare=_registered_event,
+          payload=lambda ctx: {'child_id': ctx.child.id, 'event_id': ctx.target_event_id}),
+    Route('participants_list_by_event', 'get', Roles.EMPLOYEE, kwargs=lambda ctx: {'event_id': ctx.event.id}),
+    # Выгрузки CSV читаются целиком (run_route дочитывает потоковое тело)
+    Route('export_children', 'get', Roles.EMPLOYEE),
+    Route('export_event_participants', 'get', Roles.EMPLOYEE, kwargs=lambda ctx: {'event_id': ctx.event.id}),
+    Route('export_employees', 'get', Roles.EMPLOYEE, query=lambda ctx: {'file_type': 'xlsx'}),
+    # Добавление родителя и чтение его по user_id из ответа первой операции одним запросом
+    Route('batch', 'post', Roles.ADMIN, payload=lambda ctx: {'operations': [
+        {'id': 'parent', 'method': 'POST', 'path': '/api/parent/add/', 'body': {
+            'user': _user_payload(ctx, Roles.PARENT),
+            'parent': {'fname': 'Ольга', 'lname': 'Пакетная', 'phone_number': 84000000000 + ctx.next()}}},
+        {'method': 'GET', 'path': '/api/parent/list/{{parent.user_id}}/'}]}),
+    Route('calendar_token', 'get', Roles.PARENT),
+    # Лента календаря открывается без заголовка авторизации, по токену в ссылке
+    Route('calendar_feed', 'get', None, query=lambda ctx: {'token': ical.calendar_token(ctx.parent.user)}),
+    # Фамилия с опечаткой: префикс не совпадает, поэтому выполняется и нечёткий поиск
+    Route('search_people', 'get', Roles.EMPLOYEE, query=lambda ctx: {'q': ctx.parent.lname[:-1] + 'ъ'}),
+    # Первая страница полной выборки сотрудника - самый тяжёлый ответ синхронизации
+    Route('sync_changes', 'get', Roles.EMPLOYEE),
+    Route('change_password', 'post', 'password_user', payload=_rotate_password),
+    Route('logout', 'post', 'password_user', prepare=_fresh_token),
+    Route('query_stats', 'get', Roles.ADMIN),
+    Route('register_async', 'post', None, payload=lambda ctx: _user_payload(ctx, Roles.PARENT)),
+    Route('login_async', 'post', None,
+          payload=lambda ctx: {'username': ctx.admin.username, 'password': BENCH_PASSWORD}),
+    # logout выше удаляет токен password_user, поэтому перед вызовом выдаём новый
+    Route('change_password_async', 'post', 'password_user', payload=_rotate_password, prepare=_fresh_token),
+    Route('list_groups_async', 'get', Roles.EMPLOYEE),
+    Route('view_event_by_id_for_parent_async', 'get', Roles.PARENT, kwargs=lambda ctx: {'event_id': ctx.event.id}),
+    Route('events_by_parent_children_groups_async', 'get', Roles.PARENT),
+    Route('group_info_by_parent_children_async', 'get', Roles.PARENT),
+    Route('participants_list_by_event_async', 'get', Roles.EMPLOYEE,
+          kwargs=lambda ctx: {'event_id': ctx.event.id}),
+]
+
+# Короткие запросы, на которых заметна стоимость установки соединения (run_connection_modes)
+SHORT_ROUTES = ['view_event_by_id_for_parent', 'get_group_by_id', 'get_education_program_by_id',
+                'get_employee_by_user_id']
+
+CONNECTION_MODES = ('new', 'persistent', 'pool')
+
+# Пары (синхронный маршрут, async-вариант) для run_concurrency_comparison
+ASYNC_PAIRS = [
+    ('list_groups', 'list_groups_async'),
+    ('view_event_by_id_for_parent', 'view_event_by_id_for_parent_async'),
+    ('events_by_parent_children_groups', 'events_by_parent_children_groups_async'),
+    ('group_info_by_parent_children', 'group_info_by_parent_children_async'),
+    ('participants_list_by_event', 'participants_list_by_event_async'),
+]
+
+
+def uncovered_routes(routes=ROUTES):
+    """Имена маршрутов из urls.py, для которых нет описания в ROUTES (пропущенные с skip считаются описанными)."""
+    names = {pattern.name for pattern in get_resolver().url_patterns if getattr(pattern, 'name', None)}
+    return sorted(names - {route.name for route in routes})
+
+
+def _route_url(ctx, route):
+    url = reverse(route.name, kwargs=route.kwargs(ctx))
+    query = route.query(ctx)
+    return f'{url}?{urlencode(query)}' if query else url
+
+
+def percentile(sorted_values, fraction):
+    # Метод ближайшего ранга
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, query_counts, statuses):
+    ordered = sorted(latencies)
+    total = sum(latencies)
+    status_counts = {}
+    for code in statuses:
+        status_counts[str(code)] = status_counts.get(str(code), 0) + 1
+    return {
+        'requests': len(latencies),
+        'status_counts': status_counts,
+        # Ответы не 2xx/3xx: задержка таких маршрутов - это задержка ошибки
+        'errors': sum(1 for code in statuses if code >= 400),
+        'mean_ms': total * 1000 / len(latencies) if latencies else None,
+        'p50_ms': percentile(ordered, 0.50) * 1000 if ordered else None,
+        'p95_ms': percentile(ordered, 0.95) * 1000 if ordered else None,
+        'p99_ms': percentile(ordered, 0.99) * 1000 if ordered else None,
+        'queries_mean': sum(query_counts) / len(query_counts) if query_counts else None,
+        'queries_max': max(query_counts) if query_counts else None,
+        'throughput_rps': len(latencies) / total if total else None,
+    }
+
+
+def run_route(ctx, route, iterations, warmup=2, capture_queries=True, lifecycle=False):
+    """
+    lifecycle=True после каждого вызова закрывает соединения так же, как Django по окончании запроса
+    (тестовый клиент этого не делает). Соединение в таком режиме открывается внутри замера.
+    """
+    client = ctx.clients[route.role]
+    url = _route_url(ctx, route)
+    method = getattr(client, route.method)
+    if route.method == 'get':
+        request = lambda data: method(url)
+    else:
+        request = lambda data: method(url, data, format=route.format)
+
+    def call(data):
+        response = request(data)
+        # Тело потокового ответа формируется при чтении - оно входит в замер
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    latencies, query_counts, statuses = [], [], []
+    for i in range(warmup + iterations):
+        if route.prepare:
+            route.prepare(ctx)
+        data = route.payload(ctx) if route.payload else None
+        if capture_queries:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = call(data)
+                elapsed = time.perf_counter() - start
+            query_count = len(queries)
+        else:
+            start = time.perf_counter()
+            response = call(data)
+            elapsed = time.perf_counter() - start
+            query_count = 0
+        if lifecycle:
+            close_old_connections()
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        query_counts.append(query_count)
+        statuses.append(response.status_code)
+    result = summarize(latencies, query_counts, statuses)
+    result.update(method=route.method.upper(), role=route.role, url=url)
+    return result
+
+
+def run_benchmark(ctx, iterations, route_names=None, warmup=2):
+    routes = [route for route in ROUTES if not route_names or route.name in route_names]
+    results = {}
+    for route in routes:
+        if route.skip is None:
+            results[route.name] = run_route(ctx, route, iterations, warmup=warmup)
+    return results
+
+
+def skipped_routes(route_names=None):
+    """Маршруты, которые не замеряются, с причиной."""
+    return {route.name: route.skip for route in ROUTES
+            if route.skip is not None and (not route_names or route.name in route_names)}
+
+
+def failed_results(report):
+    """Пути в отчёте к сводкам с ответами не 2xx/3xx, например 'routes.create_group'."""
+    failed = []
+
+    def visit(path, value):
+        if isinstance(value, dict) and 'status_counts' in value:
+            if value['errors']:
+                failed.append(path)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                visit(f'{path}.{key}' if path else key, item)
+
+    for section in ('routes', 'connection_modes', 'concurrency', 'signups'):
+        visit(section, report.get(section))
+    return failed
+
+
+@contextmanager
+def connection_mode(mode, pool_max_size=4):
+    """
+    Переключает соединение default (PostgreSQL) на время блока:
+    new - новое соединение на каждый запрос, persistent - CONN_MAX_AGE, pool - пул psycopg.
+    """
+    settings_dict = connection.settings_dict
+    saved = {key: settings_dict[key] for key in ('CONN_MAX_AGE', 'OPTIONS')}
+    connection.close()
+    connection.close_pool()
+    options = {key: value for key, value in settings_dict['OPTIONS'].items() if key != 'pool'}
+    if mode == 'pool':
+        options['pool'] = {'min_size': 1, 'max_size': pool_max_size}
+    settings_dict['OPTIONS'] = options
+    settings_dict['CONN_MAX_AGE'] = 600 if mode == 'persistent' else 0
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.close_pool()
+        settings_dict.update(saved)
+
+
+def run_connection_modes(ctx, iterations, modes=CONNECTION_MODES, route_names=None, warmup=2):
+    """Для каждого режима соединений прогоняет маршруты с закрытием соединений после запроса."""
+    routes = [route for route in ROUTES if route.name in (route_names or SHORT_ROUTES)]
+    results = {}
+    for mode in modes:
+        with connection_mode(mode):
+            rows = {route.name: run_route(ctx, route, iterations, warmup=warmup, capture_queries=False,
+                                          lifecycle=True)
+                    for route in routes}
+            pool = connection.pool
+            results[mode] = {'routes': rows, 'pool_stats': pool.get_stats() if pool is not None else None}
+    return results
+
+
+async def _run_concurrent(client, url, headers, requests, concurrency):
+    latencies, statuses = [], []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - start
+    # Соединения потока sync_to_async закрываем, иначе тестовую базу PostgreSQL нельзя удалить
+    await sync_to_async(connections.close_all)()
+    result = summarize(latencies, [], statuses)
+    result.update(concurrency=concurrency, throughput_rps=len(latencies) / wall_time if wall_time else None)
+    return result
+
+
+def run_concurrency_comparison(ctx, requests, concurrency, pair_names=None):
+    """
+    Для каждой пары из ASYNC_PAIRS отправляет requests GET-запросов по concurrency одновременно
+    через AsyncClient (ASGI-обработчик Django) и возвращает сводки для синхронного и async-маршрутов.
+    Синхронные представления под ASGI выполняются в общем потоке sync_to_async, async - в цикле событий.
+    """
+    routes = {route.name: route for route in ROUTES}
+    results = {}
+    for sync_name, async_name in ASYNC_PAIRS:
+        if pair_names and sync_name not in pair_names:
+            continue
+        row = {}
+        for name in (sync_name, async_name):
+            route = routes[name]
+            headers = {}
+            credentials = ctx.clients[route.role]._credentials.get('HTTP_AUTHORIZATION')
+            if credentials:
+                headers['Authorization'] = credentials
+            client = AsyncClient(raise_request_exception=False)
+            url = _route_url(ctx, route)
+            row['async' if name == async_name else 'sync'] = asyncio.run(
+                _run_concurrent(client, url, headers, requests, concurrency))
+        results[sync_name] = row
+    return results
+
+
+def _signup_pairs(count):
+    # Родители с ребёнком, у которых ни родитель, ни ребёнок не повторяются
+    pairs, parents, children = [], set(), set()
+    for parent_id, user_id, child_id in ParentsChilds.objects.order_by('parent_id', 'child_id').values_list(
+            'parent_id', 'parent__user_id', 'child_id').iterator():
+        if parent_id in parents or child_id in children:
+            continue
+        parents.add(parent_id)
+        children.add(child_id)
+        pairs.append((user_id, child_id))
+        if len(pairs) == count:
+            break
+    return pairs
+
+
+def _run_threads(calls, concurrency):
+    """
+    Выполняет calls (функции без аргументов, возвращающие ответ) в concurrency потоках, начиная
+    одновременно. У каждого потока своё соединение с БД, оно закрывается по окончании.
+    """
+    latencies, statuses, responses = [], [], [None] * len(calls)
+    remaining = iter(enumerate(calls))
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+
+    def worker():
+        barrier.wait()
+        try:
+            while True:
+                with lock:
+                    item = next(remaining, None)
+                if item is None:
+                    break
+                index, call = item
+                start = time.perf_counter()
+                response = call()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses.append(response.status_code)
+                responses[index] = response
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+    result = summarize(latencies, [], statuses)
+    result.update(concurrency=concurrency, throughput_rps=len(latencies) / wall_time if wall_time else None)
+    return result, responses
+
+
+def run_signup_benchmark(ctx, signups, concurrency, capacity, cancellations):
+    """
+    Одновременная запись signups детей разных родителей на одно мероприятие вместимостью capacity
+    (allocation.py), затем одновременная отмена cancellations занятых мест. Проверяет, что мест занято
+    не больше capacity, счётчик совпадает с числом записей и освободившиеся места получили первые
+    из листа ожидания. Только PostgreSQL: SQLite не допускает параллельной записи.
+    """
+    pairs = _signup_pairs(signups)
+    if len(pairs) < signups:
+        raise ValueError(f'В наборе данных только {len(pairs)} родителей с отдельными детьми, нужно {signups}')
+    event = Event.objects.create(name=f'Запись на скорость {ctx.next()}', employee=ctx.employee, capacity=capacity,
+                                 date_event=timezone.now() + datetime.timedelta(days=30))
+    tokens = {token.user_id: token.key for token in
+              (Token.objects.get_or_create(user_id=user_id)[0] for user_id, _ in pairs)}
+    add_url, cancel_url = reverse('add_child_to_additional_event'), reverse('cancel_event_participation')
+
+    def request(url, user_id, child_id):
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {tokens[user_id]}')
+        return lambda: client.post(url, {'child_id': child_id, 'event_id': event.id}, format='json')
+
+    signup, _ = _run_threads([request(add_url, user_id, child_id) for user_id, child_id in pairs], concurrency)
+    participants = ListParticipants.objects.filter(event=event)
+    registered = list(participants.filter(status=ParticipantStatus.REGISTERED).order_by('id')
+                      .values_list('id', 'child_id'))
+    waitlisted = list(participants.filter(status=ParticipantStatus.WAITLISTED).order_by('id')
+                      .values_list('id', flat=True))
+    event.refresh_from_db()
+    signup.update(
+        capacity=capacity, registered=len(registered), waitlisted=len(waitlisted),
+        counter_ok=event.count_participants == len(registered) and len(registered) <= capacity,
+        # Записи, которые ждут, хотя место получила запись с большим id (зафиксирована позже её проверки)
+        order_inversions=sum(1 for pk in waitlisted if registered and pk < registered[-1][0]),
+    )
+
+    owners = {child_id: user_id for user_id, child_id in pairs}
+    cancelled = registered[:cancellations]
+    cancel, _ = _run_threads([request(cancel_url, owners[child_id], child_id) for _, child_id in cancelled],
+                             min(concurrency, len(cancelled))) if cancelled else (None, None)
+    if cancel is not None:
+        promoted = set(participants.filter(id__in=waitlisted, status=ParticipantStatus.REGISTERED)
+                       .values_list('id', flat=True))
+        event.refresh_from_db()
+        expected = set(waitlisted[:len(cancelled)])
+        cancel.update(
+            promoted=len(promoted), promoted_in_order=promoted == expected,
+            counter_ok=event.count_participants == participants.filter(status=ParticipantStatus.REGISTERED).count(),
+        )
+    return {'signup': signup, 'cancel': cancel}
+
+
+def environment_info(config, iterations):
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'iterations': iterations,
+        'dataset': config.__dict__ if config is not None else None,
+    }
+
+
+def compare(current, baseline):
+    """Отношение p50/p95 и среднего числа запросов текущего прогона к базовому по каждому маршруту."""
+    rows = {}
+    for name, result in current['routes'].items():
+        base = baseline.get('routes', {}).get(name)
+        if not base:
+            continue
+        row = {}
+        for key in ('p50_ms', 'p95_ms', 'queries_mean'):
+            if result.get(key) is not None and base.get(key):
+                row[key] = result[key] / base[key]
+        rows[name] = row
+    return rows
@@ -0,0 +1,100 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+from .models import Group, EducationalProgram, Event, Child, Employee
+
+
+def conditional_view(validators, roles=None):
+    """
+    Декоратор условного GET (ETag / Last-Modified) для detail-представлений.
+    validators(**kwargs) возвращает значения, от которых зависит ответ (updated_at объекта
+    и вложенных объектов), или None, если объекта нет. Если клиентская копия актуальна,
+    отвечаем 304 без загрузки объекта и без сериализатора.
+    Ставится под @api_view и @permission_classes, чтобы аутентификация уже была выполнена.
+    """
+    def _values(request, *args, **kwargs):
+        return _validator_values(request, validators, roles, kwargs)
+
+    def etag(request, *args, **kwargs):
+        values = _values(request, *args, **kwargs)
+        if values is None:
+            return None
+        # Разные ?fields= и ?expand= дают разные представления ресурса
+        representation = (request.GET.get('fields'), request.GET.get('expand'))
+        return hashlib.md5(repr((values, representation)).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        values = _values(request, *args, **kwargs)
+        dates = [value for value in values or () if isinstance(value, datetime)]
+        return max(dates) if dates else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def async_conditional_view(validators, roles=None):
+    """
+    conditional_view для async-представлений: condition вычисляет ETag синхронно,
+    поэтому значения валидаторов заранее читаются из БД через sync_to_async.
+    Ставится под декоратором, который устанавливает request.user.
+    """
+    def decorator(view):
+        conditional = conditional_view(validators, roles)(view)
+
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            await sync_to_async(_validator_values)(request, validators, roles, kwargs)
+            return await conditional(request, *args, **kwargs)
+        return inner
+    return decorator
+
+
+def _validator_values(request, validators, roles, kwargs):
+    # condition вызывает etag_func и last_modified_func по отдельности - считаем один раз
+    if not hasattr(request, '_validator_values'):
+        if roles is not None and request.user.role not in roles:
+            request._validator_values = None
+        else:
+            request._validator_values = validators(**kwargs)
+    return request._validator_values
+
+
+def _first(queryset, *fields):
+    row = queryset.values_list(*fields).first()
+    return list(row) if row is not None else None
+
+
+def group_validators(group_id):
+    return _first(Group.objects.filter(id=group_id), 'updated_at', 'educational_program__updated_at')
+
+
+def educational_program_validators(program_id):
+    return _first(EducationalProgram.objects.filter(id=program_id), 'updated_at')
+
+
+# Роли, которым доступны get_event и get_child: те же списки проверяют и сами представления
+EVENT_VIEW_ROLES = ('Parent', 'Employee')
+CHILD_VIEW_ROLES = ('Admin', 'Employee')
+
+
+def event_validators(event_id):
+    return _first(Event.objects.filter(id=event_id), 'updated_at', 'employee__updated_at')
+
+
+def child_validators(child_id):
+    # Ответ включает группу, родителей и противопоказания - учитываем и их
+    queryset = Child.objects.filter(id=child_id).annotate(
+        parents_updated_at=Max('parentschilds__parent__updated_at'),
+        parents_count=Count('parentschilds', distinct=True),
+        contraindications_count=Count('medicalcontraindicationschild', distinct=True),
+    )
+    return _first(queryset, 'updated_at', 'group__updated_at', 'parents_updated_at',
+                  'parents_count', 'contraindications_count')
+
+
+def employee_validators(user_id):
+    return _first(Employee.objects.filter(user_id=user_id), 'id', 'updated_at')
@@ -0,0 +1,40 @@
+from collections import Counter
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Group, Event
+
+# Счётчики Group.count_children и Event.count_participants обновляются
+# атомарно в БД через F(), без чтения текущего значения в Python.
+# Места на мероприятиях занимает allocation.py условным UPDATE того же счётчика.
+
+
+def _apply(model, field, deltas):
+    # Группируем по величине изменения, чтобы обойтись одним UPDATE на каждую величину
+    by_delta = {}
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(pk)
+    for delta, pks in by_delta.items():
+        # update() не трогает auto_now, а счётчик входит в ответ API - обновляем updated_at явно
+        model.objects.filter(pk__in=pks).update(**{field: Greatest(F(field) + delta, 0)}, updated_at=timezone.now())
+
+
+def children_enrolled(group_ids):
+    """group_ids - id групп зачисленных детей (по одному на ребёнка)."""
+    _apply(Group, 'count_children', Counter(group_ids))
+
+
+def children_removed(group_ids):
+    _apply(Group, 'count_children', {pk: -n for pk, n in Counter(group_ids).items()})
+
+
+def child_transferred(old_group_id, new_group_id):
+    if old_group_id != new_group_id:
+        _apply(Group, 'count_children', {old_group_id: -1, new_group_id: 1})
+
+
+def participants_removed(event_ids):
+    _apply(Event, 'count_participants', {pk: -n for pk, n in Counter(event_ids).items()})
@@ -0,0 +1,224 @@
+"""
+Генератор синтетических данных (manage.py generate_dataset, manage.py benchmark_api).
+
+Строит согласованный граф User/Parent/Employee/EducationalProgram/Group/Child/ParentsChilds/
+MedicalContraindicationsChild/Event/ListsEvents/ListParticipants через bulk_create пачками.
+Пароль хешируется один раз и используется для всех пользователей, поэтому PBKDF2
+не вычисляется на каждого пользователя. Один и тот же seed на пустой базе даёт те же данные.
+"""
+import datetime
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import search
+from .models import User, Parent, Employee, EducationalProgram, Group, Child, ParentsChilds, \
+    MedicalContraindicationsChild, Event, ListsEvents, ListParticipants, QualificationEmployees, AgeGroups, Roles, \
+    PHONE_MIN, PHONE_MAX
+
+MALE_NAMES = ['Александр', 'Михаил', 'Максим', 'Артём', 'Лев', 'Марк', 'Иван', 'Матвей', 'Дмитрий', 'Фёдор']
+FEMALE_NAMES = ['София', 'Анна', 'Мария', 'Алиса', 'Ева', 'Виктория', 'Полина', 'Варвара', 'Александра', 'Алёна']
+LAST_NAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+              'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров']
+PATRONYMIC_ROOTS = ['Александров', 'Михайлов', 'Сергеев', 'Андреев', 'Дмитриев', 'Алексеев', 'Игорев', 'Олегов']
+CONTRAINDICATIONS = ['Аллергия на орехи', 'Непереносимость лактозы', 'Астма', 'Освобождение от физкультуры']
+
+@dataclass
+class GeneratorConfig:
+    parents: int = 1000
+    children: int = 1500
+    groups: int = 20
+    programs: int = 5
+    employees: int = 5
+    admins: int = 1
+    events: int = 100
+    participants_per_event: int = 30
+    second_parent_rate: float = 0.3
+    contraindication_rate: float = 0.1
+    seed: int = 1
+    password: str = 'password'
+    prefix: str = ''
+    batch_size: int = 5000
+
+
+@dataclass
+class GeneratedDataset:
+    admin_user_ids: list = field(default_factory=list)
+    employee_ids: list = field(default_factory=list)
+    parent_ids: list = field(default_factory=list)
+    program_ids: list = field(default_factory=list)
+    group_ids: list = field(default_factory=list)
+    child_ids: list = field(default_factory=list)
+    event_ids: list = field(default_factory=list)
+    counts: dict = field(default_factory=dict)
+
+
+def _batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def _female_form(last_name):
+    return last_name + 'а'
+
+
+def _person(rng, female):
+    last_name = rng.choice(LAST_NAMES)
+    patronymic = rng.choice(PATRONYMIC_ROOTS) + ('на' if female else 'ич')
+    if female:
+        return rng.choice(FEMALE_NAMES), _female_form(last_name), patronymic
+    return rng.choice(MALE_NAMES), last_name, patronymic
+
+
+def _free_phone(model):
+    # Телефоны уникальны - продолжаем после максимального существующего
+    current = model.objects.aggregate(max_phone=Max('phone_number'))['max_phone']
+    return (current or PHONE_MIN - 1) + 1
+
+
+def generate(config, progress=None):
+    """Создаёт данные по config и возвращает GeneratedDataset с id созданных объектов."""
+    rng = random.Random(config.seed)
+    prefix = config.prefix or f'gen{config.seed}'
+    if User.objects.filter(username__startswith=f'{prefix}_').exists():
+        raise ValueError(f'Пользователи с префиксом {prefix} уже созданы: укажите другой префикс или seed')
+    password_hash = make_password(config.password)
+    progress = progress or (lambda message: None)
+    result = GeneratedDataset()
+
+    with transaction.atomic():
+        programs = EducationalProgram.objects.bulk_create([
+            EducationalProgram(description=f'Образовательная программа {prefix}-{i}', age_category_children=3 + i % 4)
+            for i in range(max(1, config.programs))
+        ])
+        result.program_ids = [program.id for program in programs]
+        groups = Group.objects.bulk_create([
+            Group(name=f'Группа {prefix}-{i}', age_group=AgeGroups.values[i % len(AgeGroups.values)],
+                  educational_program_id=result.program_ids[i % len(result.program_ids)])
+            for i in range(max(1, config.groups))
+        ])
+        result.group_ids = [group.id for group in groups]
+
+        admins = User.objects.bulk_create([
+            User(username=f'{prefix}_admin_{i}', role=Roles.ADMIN, password=password_hash)
+            for i in range(config.admins)
+        ])
+        result.admin_user_ids = [user.id for user in admins]
+
+        # Квалификация сотрудника уникальна, поэтому сотрудников не больше свободных квалификаций
+        used = set(Employee.objects.values_list('qualification', flat=True))
+        qualifications = [value for value in QualificationEmployees.values if value not in used][:config.employees]
+        employee_users = User.objects.bulk_create([
+            User(username=f'{prefix}_employee_{i}', role=Roles.EMPLOYEE, password=password_hash)
+            for i in range(len(qualifications))
+        ])
+        phone = _free_phone(Employee)
+        employees = []
+        for i, (user, qualification) in enumerate(zip(employee_users, qualifications)):
+            female = rng.random() < 0.8
+            fname, lname, patronymic = _person(rng, female)
+            employees.append(Employee(
+                user=user, fname=fname, lname=lname, patronymic=patronymic, gender=female,
+                birthday=datetime.date(1970 + rng.randrange(30), 1 + rng.randrange(12), 1 + rng.randrange(28)),
+                phone_number=phone + i, qualification=qualification, work_experience=rng.randrange(30),
+            ))
+        Employee.objects.bulk_create(search.fill_search_names(employees))
+        result.employee_ids = [employee.id for employee in employees]
+    progress(f'Программ: {len(programs)}, групп: {len(groups)}, сотрудников: {len(employees)}')
+
+    phone = _free_phone(Parent)
+    if phone + config.parents - 1 > PHONE_MAX:
+        raise ValueError('Недостаточно свободных номеров телефонов для родителей')
+    for start, size in _batches(config.parents, config.batch_size):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}_parent_{start + i}', role=Roles.PARENT, password=password_hash)
+                for i in range(size)
+            ])
+            parents = []
+            for i, user in enumerate(users):
+                fname, lname, patronymic = _person(rng, female=rng.random() < 0.7)
+                parents.append(Parent(user=user, fname=fname, lname=lname, patronymic=patronymic,
+                                      phone_number=phone + start + i))
+            Parent.objects.bulk_create(search.fill_search_names(parents))
+        result.parent_ids.extend(parent.id for parent in parents)
+        progress(f'Родителей: {start + size}/{config.parents}')
+
+    group_counts = Counter()
+    links_total = contraindications_total = 0
+    for start, size in _batches(config.children if result.parent_ids else 0, config.batch_size):
+        with transaction.atomic():
+            children = []
+            for i in range(size):
+                female = rng.random() < 0.5
+                fname, lname, patronymic = _person(rng, female)
+                group_id = result.group_ids[(start + i) % len(result.group_ids)]
+                group_counts[group_id] += 1
+                children.append(Child(
+                    fname=fname, lname=lname, patronymic=patronymic, gender=female,
+                    birthday=datetime.date(2018 + rng.randrange(6), 1 + rng.randrange(12), 1 + rng.randrange(28)),
+                    group_id=group_id, transfer_date=datetime.date(2023 + rng.randrange(3), 9, 1),
+                ))
+            Child.objects.bulk_create(search.fill_search_names(children))
+
+            links = []
+            contraindications = []
+            for child in children:
+                first = rng.choice(result.parent_ids)
+                links.append(ParentsChilds(parent_id=first, child_id=child.id))
+                if rng.random() < config.second_parent_rate:
+                    second = rng.choice(result.parent_ids)
+                    if second != first:
+                        links.append(ParentsChilds(parent_id=second, child_id=child.id))
+                if rng.random() < config.contraindication_rate:
+                    contraindications.append(MedicalContraindicationsChild(
+                        C=f'{prefix}-{child.id}', description=rng.choice(CONTRAINDICATIONS), child_id=child.id))
+            ParentsChilds.objects.bulk_create(links)
+            MedicalContraindicationsChild.objects.bulk_create(contraindications)
+        links_total += len(links)
+        contraindications_total += len(contraindications)
+        result.child_ids.extend(child.id for child in children)
+        progress(f'Детей: {start + size}/{config.children}')
+
+    for group in groups:
+        group.count_children = group_counts[group.id]
+    Group.objects.bulk_update(groups, ['count_children'], batch_size=config.batch_size)
+
+    now = timezone.now()
+    participants_total = 0
+    if result.employee_ids:
+        with transaction.atomic():
+            events = Event.objects.bulk_create([
+                Event(name=f'Мероприятие {prefix}-{i}',
+                      date_event=now + datetime.timedelta(days=rng.randrange(-180, 180), hours=rng.randrange(8, 18)),
+                      employee_id=result.employee_ids[i % len(result.employee_ids)],
+                      count_participants=min(config.participants_per_event, len(result.child_ids)))
+                for i in range(config.events)
+            ])
+            result.event_ids = [event.id for event in events]
+            ListsEvents.objects.bulk_create([
+                ListsEvents(educational_program_id=result.program_ids[i % len(result.program_ids)], event_id=event_id)
+                for i, event_id in enumerate(result.event_ids)
+            ])
+        for event_id in result.event_ids:
+            sample = rng.sample(result.child_ids, min(config.participants_per_event, len(result.child_ids)))
+            ListParticipants.objects.bulk_create(
+                [ListParticipants(event_id=event_id, child_id=child_id) for child_id in sample],
+                batch_size=config.batch_size,
+            )
+            participants_total += len(sample)
+        progress(f'Мероприятий: {len(result.event_ids)}, участников: {participants_total}')
+
+    result.counts = {
+        'programs': len(result.program_ids), 'groups': len(result.group_ids),
+        'admins': len(result.admin_user_ids), 'employees': len(result.employee_ids),
+        'parents': len(result.parent_ids), 'children': len(result.child_ids), 'parent_links': links_total,
+        'contraindications': contraindications_total, 'events': len(result.event_ids),
+        'participants': participants_total,
+    }
+    return result
@@ -0,0 +1,54 @@
+"""
+Диапазон дат мероприятий из параметров ?from= и ?to=.
+
+Значение - дата (2026-09-01) или дата-время ISO 8601 (2026-09-01T10:00:00+03:00); без часового
+пояса время считается в TIME_ZONE. from включается, to-дата включается целиком (до начала
+следующего дня), to-время не включается. Фильтр date_event >= start AND date_event < end
+использует индекс event_date_event_id_idx (date_event, id).
+"""
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class RangeError(ValueError):
+    pass
+
+
+def _parse_bound(value, name, is_end):
+    # Сначала дата: parse_datetime (datetime.fromisoformat) принимает и «2026-09-01» как полночь
+    try:
+        day = parse_date(value)
+        moment = None if day is not None else parse_datetime(value)
+    except ValueError:
+        moment = day = None
+    if moment is None and day is None:
+        raise RangeError(f'Параметр {name} должен быть датой или датой-временем в формате ISO 8601')
+    if moment is None:
+        moment = datetime.datetime.combine(day + datetime.timedelta(days=1) if is_end else day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_range(params):
+    """(start, end) из ?from= и ?to= - aware datetime или None. RangeError при неверном значении."""
+    start = end = None
+    if params.get('from'):
+        start = _parse_bound(params['from'], 'from', is_end=False)
+    if params.get('to'):
+        end = _parse_bound(params['to'], 'to', is_end=True)
+    # Конец не включается: from-дата позже to-даты даёт start == end
+    if start is not None and end is not None and start >= end:
+        raise RangeError('Параметр from должен быть раньше to')
+    return start, end
+
+
+def filter_range(queryset, start, end, prefix=''):
+    """queryset мероприятий (или связанных с ними объектов через prefix, например 'event__') в диапазоне."""
+    if start is not None:
+        queryset = queryset.filter(**{prefix + 'date_event__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{prefix + 'date_event__lt': end})
+    return queryset
@@ -0,0 +1,175 @@
+"""
+Планы основных запросов представлений (manage.py explain_queries).
+
+Каждый запрос из QUERIES повторяет то, что выполняет соответствующее представление
+(или feeds/signals), и запускается через QuerySet.explain(). Полный просмотр таблицы
+(Seq Scan в PostgreSQL, SCAN без индекса в SQLite) отмечается, если в таблице
+не меньше min_rows строк: для маленьких таблиц полный просмотр - нормальный выбор планировщика.
+"""
+import datetime
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+from django.apps import apps
+from django.db import connection
+from django.utils import timezone
+
+from .models import Parent, Employee, Group, Child, ParentsChilds, MedicalContraindicationsChild, Event, \
+    ListsEvents, ListParticipants, ParticipantStatus
+from . import search
+from .pagination import KeysetPagination
+from .serializers import GroupSerializer, ChildSerializer, EventSerializer, ListParticipantsSerializer
+
+PAGE = KeysetPagination.page_size + 1  # CursorPagination запрашивает на одну строку больше страницы
+
+_PG_SCAN = re.compile(r'Seq Scan on (\w+)')
+_SQLITE_SCAN = re.compile(r'\bSCAN (\w+)(.*)$')
+_SORT = re.compile(r'\bSort\b|TEMP B-TREE FOR ORDER BY')
+
+
+@dataclass
+class ExplainContext:
+    """id существующих объектов, подставляемые в запросы."""
+    parent_id: int
+    child_ids: list
+    group_id: int
+    program_id: int
+    event_ids: list
+    employee_id: int
+
+
+def _range_start():
+    return timezone.now() - datetime.timedelta(days=180)
+
+
+@dataclass
+class ExplainQuery:
+    name: str
+    build: Callable[[ExplainContext], object]
+
+
+def _feed_events(ctx):
+    program_ids = {program_id for _, program_id in
+                   Child.objects.filter(parentschilds__parent_id=ctx.parent_id)
+                   .values_list('group_id', 'group__educational_program_id')}
+    return EventSerializer.setup_eager_loading(Event.objects.filter(
+        id__in=ListsEvents.objects.filter(educational_program_id__in=program_ids).values('event_id')
+    )).order_by('date_event', 'id')
+
+
+QUERIES = [
+    ExplainQuery('list_parents (страница)', lambda ctx: Parent.objects.order_by('id')[:PAGE]),
+    ExplainQuery('list_employees (страница)', lambda ctx: Employee.objects.order_by('id')[:PAGE]),
+    ExplainQuery('list_groups (страница)',
+                 lambda ctx: GroupSerializer.setup_eager_loading(Group.objects.order_by('id'))[:PAGE]),
+    ExplainQuery('list_children (страница)',
+                 lambda ctx: ChildSerializer.setup_eager_loading(Child.objects.order_by('id'))[:PAGE]),
+    ExplainQuery('get_child',
+                 lambda ctx: ChildSerializer.setup_eager_loading(Child.objects.filter(id=ctx.child_ids[0]))),
+    ExplainQuery('get_child: родители ребёнка (prefetch)',
+                 lambda ctx: ParentsChilds.objects.filter(child_id__in=ctx.child_ids).select_related('parent')),
+    ExplainQuery('get_child: противопоказания (prefetch)',
+                 lambda ctx: MedicalContraindicationsChild.objects.filter(child_id__in=ctx.child_ids)),
+    ExplainQuery('events_by_educational_program (страница)',
+                 lambda ctx: EventSerializer.setup_eager_loading(Event.objects.filter(
+                     id__in=ListsEvents.objects.filter(educational_program_id=ctx.program_id).values('event_id')
+                 )).order_by('date_event', 'id')[:PAGE]),
+    ExplainQuery('events_by_educational_program: диапазон ?from=/?to=',
+                 lambda ctx: Event.objects.filter(
+                     id__in=ListsEvents.objects.filter(educational_program_id=ctx.program_id).values('event_id'),
+                     date_event__gte=_range_start(), date_event__lt=_range_start() + datetime.timedelta(days=30),
+                 ).order_by('date_event', 'id')),
+    ExplainQuery('ical: календарь сотрудника',
+                 lambda ctx: Event.objects.filter(employee_id=ctx.employee_id, date_event__gte=_range_start())
+                 .order_by('date_event', 'id').values_list('id', 'name', 'date_event', 'updated_at')),
+    ExplainQuery('get_event',
+                 lambda ctx: EventSerializer.setup_eager_loading(Event.objects.filter(id=ctx.event_ids[0]))),
+    ExplainQuery('get_events_by_parent: группы детей',
+                 lambda ctx: Child.objects.filter(parentschilds__parent_id=ctx.parent_id)
+                 .values_list('group_id', 'group__educational_program_id')),
+    ExplainQuery('get_events_by_parent: мероприятия программ', _feed_events),
+    ExplainQuery('get_group_by_parent: дети родителя',
+                 lambda ctx: ParentsChilds.objects.filter(parent_id=ctx.parent_id).values_list('child_id', flat=True)),
+    ExplainQuery('get_group_by_parent: группы',
+                 lambda ctx: GroupSerializer.setup_eager_loading(
+                     Group.objects.filter(child__id__in=ctx.child_ids).distinct())),
+    ExplainQuery('add_child_to_event_participants: проверка ребёнка',
+                 lambda ctx: ParentsChilds.objects.filter(parent_id=ctx.parent_id, child_id=ctx.child_ids[0])),
+    ExplainQuery('participants_list_by_event',
+                 lambda ctx: ListParticipantsSerializer.setup_eager_loading(
+                     ListParticipants.objects.filter(event_id=ctx.event_ids[0]))),
+    ExplainQuery('allocation: первый в листе ожидания',
+                 lambda ctx: ListParticipants.objects.filter(event_id=ctx.event_ids[0],
+                                                             status=ParticipantStatus.WAITLISTED).order_by('id')[:1]),
+    ExplainQuery('feeds.invalidate_children',
+                 lambda ctx: ParentsChilds.objects.filter(child_id__in=ctx.child_ids)
+                 .values_list('parent_id', flat=True)),
+    ExplainQuery('feeds.invalidate_events',
+                 lambda ctx: ListsEvents.objects.filter(event_id__in=ctx.event_ids)
+                 .values_list('educational_program_id', flat=True)),
+    ExplainQuery('search: префикс ФИО', lambda ctx: search.prefix_queryset(Parent, 'ив')[:PAGE]),
+    ExplainQuery('search: префикс телефона',
+                 lambda ctx: Parent.objects.filter(phone_number__gte=89160000000, phone_number__lt=89170000000)
+                 .order_by('phone_number')[:PAGE]),
+    ExplainQuery('дети группы по возрасту',
+                 lambda ctx: Child.objects.filter(group_id=ctx.group_id).order_by('birthday')),
+    ExplainQuery('check_counters: детей в группе',
+                 lambda ctx: Child.objects.filter(group_id=ctx.group_id).values('group_id')),
+]
+
+
+def sample_context():
+    """Берёт из базы родителя с детьми и связанные с ним объекты. None, если данных нет."""
+    parent_id = ParentsChilds.objects.order_by('id').values_list('parent_id', flat=True).first()
+    if parent_id is None:
+        return None
+    child_ids = list(ParentsChilds.objects.filter(parent_id=parent_id).values_list('child_id', flat=True))
+    group_id, program_id = Child.objects.filter(id=child_ids[0]).values_list(
+        'group_id', 'group__educational_program_id').get()
+    event_ids = list(ListsEvents.objects.order_by('id').values_list('event_id', flat=True)[:5])
+    if not event_ids:
+        return None
+    employee_id = Event.objects.filter(id=event_ids[0]).values_list('employee_id', flat=True).get()
+    return ExplainContext(parent_id=parent_id, child_ids=child_ids, group_id=group_id, program_id=program_id,
+                          event_ids=event_ids, employee_id=employee_id)
+
+
+def table_sizes():
+    return {model._meta.db_table: model.objects.count()
+            for model in apps.get_app_config('kindergarten_app_').get_models()}
+
+
+def full_scans(plan, vendor=None):
+    """Таблицы, которые план читает целиком."""
+    vendor = vendor or connection.vendor
+    if vendor == 'postgresql':
+        return _PG_SCAN.findall(plan)
+    if vendor == 'sqlite':
+        tables = []
+        for line in plan.splitlines():
+            match = _SQLITE_SCAN.search(line)
+            # SCAN ... USING INDEX - обход индекса в нужном порядке, а не таблицы
+            if match and 'USING' not in match.group(2):
+                tables.append(match.group(1))
+        return tables
+    return []
+
+
+def explain_all(ctx, min_rows=1000, analyze=False, names=None):
+    """Возвращает для каждого запроса план и список полных просмотров больших таблиц."""
+    sizes = table_sizes()
+    options = {'analyze': True} if analyze and connection.vendor == 'postgresql' else {}
+    results = {}
+    for query in QUERIES:
+        if names and query.name not in names:
+            continue
+        queryset = query.build(ctx)
+        plan = queryset.explain(**options)
+        if queryset.query.high_mark is not None and not _SORT.search(plan):
+            # Просмотр под LIMIT без сортировки (страница по первичному ключу) останавливается после страницы
+            flagged = []
+        else:
+            flagged = sorted({table for table in full_scans(plan) if sizes.get(table, 0) >= min_rows})
+        results[query.name] = {'plan': plan, 'full_scans': flagged}
+    return results
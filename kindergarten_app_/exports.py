@@ -0,0 +1,150 @@
+"""
+Выгрузка списков в CSV/XLSX для печати (api/child/export/, api/event/<id>/participants/export/,
+api/employee/export/). Формат выбирается параметром ?file_type=csv|xlsx: ?format= занят
+в DRF выбором рендерера.
+
+Строки читаются плоским values_list() через iterator(): в PostgreSQL это серверный курсор,
+поэтому в памяти находится только текущая порция. CSV отдаётся StreamingHttpResponse -
+заголовок таблицы уходит клиенту до выполнения запроса, и загрузка начинается сразу.
+CSV с разделителем «;» и BOM открывается в Excel с русской локалью без мастера импорта.
+XLSX собирается openpyxl в режиме write_only во временный файл (память не растёт с числом строк)
+и отдаётся после записи последней строки; openpyxl нужен только для XLSX.
+"""
+import csv
+import tempfile
+from dataclasses import dataclass
+from typing import Callable
+
+from django.http import FileResponse, StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+FILE_TYPES = ('csv', 'xlsx')
+CSV_DATE_FORMAT = '%d.%m.%Y'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class ExportError(Exception):
+    """Выгрузку в запрошенном формате сделать нельзя."""
+
+
+def _gender(value):
+    # True - женский, как gender_display в сериализаторах
+    return 'ж' if value else 'м'
+
+
+def _participant_status(value):
+    return 'лист ожидания' if value == 'waitlisted' else 'записан'
+
+
+@dataclass
+class Column:
+    path: str  # путь для values_list(), например 'group__name'
+    title: str
+    convert: Callable = None
+
+
+def _person_columns(prefix=''):
+    return [
+        Column(prefix + 'lname', 'Фамилия'),
+        Column(prefix + 'fname', 'Имя'),
+        Column(prefix + 'patronymic', 'Отчество'),
+        Column(prefix + 'gender', 'Пол', _gender),
+        Column(prefix + 'birthday', 'Дата рождения'),
+    ]
+
+
+CHILD_COLUMNS = [
+    Column('id', 'ID'),
+    *_person_columns(),
+    Column('group__name', 'Группа'),
+    Column('transfer_date', 'Дата зачисления'),
+]
+
+PARTICIPANT_COLUMNS = [
+    Column('child_id', 'ID ребёнка'),
+    *_person_columns('child__'),
+    Column('child__group__name', 'Группа'),
+    Column('status', 'Статус', _participant_status),
+]
+
+EMPLOYEE_COLUMNS = [
+    Column('id', 'ID'),
+    *_person_columns(),
+    Column('phone_number', 'Телефон'),
+    Column('qualification', 'Квалификация'),
+    Column('work_experience', 'Стаж'),
+]
+
+
+def _rows(queryset, columns, chunk_size):
+    converters = [(index, column.convert) for index, column in enumerate(columns) if column.convert]
+    for row in queryset.values_list(*(column.path for column in columns)).iterator(chunk_size=chunk_size):
+        if converters:
+            row = list(row)
+            for index, convert in converters:
+                row[index] = convert(row[index])
+        yield row
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'strftime'):
+        return value.strftime(CSV_DATE_FORMAT)
+    return value
+
+
+class _Echo:
+    # csv.writer пишет строку в write() и возвращает её - без промежуточного буфера
+    def write(self, value):
+        return value
+
+
+def _csv_chunks(rows, columns, chunk_size):
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow([column.title for column in columns])
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow([_csv_value(value) for value in row]))
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def _attachment(response, filename):
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def csv_response(queryset, columns, filename, chunk_size=EXPORT_CHUNK_SIZE):
+    chunks = _csv_chunks(_rows(queryset, columns, chunk_size), columns, chunk_size)
+    return _attachment(StreamingHttpResponse(chunks, content_type='text/csv; charset=utf-8'), f'{filename}.csv')
+
+
+def xlsx_response(queryset, columns, filename, chunk_size=EXPORT_CHUNK_SIZE):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportError('Для выгрузки XLSX нужен пакет openpyxl')
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([column.title for column in columns])
+    for row in _rows(queryset, columns, chunk_size):
+        sheet.append(row)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    # FileResponse читает файл блоками и закрывает его после отправки
+    return FileResponse(output, as_attachment=True, filename=f'{filename}.xlsx', content_type=XLSX_CONTENT_TYPE)
+
+
+def export_response(request, queryset, columns, filename):
+    """Ответ с выгрузкой в формате ?file_type= (по умолчанию CSV). ExportError - формат недоступен."""
+    file_type = request.query_params.get('file_type', 'csv')
+    if file_type == 'csv':
+        return csv_response(queryset, columns, filename)
+    if file_type == 'xlsx':
+        return xlsx_response(queryset, columns, filename)
+    raise ExportError(f'Неизвестный тип файла {file_type}, допустимы: {", ".join(FILE_TYPES)}')
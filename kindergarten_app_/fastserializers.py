@@ -0,0 +1,223 @@
+"""
+Быстрый путь сериализации списков только для чтения.
+
+Для класса сериализатора один раз строится план: какие колонки выбрать через QuerySet.values()
+и как из строки-словаря получить вывод. Поля, значение которых из values() уже совпадает
+с выводом DRF (числа, строки, bool, id связей), берутся через itemgetter; для остальных
+(даты, время) вызывается to_representation того же поля DRF. Вложенные объекты по FK
+читаются из той же строки (JOIN), связи «ко многим» - одним запросом values() на порцию строк.
+Вывод совпадает с serializer_class(queryset, many=True).data (проверяется в tests.py).
+
+Если сериализатор нельзя свести к values() (SerializerMethodField без method_field_sources
+или method_field_lists, source='*'), fast_serializer возвращает None и используется DRF.
+Запросы с ?fields= или ?expand= тоже обслуживаются DRF-сериализаторами.
+"""
+import time
+from operator import itemgetter
+from types import SimpleNamespace
+
+from django.db.models import F
+from rest_framework import serializers, relations
+
+from .request_stats import current_request_stats
+from .serializers import Selection, SparseFieldsMixin
+
+_LINK = 'fast_link_id'
+
+# to_representation этих полей не меняет значение, полученное из values()
+_IDENTITY = {
+    serializers.IntegerField.to_representation,
+    serializers.CharField.to_representation,
+    serializers.BooleanField.to_representation,
+    serializers.ReadOnlyField.to_representation,
+}
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _column(prefix, source):
+    return prefix + source.replace('.', '__')
+
+
+def _is_identity(field):
+    method = type(field).to_representation
+    if method in _IDENTITY:
+        return True
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return field.pk_field is None  # values() по FK возвращает id
+    if isinstance(field, serializers.ChoiceField):
+        return all(isinstance(key, str) for key in field.choices)
+    return False
+
+
+def _scalar_getter(column, field):
+    get = itemgetter(column)
+    if _is_identity(field):
+        return get
+    convert = field.to_representation
+
+    def getter(row):
+        value = get(row)
+        return None if value is None else convert(value)
+    return getter
+
+
+def _method_getter(method, columns):
+    # Метод сериализатора получает объект только с атрибутами из method_field_sources
+    def getter(row):
+        return method(SimpleNamespace(**{name: row[column] for name, column in columns}))
+    return getter
+
+
+def _nested_getter(fast, fk_column):
+    def getter(row):
+        return None if row[fk_column] is None else fast.represent(row)
+    return getter
+
+
+def _list_placeholder(row):
+    return None  # заполняется в FastSerializer.fill_related
+
+
+class _RelatedList:
+    """Связь «ко многим»: accessor обратной связи модели и (необязательно) FK к выводимому объекту."""
+
+    def __init__(self, model, accessor, target, serializer):
+        for rel in model._meta.related_objects:
+            if rel.get_accessor_name() == accessor:
+                break
+        else:
+            raise _Unsupported(accessor)
+        self.model = rel.related_model
+        self.link = rel.field.attname
+        self.fast = FastSerializer(serializer, target + '__' if target else '')
+
+    def fetch(self, ids):
+        # Порядок как у prefetch_related: ordering модели, иначе по первичному ключу
+        rows = (self.model._default_manager.filter(**{self.link + '__in': ids})
+                .order_by(*(self.model._meta.ordering or ['pk']))
+                .values(*self.fast.columns, **{_LINK: F(self.link)}))
+        rows = list(rows)
+        groups = {}
+        for row, item in zip(rows, self.fast.build(rows)):
+            groups.setdefault(row[_LINK], []).append(item)
+        return groups
+
+
+class FastSerializer:
+    """План сериализации строк values() для экземпляра сериализатора (prefix - путь до вложенного объекта)."""
+
+    def __init__(self, serializer, prefix=''):
+        model = serializer.Meta.model
+        self.prefix = prefix
+        self.id_column = prefix + model._meta.pk.attname
+        self.columns = {self.id_column}
+        self.getters = []
+        self.nested = []
+        self.lists = []
+
+        method_sources = getattr(serializer, 'method_field_sources', {})
+        method_lists = getattr(serializer, 'method_field_lists', {})
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in method_lists:
+                accessor, target, serializer_class = method_lists[name]
+                self.lists.append((name, _RelatedList(model, accessor, target, serializer_class())))
+                self.getters.append((name, _list_placeholder))
+            elif isinstance(field, serializers.ListSerializer):
+                self.lists.append((name, _RelatedList(model, field.source, '', field.child)))
+                self.getters.append((name, _list_placeholder))
+            elif isinstance(field, SparseFieldsMixin):
+                fk_column = _column(prefix, field.source)
+                fast = FastSerializer(field, fk_column + '__')
+                self.columns.add(fk_column)
+                self.columns.update(fast.columns)
+                self.nested.append((name, fast))
+                self.getters.append((name, _nested_getter(fast, fk_column)))
+            elif isinstance(field, serializers.SerializerMethodField):
+                if name not in method_sources:
+                    raise _Unsupported(name)
+                columns = [(source, prefix + source) for source in method_sources[name]]
+                self.columns.update(column for _, column in columns)
+                self.getters.append((name, _method_getter(getattr(serializer, field.method_name), columns)))
+            elif field.source == '*':
+                raise _Unsupported(name)
+            else:
+                column = _column(prefix, field.source)
+                self.columns.add(column)
+                self.getters.append((name, _scalar_getter(column, field)))
+        self.columns = sorted(self.columns)
+
+    @property
+    def has_related(self):
+        return bool(self.lists) or any(fast.has_related for _, fast in self.nested)
+
+    def represent(self, row):
+        return {name: getter(row) for name, getter in self.getters}
+
+    def fill_related(self, rows, items):
+        for name, related in self.lists:
+            groups = related.fetch({row[self.id_column] for row in rows}) if rows else {}
+            for row, item in zip(rows, items):
+                item[name] = groups.get(row[self.id_column], [])
+        for name, fast in self.nested:
+            if fast.has_related:
+                pairs = [(row, item[name]) for row, item in zip(rows, items) if item[name] is not None]
+                fast.fill_related([row for row, _ in pairs], [item for _, item in pairs])
+
+    def build(self, rows):
+        """Вывод для строк values_queryset() (или страницы из них)."""
+        items = [self.represent(row) for row in rows]
+        if self.has_related:
+            self.fill_related(rows, items)
+        return items
+
+    def values_queryset(self, queryset, *extra_columns):
+        # values() отключает select_related сам, prefetch_related с values() несовместим
+        return queryset.prefetch_related(None).values(*sorted(set(self.columns).union(extra_columns)))
+
+    def serialize(self, queryset):
+        return self.build(list(self.values_queryset(queryset)))
+
+
+_cache = {}
+
+
+def fast_serializer(serializer_class):
+    """FastSerializer для класса сериализатора (строится один раз) или None, если быстрый путь невозможен."""
+    if serializer_class not in _cache:
+        try:
+            _cache[serializer_class] = FastSerializer(serializer_class())
+        except _Unsupported:
+            _cache[serializer_class] = None
+    return _cache[serializer_class]
+
+
+def fast_serializer_for(request, serializer_class):
+    """Быстрый сериализатор для запроса или None, если нужны выборка ?fields=/?expand= или DRF."""
+    if request is not None and Selection.from_request(request) is not None:
+        return None
+    return fast_serializer(serializer_class)
+
+
+def timed_build(fast, rows):
+    # Время учитывается в статистике QueryStatsMiddleware так же, как у BaseModelSerializer
+    stats = current_request_stats()
+    if stats is None:
+        return fast.build(rows)
+    start = time.perf_counter()
+    try:
+        return fast.build(rows)
+    finally:
+        stats.serializer_time += time.perf_counter() - start
+
+
+def serialize_list(request, queryset, serializer_class):
+    """Данные списка: быстрым путём, если возможно, иначе serializer_class(many=True)."""
+    fast = fast_serializer_for(request, serializer_class)
+    if fast is None:
+        return serializer_class(queryset, many=True, context={'request': request}).data
+    return timed_build(fast, list(fast.values_queryset(queryset)))
@@ -0,0 +1,128 @@
+import bisect
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Event, Child, ParentsChilds, ListsEvents, Parent
+from .serializers import EventSerializer
+
+# Лента мероприятий родителя хранится в кэше вместе с версиями всего, от чего она зависит:
+# самого родителя (состав детей и их группы), групп (их образовательная программа)
+# и программ (их ListsEvents, сами мероприятия и их сотрудники). Изменение любой из этих сущностей
+# меняет её версию, и при следующем чтении лента строится заново.
+# count_participants внутри ленты может отставать не более чем на FEED_TTL.
+FEED_TTL = 60 * 5
+VERSION_TTL = 60 * 60 * 24
+
+
+def _version_key(kind, pk):
+    return f'feed:ver:{kind}:{pk}'
+
+
+def _feed_key(user_id):
+    return f'feed:user:{user_id}'
+
+
+def _bump(kind, pks):
+    # Новая случайная версия, а не счётчик: потерянный из кэша ключ не может совпасть со старой версией
+    cache.set_many({_version_key(kind, pk): uuid.uuid4().hex for pk in set(pks)}, VERSION_TTL)
+
+
+def _current_versions(keys):
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, VERSION_TTL)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def invalidate_parents(parent_ids):
+    _bump('parent', parent_ids)
+
+
+def invalidate_children(child_ids):
+    invalidate_parents(ParentsChilds.objects.filter(child_id__in=child_ids).values_list('parent_id', flat=True))
+
+
+def invalidate_groups(group_ids):
+    _bump('group', group_ids)
+
+
+def invalidate_programs(program_ids):
+    _bump('program', program_ids)
+
+
+def invalidate_events(event_ids):
+    invalidate_programs(ListsEvents.objects.filter(event_id__in=event_ids).values_list('educational_program_id', flat=True))
+
+
+def _build_feed(user_id):
+    parent_id = Parent.objects.values_list('id', flat=True).get(user_id=user_id)
+    parent_key = _version_key('parent', parent_id)
+    # Версию родителя читаем до запросов к БД: изменение во время построения ленты будет замечено
+    versions = _current_versions([parent_key])
+
+    links = list(Child.objects.filter(parentschilds__parent_id=parent_id)
+                 .values_list('group_id', 'group__educational_program_id'))
+    group_ids = {group_id for group_id, _ in links}
+    program_ids = {program_id for _, program_id in links}
+    versions.update(_current_versions([_version_key('group', pk) for pk in group_ids] +
+                                      [_version_key('program', pk) for pk in program_ids]))
+
+    events = dates = None
+    if links:
+        # Подзапрос вместо JOIN + DISTINCT: мероприятие нескольких программ не дублируется без сортировки всех колонок
+        queryset = EventSerializer.setup_eager_loading(Event.objects.filter(
+            id__in=ListsEvents.objects.filter(educational_program_id__in=program_ids).values('event_id')
+        )).order_by('date_event', 'id')
+        queryset = list(queryset)
+        events = list(EventSerializer(queryset, many=True).data)  # без ссылки на сериализатор, чтобы не попал в кэш
+        # Моменты мероприятий по возрастанию - для выборки диапазона дат через bisect
+        dates = [event.date_event.timestamp() for event in queryset]
+
+    entry = {'versions': versions, 'events': events, 'dates': dates, 'built_at': timezone.now()}
+    cache.set(_feed_key(user_id), entry, FEED_TTL)
+    return entry
+
+
+def get_parent_feed_entry(user_id):
+    """
+    Актуальная запись ленты из кэша (или построенная заново): events - мероприятия по date_event,
+    dates - их моменты (timestamp), versions - версии, от которых зависит лента, built_at - время построения.
+    Бросает Parent.DoesNotExist, если у пользователя нет профиля родителя.
+    """
+    entry = cache.get(_feed_key(user_id))
+    if entry is not None and 'dates' in entry:
+        versions = entry['versions']
+        if cache.get_many(list(versions)) == versions:
+            return entry
+    return _build_feed(user_id)
+
+
+def date_bounds(entry, start=None, end=None):
+    """Срез [low, high) записи ленты с start <= date_event < end (границы - aware datetime или None)."""
+    dates = entry['dates'] or []
+    low = bisect.bisect_left(dates, start.timestamp()) if start is not None else 0
+    high = bisect.bisect_left(dates, end.timestamp()) if end is not None else len(dates)
+    return low, high
+
+
+def slice_by_dates(entry, start=None, end=None):
+    """Мероприятия записи ленты в диапазоне [start, end) или None, если детей нет."""
+    events = entry['events']
+    if events is None or (start is None and end is None):
+        return events
+    low, high = date_bounds(entry, start, end)
+    return events[low:high]
+
+
+def get_parent_event_feed(user_id, start=None, end=None):
+    """
+    Возвращает список мероприятий для групп детей родителя (по date_event, в диапазоне [start, end),
+    если он задан) или None, если детей нет.
+    Бросает Parent.DoesNotExist, если у пользователя нет профиля родителя.
+    """
+    return slice_by_dates(get_parent_feed_entry(user_id), start, end)
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class HashingPoolBusy(Exception):
+    """Очередь пула хеширования заполнена."""
+
+
+class HashingPool:
+    """
+    Ограниченный пул потоков для PBKDF2. hashlib.pbkdf2_hmac отпускает GIL,
+    поэтому хеширование идёт параллельно и не занимает цикл событий ASGI.
+    Одновременно в пуле не больше max_queue задач (выполняющихся и ожидающих),
+    остальные сразу отклоняются, чтобы всплеск входов не накапливался в памяти.
+    """
+
+    def __init__(self, workers=None, max_queue=64):
+        self.workers = workers or os.cpu_count() or 2
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0  # задачи, ожидающие свободного потока
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_pending = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+
+    def _get_executor(self):
+        # Потоки создаются при первом обращении, а не при импорте модуля
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hashing')
+        return self._executor
+
+    def _run(self, queued_at, func, args):
+        started = time.perf_counter()
+        with self._lock:
+            self.pending -= 1
+            self.active += 1
+            self.wait_time += started - queued_at
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.run_time += time.perf_counter() - started
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending + self.active >= self.max_queue:
+                self.rejected += 1
+                raise HashingPoolBusy()
+            executor = self._get_executor()
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        future = executor.submit(self._run, time.perf_counter(), func, args)
+        return await asyncio.wrap_future(future)
+
+    async def make_password(self, password):
+        return await self.run(make_password, password)
+
+    async def check_password(self, password, encoded):
+        return await self.run(check_password, password, encoded)
+
+    def stats(self):
+        with self._lock:
+            completed = self.completed or 1
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'pending': self.pending,
+                'active': self.active,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': self.wait_time * 1000 / completed,
+                'avg_run_ms': self.run_time * 1000 / completed,
+            }
+
+
+_config = getattr(settings, 'PASSWORD_HASHING_POOL', {})
+hashing_pool = HashingPool(workers=_config.get('WORKERS'), max_queue=_config.get('MAX_QUEUE', 64))
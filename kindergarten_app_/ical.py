@@ -0,0 +1,192 @@
+"""
+Подписка на мероприятия в формате iCalendar (RFC 5545): api/calendar/feed.ics?token=.
+
+Календарные приложения не передают заголовок Authorization, поэтому лента открывается
+по ссылке с токеном календаря: id пользователя и HMAC от его id и хэша пароля. Смена пароля
+отзывает все выданные ссылки, хранить токены в БД не нужно.
+
+Приложения опрашивают ленту каждые несколько минут, поэтому ответ снабжается ETag и
+Cache-Control: private. Для родителя ETag считается по версиям кэшированной ленты из feeds.py
+(попадание в кэш не обращается к БД), для сотрудника - по одному агрегату Max(updated_at)/Count
+по индексу (employee, date_event). Тело календаря отдаётся потоком по мере чтения мероприятий.
+"""
+import datetime
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from . import event_ranges, feeds
+from .models import User, Event, Parent
+
+ICAL_ROLES = ('Parent', 'Employee')
+ICAL_WINDOW_DAYS = 180  # без ?from= лента начинается за полгода до текущей даты
+ICAL_MAX_AGE = 300
+ICAL_CHUNK_SIZE = 500
+ICAL_CONTENT_TYPE = 'text/calendar; charset=utf-8'
+UID_DOMAIN = 'kindergarten'
+
+
+def _token_digest(user):
+    return salted_hmac('ical', f'{user.pk}{user.password}').hexdigest()
+
+
+def calendar_token(user):
+    return f'{user.pk}-{_token_digest(user)}'
+
+
+def user_from_token(token):
+    """Активный пользователь с ролью родителя или сотрудника по токену календаря или None."""
+    user_id, _, digest = (token or '').partition('-')
+    if not user_id.isdigit() or not digest:
+        return None
+    user = User.objects.filter(pk=int(user_id), is_active=True, role__in=ICAL_ROLES).first()
+    if user is None or not constant_time_compare(digest, _token_digest(user)):
+        return None
+    return user
+
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    # Строки длиннее 75 октетов переносятся с пробелом в начале продолжения, не разрывая символ UTF-8
+    if len(line.encode()) <= 75:
+        return line + '\r\n'
+    parts, current, size = [], '', 0
+    for char in line:
+        length = len(char.encode())
+        if size + length > 75:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += length
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def _utc(moment):
+    return moment.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _vevent(event_id, name, date_event, stamp, last_modified=None):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event_id}@{UID_DOMAIN}',
+        f'DTSTAMP:{_utc(stamp)}',
+        f'DTSTART:{_utc(date_event)}',
+        f'SUMMARY:{_escape(name)}',
+    ]
+    if last_modified is not None:
+        lines.append(f'LAST-MODIFIED:{_utc(last_modified)}')
+    lines.append('END:VEVENT')
+    return ''.join(_fold(line) for line in lines)
+
+
+def _calendar_chunks(title, vevents):
+    yield ''.join(_fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:-//{UID_DOMAIN}//events//RU',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_escape(title)}',
+    ])
+    chunk = []
+    for vevent in vevents:
+        chunk.append(vevent)
+        if len(chunk) == ICAL_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append('END:VCALENDAR\r\n')
+    yield ''.join(chunk)
+
+
+class CalendarFeed:
+    """Лента пользователя в диапазоне [start, end): etag() для условного GET и chunks() для тела ответа."""
+
+    def __init__(self, user, start, end):
+        self.user = user
+        if start is None:
+            # Начало дня, а не текущий момент: иначе ETag менялся бы при каждом запросе
+            day = timezone.localdate() - datetime.timedelta(days=ICAL_WINDOW_DAYS)
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+        self.start = start
+        self.end = end
+
+    def _hash(self, values):
+        return hashlib.md5(repr((self.user.pk, values, self.start, self.end)).encode()).hexdigest()
+
+
+class ParentCalendarFeed(CalendarFeed):
+    title = 'Мероприятия групп детей'
+
+    def __init__(self, user, start, end):
+        super().__init__(user, start, end)
+        # Бросает Parent.DoesNotExist, если у пользователя нет профиля родителя
+        self.entry = feeds.get_parent_feed_entry(user.id)
+
+    def etag(self):
+        return self._hash(sorted(self.entry['versions'].items()))
+
+    def chunks(self):
+        entry = self.entry
+        low, high = feeds.date_bounds(entry, self.start, self.end)
+        stamp = entry['built_at']
+        events, dates = entry['events'] or [], entry['dates'] or []
+        vevents = (
+            _vevent(event['id'], event['name'], datetime.datetime.fromtimestamp(moment, datetime.timezone.utc), stamp)
+            for event, moment in zip(events[low:high], dates[low:high])
+        )
+        return _calendar_chunks(self.title, vevents)
+
+
+class EmployeeCalendarFeed(CalendarFeed):
+    title = 'Мои мероприятия'
+
+    def _queryset(self):
+        return event_ranges.filter_range(Event.objects.filter(employee__user_id=self.user.id), self.start, self.end)
+
+    def etag(self):
+        # Изменение мероприятия меняет Max(updated_at), удаление - Count
+        state = self._queryset().aggregate(last=Max('updated_at'), count=Count('id'))
+        return self._hash((state['last'], state['count']))
+
+    def chunks(self):
+        stamp = timezone.now()
+        rows = (self._queryset().order_by('date_event', 'id')
+                .values_list('id', 'name', 'date_event', 'updated_at').iterator(chunk_size=ICAL_CHUNK_SIZE))
+        vevents = (_vevent(event_id, name, date_event, stamp, updated_at)
+                   for event_id, name, date_event, updated_at in rows)
+        return _calendar_chunks(self.title, vevents)
+
+
+def calendar_feed(request):
+    """
+    Лента для запроса к feed.ics (считается один раз и запоминается в запросе): CalendarFeed или None,
+    если токен неверный или у родителя нет профиля. RangeError при неверных ?from=/?to=.
+    """
+    if not hasattr(request, '_calendar_feed'):
+        feed = None
+        user = user_from_token(request.GET.get('token'))
+        if user is not None:
+            start, end = event_ranges.parse_range(request.GET)
+            if user.role == 'Parent':
+                try:
+                    feed = ParentCalendarFeed(user, start, end)
+                except Parent.DoesNotExist:
+                    feed = None
+            else:
+                feed = EmployeeCalendarFeed(user, start, end)
+        request._calendar_feed = feed
+    return request._calendar_feed
+
+
+def calendar_etag(request):
+    try:
+        feed = calendar_feed(request)
+    except event_ranges.RangeError:
+        return None
+    return feed.etag() if feed is not None else None
@@ -0,0 +1,180 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from kindergarten_app_.benchmark import DatasetConfig, ROUTES, CONNECTION_MODES, seed_dataset, run_benchmark, \
+    run_concurrency_comparison, run_connection_modes, run_signup_benchmark, uncovered_routes, skipped_routes, \
+    failed_results, environment_info, compare
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон всех маршрутов API на временной тестовой базе '
+            '(SQLite при DB_ENGINE=sqlite или test_<NAME> в PostgreSQL)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=DatasetConfig.groups)
+        parser.add_argument('--parents', type=int, default=DatasetConfig.parents)
+        parser.add_argument('--children', type=int, default=DatasetConfig.children)
+        parser.add_argument('--events', type=int, default=DatasetConfig.events)
+        parser.add_argument('--participants-per-event', type=int, default=DatasetConfig.participants_per_event)
+        parser.add_argument('--seed', type=int, default=DatasetConfig.seed)
+        parser.add_argument('--iterations', type=int, default=50, help='Замеров на маршрут')
+        parser.add_argument('--warmup', type=int, default=2, help='Прогревочных вызовов на маршрут')
+        parser.add_argument('--routes', nargs='*', help='Имена маршрутов (по умолчанию все)')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу после прогона')
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help='Сравнить sync и async представления чтения при N одновременных запросах')
+        parser.add_argument('--concurrent-requests', type=int, default=200,
+                            help='Запросов на маршрут при сравнении --concurrency')
+        parser.add_argument('--connection-modes', nargs='+', choices=CONNECTION_MODES,
+                            help='Сравнить режимы соединений с БД на коротких запросах (только PostgreSQL); '
+                                 'маршруты задаются --routes')
+        parser.add_argument('--signups', type=int, default=0,
+                            help='Только одновременная запись N детей на мероприятие с ограниченной вместимостью '
+                                 '(только PostgreSQL)')
+        parser.add_argument('--signup-concurrency', type=int, default=50, help='Потоков при --signups')
+        parser.add_argument('--capacity', type=int, default=100, help='Вместимость мероприятия при --signups')
+        parser.add_argument('--cancellations', type=int, default=20,
+                            help='Отмен занятых мест после записи при --signups')
+
+    def handle(self, *args, **options):
+        known = {route.name for route in ROUTES}
+        unknown = set(options['routes'] or []) - known
+        if unknown:
+            raise CommandError(f'Неизвестные маршруты: {", ".join(sorted(unknown))}')
+        # Прогон должен покрывать все маршруты urls.py: новый маршрут добавляется вместе со сценарием в ROUTES
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(f'Маршруты без сценария в benchmark.ROUTES: {", ".join(missing)}')
+
+        if options['connection_modes'] and connection.vendor != 'postgresql':
+            raise CommandError('--connection-modes поддерживается только для PostgreSQL')
+        if options['signups'] and connection.vendor != 'postgresql':
+            raise CommandError('--signups поддерживается только для PostgreSQL')
+        if options['signups'] > options['parents']:
+            raise CommandError('--signups не может быть больше --parents')
+
+        config = DatasetConfig(
+            groups=options['groups'], parents=options['parents'], children=options['children'],
+            events=options['events'], participants_per_event=options['participants_per_event'],
+            seed=options['seed'],
+        )
+
+        # Все замеры идут на отдельной тестовой базе, рабочие данные не затрагиваются
+        setup_test_environment()
+        request_logger = logging.getLogger('django.request')
+        old_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)  # ожидаемые 4xx/5xx не засоряют вывод
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            ctx = seed_dataset(config)
+            connection_modes = signups = None
+            if options['signups']:
+                # Только запись на мероприятие, без полного прогона маршрутов
+                routes = {}
+                try:
+                    signups = run_signup_benchmark(ctx, options['signups'], options['signup_concurrency'],
+                                                   options['capacity'], options['cancellations'])
+                except ValueError as error:
+                    raise CommandError(str(error))
+            elif options['connection_modes']:
+                # Только сравнение режимов соединений, без полного прогона маршрутов
+                routes = {}
+                connection_modes = run_connection_modes(ctx, options['iterations'], options['connection_modes'],
+                                                        options['routes'], warmup=options['warmup'])
+            else:
+                routes = run_benchmark(ctx, options['iterations'], options['routes'], warmup=options['warmup'])
+            concurrency = None
+            if options['concurrency'] > 0:
+                concurrency = run_concurrency_comparison(ctx, options['concurrent_requests'],
+                                                         options['concurrency'], options['routes'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            request_logger.setLevel(old_level)
+            teardown_test_environment()
+
+        report = {'environment': environment_info(config, options['iterations']), 'routes': routes}
+        if routes:
+            report['skipped'] = skipped_routes(options['routes'])
+        if concurrency is not None:
+            report['concurrency'] = concurrency
+        if connection_modes is not None:
+            report['connection_modes'] = connection_modes
+        if signups is not None:
+            report['signups'] = signups
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                report['compare'] = compare(report, json.load(baseline_file))
+
+        self._print_table(report)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
+
+        # Задержки ответов с ошибкой не сравнимы с задержками успешных - такой прогон считается неудачным
+        failed = failed_results(report)
+        if failed:
+            raise CommandError(f'Ответы не 2xx/3xx: {", ".join(failed)}')
+
+    def _print_table(self, report):
+        if report['routes']:
+            self._print_routes(report)
+        self._print_sections(report)
+
+    def _print_routes(self, report):
+        self.stdout.write(f'{"route":36} {"method":6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                          f'{"queries":>8} {"rps":>8}  statuses')
+        for name, result in report['routes'].items():
+            statuses = self._statuses(result)
+            self.stdout.write(f'{name[:36]:36} {result["method"]:6} {result["p50_ms"]:>8.2f} '
+                              f'{result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f} {result["queries_mean"]:>8.1f} '
+                              f'{result["throughput_rps"]:>8.1f}  {statuses}')
+        for name, reason in report.get('skipped', {}).items():
+            self.stdout.write(self.style.WARNING(f'{name[:36]:36} пропущен: {reason}'))
+        for name, ratios in report.get('compare', {}).items():
+            formatted = ', '.join(f'{key} x{value:.2f}' for key, value in ratios.items())
+            self.stdout.write(f'  {name}: {formatted}')
+
+    def _print_sections(self, report):
+        if 'connection_modes' in report:
+            self.stdout.write(f'{"route (connection mode)":36} {"mode":10} {"p50 ms":>8} {"p95 ms":>8} '
+                              f'{"p99 ms":>8} {"rps":>8}  statuses')
+            for mode, mode_result in report['connection_modes'].items():
+                for name, result in mode_result['routes'].items():
+                    statuses = self._statuses(result)
+                    self.stdout.write(f'{name[:36]:36} {mode:10} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} '
+                                      f'{result["p99_ms"]:>8.2f} {result["throughput_rps"]:>8.1f}  {statuses}')
+                if mode_result['pool_stats']:
+                    self.stdout.write(f'  pool: {mode_result["pool_stats"]}')
+        if 'signups' in report:
+            self.stdout.write(f'{"signups (allocation)":36} {"phase":6} {"p50 ms":>8} {"p95 ms":>8} '
+                              f'{"p99 ms":>8} {"rps":>8}  statuses')
+            for phase, result in report['signups'].items():
+                if result is None:
+                    continue
+                statuses = self._statuses(result)
+                self.stdout.write(f'{"concurrency " + str(result["concurrency"]):36} {phase:6} '
+                                  f'{result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f} '
+                                  f'{result["throughput_rps"]:>8.1f}  {statuses}')
+                checks = {key: result[key] for key in ('capacity', 'registered', 'waitlisted', 'order_inversions',
+                                                       'promoted', 'promoted_in_order', 'counter_ok') if key in result}
+                self.stdout.write('  ' + ', '.join(f'{key}={value}' for key, value in checks.items()))
+        if 'concurrency' in report:
+            self.stdout.write('')
+            self.stdout.write(f'{"route (sync / async)":36} {"mode":6} {"p50 ms":>8} {"p95 ms":>8} '
+                              f'{"p99 ms":>8} {"rps":>8}  statuses')
+            for name, row in report['concurrency'].items():
+                for mode, result in row.items():
+                    statuses = self._statuses(result)
+                    self.stdout.write(f'{name[:36]:36} {mode:6} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} '
+                                      f'{result["p99_ms"]:>8.2f} {result["throughput_rps"]:>8.1f}  {statuses}')
+
+    def _statuses(self, result):
+        statuses = ', '.join(f'{code}x{count}' for code, count in sorted(result['status_counts'].items()))
+        return statuses + (self.style.ERROR('  ОШИБКИ') if result['errors'] else '')
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from kindergarten_app_ import allocation
+from kindergarten_app_.models import Group, Event, Child, ListParticipants, ParticipantStatus
+
+
+def _count_subquery(model, fk_name, conditions):
+    # Коррелированный подзапрос: число связанных строк для каждой строки внешнего запроса
+    rows = model.objects.filter(**{fk_name: OuterRef('pk')}, **conditions).order_by().values(fk_name)
+    return Coalesce(Subquery(rows.annotate(total=Count('pk')).values('total')), Value(0))
+
+
+COUNTERS = [
+    # (модель, поле-счётчик, модель связанных строк, внешний ключ на модель, условия на связанные строки)
+    (Group, 'count_children', Child, 'group', {}),
+    # Места занимают только записи registered, лист ожидания не считается
+    (Event, 'count_participants', ListParticipants, 'event', {'status': ParticipantStatus.REGISTERED}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Проверяет Group.count_children и Event.count_participants и при --fix исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Исправить найденные расхождения')
+
+    def handle(self, *args, **options):
+        total_mismatches = 0
+        for model, field, related_model, fk_name, conditions in COUNTERS:
+            actual = _count_subquery(related_model, fk_name, conditions)
+            mismatched = model.objects.annotate(actual=actual).exclude(**{field: F('actual')})
+            rows = list(mismatched.values_list('pk', field, 'actual'))
+            total_mismatches += len(rows)
+
+            for pk, stored, real in rows:
+                self.stdout.write(f'{model.__name__} {pk}: {field}={stored}, фактически {real}')
+
+            if rows and options['fix']:
+                with transaction.atomic():
+                    # Один UPDATE на модель: значение пересчитывается подзапросом в БД
+                    model.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(**{field: actual}, updated_at=timezone.now())
+                self.stdout.write(self.style.SUCCESS(f'{model.__name__}: исправлено {len(rows)}'))
+
+        # Лист ожидания при свободных местах: перевод не состоялся (например, процесс упал до on_commit)
+        waiting = ListParticipants.objects.filter(event=OuterRef('pk'), status=ParticipantStatus.WAITLISTED)
+        stalled = list(Event.objects.filter(Exists(waiting), Q(capacity__isnull=True)
+                                            | Q(count_participants__lt=F('capacity')))
+                       .order_by('pk').values_list('pk', flat=True))
+        total_mismatches += len(stalled)
+        for pk in stalled:
+            self.stdout.write(f'Event {pk}: есть свободные места и лист ожидания')
+        if stalled and options['fix']:
+            promoted = allocation.fill_seats(stalled)
+            self.stdout.write(self.style.SUCCESS(f'Event: из листа ожидания переведено {len(promoted)}'))
+
+        if not total_mismatches:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+        elif not options['fix']:
+            self.stdout.write(self.style.WARNING(f'Найдено расхождений: {total_mismatches}. Запустите с --fix'))
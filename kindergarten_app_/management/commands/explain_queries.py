@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from kindergarten_app_.dataset import GeneratorConfig, generate
+from kindergarten_app_.explain import QUERIES, explain_all, sample_context
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN основных запросов представлений с отметкой полных просмотров больших таблиц '
+            '(Seq Scan в PostgreSQL, SCAN без индекса в SQLite)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true',
+                            help='Запустить на временной тестовой базе, заполненной генератором данных')
+        parser.add_argument('--parents', type=int, default=20000, help='Родителей при --seed')
+        parser.add_argument('--children', type=int, default=30000, help='Детей при --seed')
+        parser.add_argument('--events', type=int, default=2000, help='Мероприятий при --seed')
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Полный просмотр таблиц меньшего размера не отмечается')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (только PostgreSQL)')
+        parser.add_argument('--queries', nargs='*', help='Имена запросов (по умолчанию все)')
+        parser.add_argument('--plans', action='store_true', help='Печатать планы целиком')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Завершиться с ошибкой, если есть отмеченные полные просмотры')
+
+    def handle(self, *args, **options):
+        unknown = set(options['queries'] or []) - {query.name for query in QUERIES}
+        if unknown:
+            raise CommandError(f'Неизвестные запросы: {", ".join(sorted(unknown))}')
+
+        if not options['seed']:
+            results = self._explain(options)
+        else:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                generate(GeneratorConfig(parents=options['parents'], children=options['children'],
+                                         events=options['events'], groups=100, programs=20),
+                         progress=lambda message: self.stderr.write(message))
+                # Статистика планировщика должна учитывать только что загруженные данные
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                results = self._explain(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        flagged = {name: result['full_scans'] for name, result in results.items() if result['full_scans']}
+        if options['json']:
+            self.stdout.write(json.dumps({'database': connection.vendor, 'queries': results},
+                                         ensure_ascii=False, indent=2))
+        else:
+            self._print(results, options['plans'])
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f'Полный просмотр таблиц в запросах: {", ".join(flagged)}')
+
+    def _explain(self, options):
+        ctx = sample_context()
+        if ctx is None:
+            raise CommandError('В базе нет родителя с детьми и мероприятий; используйте --seed')
+        return explain_all(ctx, min_rows=options['min_rows'], analyze=options['analyze'], names=options['queries'])
+
+    def _print(self, results, plans):
+        for name, result in results.items():
+            if result['full_scans']:
+                self.stdout.write(self.style.WARNING(f'SCAN  {name}: {", ".join(result["full_scans"])}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'ok    {name}'))
+            if plans:
+                for line in result['plan'].splitlines():
+                    self.stdout.write(f'        {line}')
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from kindergarten_app_.dataset import GeneratorConfig, generate
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетические данные (родители, дети, группы, мероприятия) пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        defaults = GeneratorConfig()
+        parser.add_argument('--parents', type=int, default=defaults.parents)
+        parser.add_argument('--children', type=int, default=defaults.children)
+        parser.add_argument('--groups', type=int, default=defaults.groups)
+        parser.add_argument('--programs', type=int, default=defaults.programs)
+        parser.add_argument('--employees', type=int, default=defaults.employees,
+                            help='Не больше числа свободных квалификаций (квалификация уникальна)')
+        parser.add_argument('--admins', type=int, default=defaults.admins)
+        parser.add_argument('--events', type=int, default=defaults.events)
+        parser.add_argument('--participants-per-event', type=int, default=defaults.participants_per_event)
+        parser.add_argument('--second-parent-rate', type=float, default=defaults.second_parent_rate)
+        parser.add_argument('--contraindication-rate', type=float, default=defaults.contraindication_rate)
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--password', default=defaults.password, help='Общий пароль всех пользователей')
+        parser.add_argument('--prefix', default=defaults.prefix,
+                            help='Префикс имён пользователей (по умолчанию gen<seed>)')
+        parser.add_argument('--batch-size', type=int, default=defaults.batch_size)
+
+    def handle(self, *args, **options):
+        config = GeneratorConfig(
+            parents=options['parents'], children=options['children'], groups=options['groups'],
+            programs=options['programs'], employees=options['employees'], admins=options['admins'],
+            events=options['events'], participants_per_event=options['participants_per_event'],
+            second_parent_rate=options['second_parent_rate'], contraindication_rate=options['contraindication_rate'],
+            seed=options['seed'], password=options['password'], prefix=options['prefix'],
+            batch_size=options['batch_size'],
+        )
+        if config.children and not config.parents:
+            raise CommandError('Для детей нужен хотя бы один родитель (--parents)')
+
+        started = time.monotonic()
+        try:
+            result = generate(config, progress=lambda message: self.stdout.write(message))
+        except ValueError as error:
+            raise CommandError(str(error))
+        except IntegrityError as error:
+            # Генерация идёт в одной транзакции - при конфликте ничего не создано
+            raise CommandError(f'Данные конфликтуют с уже созданными ({error}). '
+                               f'Передайте другой --prefix или --seed')
+
+        elapsed = time.monotonic() - started
+        summary = ', '.join(f'{name}: {count}' for name, count in result.counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Готово за {elapsed:.1f} с. {summary}'))
@@ -0,0 +1,52 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kindergarten_app_.roster import BATCH_SIZE, FILE_TYPES, RosterError, file_type_from_name, import_roster
+
+
+class Command(BaseCommand):
+    help = ('Импортирует детей, родителей и противопоказания из CSV/XLSX построчно, '
+            'записывая пачками через bulk_create (формат колонок - в kindergarten_app_/roster.py)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv или .xlsx')
+        parser.add_argument('--file-type', choices=FILE_TYPES, help='Тип файла, если не определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл, ничего не записывая')
+        parser.add_argument('--json', action='store_true', help='Вывести отчёт в JSON')
+
+    def handle(self, *args, **options):
+        file_type = options['file_type'] or file_type_from_name(options['path'])
+        if file_type is None:
+            raise CommandError('Не удалось определить тип файла, укажите --file-type')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as binary_file:
+                report = import_roster(binary_file, file_type, batch_size=options['batch_size'],
+                                       dry_run=options['dry_run'])
+        except (OSError, RosterError) as error:
+            raise CommandError(str(error))
+        elapsed = time.monotonic() - started
+
+        if options['json']:
+            self.stdout.write(json.dumps(report.as_dict(), ensure_ascii=False, indent=2, default=str))
+            return
+
+        for item in report.errors:
+            self.stdout.write(f'Строка {item["row"]}: {json.dumps(item["errors"], ensure_ascii=False, default=str)}')
+        if report.error_rows > len(report.errors):
+            self.stdout.write(f'... и ещё {report.error_rows - len(report.errors)} строк с ошибками')
+        if report.error:
+            self.stderr.write(self.style.ERROR(f'Импорт прерван: {report.error}'))
+
+        prefix = 'Проверено (без записи)' if report.dry_run else 'Импортировано'
+        summary = (f'{prefix} за {elapsed:.1f} с. Строк: {report.rows}, детей: {report.children_created}, '
+                   f'новых родителей: {report.parents_created}, существующих родителей: {report.parents_reused}, '
+                   f'противопоказаний: {report.contraindications_created}, строк с ошибками: {report.error_rows}')
+        style = self.style.WARNING if report.error_rows or report.error else self.style.SUCCESS
+        self.stdout.write(style(summary))
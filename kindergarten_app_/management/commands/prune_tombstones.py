@@ -0,0 +1,22 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from kindergarten_app_.models import Tombstone
+from kindergarten_app_.sync import SYNC_TOMBSTONE_RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    help = ('Удаляет записи Tombstone старше срока хранения: клиенты с более старым курсором '
+            'всё равно получают полную синхронизацию')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=SYNC_TOMBSTONE_RETENTION_DAYS,
+                            help='Срок хранения в днях (не меньше SYNC_TOMBSTONE_RETENTION_DAYS)')
+
+    def handle(self, *args, **options):
+        days = max(options['days'], SYNC_TOMBSTONE_RETENTION_DAYS)
+        border = timezone.now() - datetime.timedelta(days=days)
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=border).delete()
+        self.stdout.write(f'Удалено записей Tombstone: {deleted}')
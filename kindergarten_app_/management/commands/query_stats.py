@@ -0,0 +1,57 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from kindergarten_app_.middleware import merge_snapshots, with_averages
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику SQL по эндпоинтам, собранную QueryStatsMiddleware во всех процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Вывести в JSON')
+        parser.add_argument('--sort', default='sql_time',
+                            choices=['sql_time', 'total_time', 'queries', 'requests', 'serializer_time'],
+                            help='Поле для сортировки (суммарное по эндпоинту)')
+        parser.add_argument('--reset', action='store_true', help='Удалить собранную статистику')
+
+    def handle(self, *args, **options):
+        directory = getattr(settings, 'QUERY_STATS', {}).get('DIR')
+        if not directory:
+            raise CommandError("Не задан QUERY_STATS['DIR'] в настройках")
+
+        files = sorted(Path(directory).glob('*.json'))
+        if options['reset']:
+            for path in files:
+                path.unlink(missing_ok=True)
+            self.stdout.write(self.style.SUCCESS(f'Удалено файлов: {len(files)}'))
+            return
+
+        snapshots = []
+        for path in files:
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue  # файл мог быть удалён или ещё не дописан
+        stats = with_averages(merge_snapshots(snapshots))
+
+        if options['json']:
+            self.stdout.write(json.dumps(stats, ensure_ascii=False, indent=2))
+            return
+
+        if not stats:
+            self.stdout.write('Статистики пока нет')
+            return
+
+        self.stdout.write(f'{"endpoint":40} {"req":>7} {"avg q":>7} {"max q":>6} {"avg sql ms":>11} '
+                          f'{"avg ser ms":>11} {"avg ms":>9} {"avg bytes":>10}')
+        ordered = sorted(stats.items(), key=lambda item: item[1][options['sort']], reverse=True)
+        for name, entry in ordered:
+            self.stdout.write(f'{name[:40]:40} {entry["requests"]:>7} {entry["avg_queries"]:>7.1f} '
+                              f'{entry["max_queries"]:>6} {entry["avg_sql_ms"]:>11.2f} '
+                              f'{entry["avg_serializer_ms"]:>11.2f} {entry["avg_total_ms"]:>9.2f} '
+                              f'{entry["avg_response_bytes"]:>10.0f}')
+            if entry['slowest_sql']:
+                self.stdout.write(f'    slowest ({entry["slowest_sql_time"] * 1000:.2f} ms): {entry["slowest_sql"][:200]}')
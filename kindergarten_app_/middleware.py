@@ -0,0 +1,231 @@
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .request_stats import RequestStats, current_stats
+
+SLOWEST_SQL_LENGTH = 500
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    # Статистика берётся из contextvar, поэтому запросы учитываются и из потоков sync_to_async
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - start)
+
+
+def _install_execute_wrapper(connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+connection_created.connect(_install_execute_wrapper)
+
+
+class StatsRegistry:
+    """Агрегированная статистика по имени URL в пределах процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, name, stats, total_time, response_size):
+        with self._lock:
+            entry = self._endpoints.get(name)
+            if entry is None:
+                entry = self._endpoints[name] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_time': 0.0, 'total_time': 0.0,
+                    'serializer_time': 0.0, 'response_bytes': 0, 'slowest_sql_time': 0.0, 'slowest_sql': None,
+                }
+            entry['requests'] += 1
+            entry['queries'] += stats.queries
+            entry['max_queries'] = max(entry['max_queries'], stats.queries)
+            entry['sql_time'] += stats.sql_time
+            entry['total_time'] += total_time
+            entry['serializer_time'] += stats.serializer_time
+            entry['response_bytes'] += response_size
+            if stats.slowest_time > entry['slowest_sql_time']:
+                entry['slowest_sql_time'] = stats.slowest_time
+                entry['slowest_sql'] = stats.slowest_sql[:SLOWEST_SQL_LENGTH]
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._endpoints.items()}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def flush_if_due(self, directory, interval):
+        # Каждый процесс пишет свой файл; management-команда query_stats их объединяет
+        now = time.monotonic()
+        if now - self._last_flush < interval:
+            return
+        self._last_flush = now
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}.json'
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.snapshot()))
+        tmp_path.replace(path)
+
+
+registry = StatsRegistry()
+
+
+def merge_snapshots(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = dict(entry)
+                continue
+            for key in ('requests', 'queries', 'sql_time', 'total_time', 'serializer_time', 'response_bytes'):
+                target[key] += entry[key]
+            target['max_queries'] = max(target['max_queries'], entry['max_queries'])
+            if entry['slowest_sql_time'] > target['slowest_sql_time']:
+                target['slowest_sql_time'] = entry['slowest_sql_time']
+                target['slowest_sql'] = entry['slowest_sql']
+    return merged
+
+
+def with_averages(snapshot):
+    result = {}
+    for name, entry in snapshot.items():
+        requests = entry['requests'] or 1
+        result[name] = dict(
+            entry,
+            avg_queries=entry['queries'] / requests,
+            avg_sql_ms=entry['sql_time'] * 1000 / requests,
+            avg_total_ms=entry['total_time'] * 1000 / requests,
+            avg_serializer_ms=entry['serializer_time'] * 1000 / requests,
+            avg_response_bytes=entry['response_bytes'] / requests,
+        )
+    return result
+
+
+class QueryStatsMiddleware:
+    """
+    Считает для каждого запроса число SQL-запросов, суммарное время SQL, самый медленный запрос,
+    время сериализаторов и размер ответа и агрегирует их по имени URL. Запросы к ненайденным путям
+    собираются в одну запись unresolved:<статус>.
+    Учитывается только доля запросов QUERY_STATS['SAMPLE_RATE'], остальные проходят без накладных расходов.
+    Работает и в синхронной цепочке (WSGI), и в асинхронной (ASGI).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        config = getattr(settings, 'QUERY_STATS', {})
+        self.sample_rate = config.get('SAMPLE_RATE', 1.0)
+        self.directory = config.get('DIR')
+        self.flush_interval = config.get('FLUSH_INTERVAL', 30)
+        # Соединения, открытые до загрузки middleware, сигнал connection_created уже пропустили
+        for connection in connections.all(initialized_only=True):
+            _install_execute_wrapper(connection)
+
+    def _sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self._finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self._finish(request, response, stats, start)
+
+    def _finish(self, request, response, stats, start):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # Ненайденные пути (404, сканеры) - одна запись на статус, а не запись на каждый путь
+            name = f'unresolved:{response.status_code}'
+        else:
+            name = match.url_name or match.route
+        if not response.streaming:
+            self._record(name, stats, time.perf_counter() - start, len(response.content))
+        # Тело потокового ответа формируется уже после выхода из middleware: запросы, время и размер
+        # учитываются по мере чтения тела, а статистика записывается, когда оно прочитано или закрыто
+        elif response.is_async:
+            response.streaming_content = self._acounted(response.streaming_content, name, stats, start)
+        else:
+            response.streaming_content = self._counted(response.streaming_content, name, stats, start)
+        return response
+
+    def _counted(self, content, name, stats, start):
+        size = 0
+        iterator = iter(content)
+        try:
+            while True:
+                token = current_stats.set(stats)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    current_stats.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self._record(name, stats, time.perf_counter() - start, size)
+
+    async def _acounted(self, content, name, stats, start):
+        size = 0
+        iterator = aiter(content)
+        try:
+            while True:
+                token = current_stats.set(stats)
+                try:
+                    chunk = await anext(iterator)
+                except StopAsyncIteration:
+                    return
+                finally:
+                    current_stats.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self._record(name, stats, time.perf_counter() - start, size)
+
+    def _record(self, name, stats, total_time, response_size):
+        registry.record(name, stats, total_time, response_size)
+        if self.directory:
+            registry.flush_if_due(self.directory, self.flush_interval)
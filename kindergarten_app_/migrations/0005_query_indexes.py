@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kindergarten_app_', '0004_updated_at'),
+    ]
+
+    # Сначала создаём составные индексы, затем удаляем одиночные индексы FK, которые они покрывают
+    operations = [
+        migrations.AddIndex(
+            model_name='child',
+            index=models.Index(fields=['group', 'birthday'], name='child_group_birthday_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date_event', 'id'], name='event_date_event_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listsevents',
+            index=models.Index(fields=['event', 'educational_program'], name='listsevents_event_program_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parentschilds',
+            index=models.Index(fields=['child', 'parent'], name='parentschilds_child_parent_idx'),
+        ),
+        migrations.AlterField(
+            model_name='child',
+            name='group',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='kindergarten_app_.group'),
+        ),
+        migrations.AlterField(
+            model_name='listparticipants',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='kindergarten_app_.event'),
+        ),
+        migrations.AlterField(
+            model_name='listsevents',
+            name='educational_program',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='kindergarten_app_.educationalprogram'),
+        ),
+        migrations.AlterField(
+            model_name='listsevents',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='kindergarten_app_.event'),
+        ),
+        migrations.AlterField(
+            model_name='parentschilds',
+            name='child',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='kindergarten_app_.child'),
+        ),
+        migrations.AlterField(
+            model_name='parentschilds',
+            name='parent',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='kindergarten_app_.parent'),
+        ),
+    ]
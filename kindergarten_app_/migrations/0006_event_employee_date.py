@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kindergarten_app_', '0005_query_indexes'),
+    ]
+
+    # Составной индекс создаётся до удаления одиночного индекса FK, который он покрывает
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['employee', 'date_event'], name='event_employee_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='employee',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='kindergarten_app_.employee'),
+        ),
+    ]
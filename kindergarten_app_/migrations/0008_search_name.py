@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:52
+
+import re
+
+from django.db import migrations, models, transaction
+
+MODELS = ['child', 'parent', 'employee']
+
+
+def _normalize(*parts):
+    # Копия search.normalize_name на момент миграции
+    text = ' '.join(part for part in parts if part)
+    return re.sub(r'\s+', ' ', text.lower().replace('ё', 'е')).strip()
+
+
+def fill_search_name(apps, schema_editor):
+    for name in MODELS:
+        model = apps.get_model('kindergarten_app_', name)
+        batch = []
+        for obj in model.objects.only('id', 'fname', 'lname', 'patronymic').iterator(chunk_size=2000):
+            obj.search_name = _normalize(obj.lname, obj.fname, obj.patronymic)
+            batch.append(obj)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ['search_name'])
+                batch = []
+        model.objects.bulk_update(batch, ['search_name'])
+
+
+def _has_trigram(schema_editor):
+    # pg_trgm есть не в каждой установке PostgreSQL, а создать расширение может не каждый пользователь
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")
+        if not cursor.fetchone()[0]:
+            return False
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except Exception:
+            return False
+    return True
+
+
+def create_indexes(apps, schema_editor):
+    # Индексы зависят от СУБД, поэтому не описаны в Meta.indexes моделей
+    quote = schema_editor.quote_name
+    postgresql = schema_editor.connection.vendor == 'postgresql'
+    trigram = postgresql and _has_trigram(schema_editor)
+    for name in MODELS:
+        table = quote(apps.get_model('kindergarten_app_', name)._meta.db_table)
+        if postgresql:
+            # LIKE 'префикс%' по индексу не зависит от правил сортировки базы
+            schema_editor.execute(f'CREATE INDEX {name}_search_name_pattern_idx '
+                                  f'ON {table} (search_name varchar_pattern_ops)')
+            if trigram:
+                schema_editor.execute(f'CREATE INDEX {name}_search_name_trgm_idx '
+                                      f'ON {table} USING gin (search_name gin_trgm_ops)')
+        else:
+            schema_editor.execute(f'CREATE INDEX {name}_search_name_idx ON {table} (search_name)')
+
+
+def drop_indexes(apps, schema_editor):
+    for name in MODELS:
+        for suffix in ['pattern_idx', 'trgm_idx', 'idx']:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}_search_name_{suffix}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kindergarten_app_', '0007_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='child',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=160),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=160),
+        ),
+        migrations.AddField(
+            model_name='parent',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=160),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kindergarten_app_', '0008_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listparticipants',
+            name='status',
+            field=models.CharField(choices=[('registered', 'Registered'), ('waitlisted', 'Waitlisted')], default='registered', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='listparticipants',
+            index=models.Index(condition=models.Q(('status', 'waitlisted')), fields=['event', 'id'], name='listparticipants_waitlist_idx'),
+        ),
+    ]
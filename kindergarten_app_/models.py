@@ -1,7 +1,12 @@
-from django.db import models
+from django.db import models, connections
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 
+# Допустимые номера телефонов родителей и сотрудников (phone_number): 11 цифр, начиная с 8
+PHONE_MIN = 80000000000
+PHONE_MAX = 89999999999
+
 # Enum для квалификации сотрудников
 class QualificationEmployees(models.TextChoices):
     TEACHER = 'Воспитатель детского сада'
@@ -27,6 +32,11 @@ class Roles(models.TextChoices):
     EMPLOYEE = 'Employee'
     PARENT = 'Parent'
 
+# Статус записи на мероприятие: занятое место или лист ожидания (allocation.py)
+class ParticipantStatus(models.TextChoices):
+    REGISTERED = 'registered'
+    WAITLISTED = 'waitlisted'
+
 class UserManager(BaseUserManager):
     def create_user(self, username, password=None, **extra_fields):
         if not username:
@@ -62,7 +72,10 @@ class Parent(models.Model):
     lname = models.CharField(max_length=50)
     patronymic = models.CharField(max_length=50, blank=True, null=True)
     phone_number = models.BigIntegerField(unique=True,
-        validators=[MinValueValidator(80000000000), MaxValueValidator(89999999999)])
+        validators=[MinValueValidator(PHONE_MIN), MaxValueValidator(PHONE_MAX)])
+    # «фамилия имя отчество» в нижнем регистре, ё -> е (search.py); индексы - в миграции 0008
+    search_name = models.CharField(max_length=160, default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True)  # для ETag/Last-Modified
 
     def __str__(self):
         return f'{self.lname} {self.fname}'
@@ -75,9 +88,12 @@ class Employee(models.Model):
     gender = models.BooleanField()  # например, True = Мужчина, False = Женщина
     birthday = models.DateField()
     phone_number = models.BigIntegerField(unique=True,
-        validators=[MinValueValidator(80000000000), MaxValueValidator(89999999999)])
+        validators=[MinValueValidator(PHONE_MIN), MaxValueValidator(PHONE_MAX)])
     qualification = models.CharField(max_length=50, choices=QualificationEmployees.choices, unique=True)
     work_experience = models.PositiveIntegerField()
+    # «фамилия имя отчество» в нижнем регистре, ё -> е (search.py); индексы - в миграции 0008
+    search_name = models.CharField(max_length=160, default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.lname} {self.fname}'
@@ -85,6 +101,7 @@ class Employee(models.Model):
 class EducationalProgram(models.Model):
     description = models.TextField()
     age_category_children = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'Программа {self.id}'
@@ -94,6 +111,14 @@ class Group(models.Model):
     age_group = models.CharField(max_length=10, choices=AgeGroups.choices)
     count_children = models.PositiveIntegerField(default=0)
     educational_program = models.ForeignKey(EducationalProgram, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Изменения с момента курсора синхронизации (sync.py)
+            models.Index(fields=['updated_at'], name='group_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -104,18 +129,38 @@ class Child(models.Model):
     patronymic = models.CharField(max_length=50, blank=True, null=True)
     gender = models.BooleanField()  # True/False для пола.
     birthday = models.DateField()
-    group = models.ForeignKey(Group, on_delete=models.PROTECT)  # нельзя удалить группу при наличии детей
+    # нельзя удалить группу при наличии детей; отдельный индекс не нужен - group первая в child_group_birthday_idx
+    group = models.ForeignKey(Group, on_delete=models.PROTECT, db_index=False)
     transfer_date = models.DateField()
+    # «фамилия имя отчество» в нижнем регистре, ё -> е (search.py); индексы - в миграции 0008
+    search_name = models.CharField(max_length=160, default='', editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Дети группы (подсчёт count_children, состав группы), упорядоченные по возрасту
+            models.Index(fields=['group', 'birthday'], name='child_group_birthday_idx'),
+            models.Index(fields=['updated_at'], name='child_updated_at_idx'),
+        ]
 
     def __str__(self):
         return f'{self.lname} {self.fname}'
 
 class ParentsChilds(models.Model):
-    parent = models.ForeignKey(Parent, on_delete=models.CASCADE)
-    child = models.ForeignKey(Child, on_delete=models.CASCADE)
+    # Одиночные индексы FK заменены составными: (parent, child) из unique_together и (child, parent)
+    parent = models.ForeignKey(Parent, on_delete=models.CASCADE, db_index=False)
+    child = models.ForeignKey(Child, on_delete=models.CASCADE, db_index=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('parent', 'child')
+        indexes = [
+            # Родители ребёнка (ChildSerializer.get_parents, feeds.invalidate_children) без обращения к таблице
+            models.Index(fields=['child', 'parent'], name='parentschilds_child_parent_idx'),
+            models.Index(fields=['updated_at'], name='parentschilds_updated_at_idx'),
+        ]
 
 class MedicalContraindicationsChild(models.Model):
     C = models.CharField(max_length=50, unique=True)
@@ -128,18 +173,38 @@ class MedicalContraindicationsChild(models.Model):
 class Event(models.Model):
     name = models.CharField(max_length=50, unique=True)
     date_event = models.DateTimeField()
-    employee = models.ForeignKey(Employee, on_delete=models.PROTECT)
+    # Одиночный индекс FK заменён составным (employee, date_event)
+    employee = models.ForeignKey(Employee, on_delete=models.PROTECT, db_index=False)
+    # Число занятых мест (записей со статусом registered)
     count_participants = models.PositiveIntegerField(default=0)
+    # Вместимость; None - без ограничения. Сверх неё записи попадают в лист ожидания
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Сортировка и keyset-пагинация мероприятий по (date_event, id), диапазоны ?from=/?to=
+            models.Index(fields=['date_event', 'id'], name='event_date_event_id_idx'),
+            # Календарь сотрудника (ical.py): мероприятия сотрудника в диапазоне дат
+            models.Index(fields=['employee', 'date_event'], name='event_employee_date_idx'),
+            models.Index(fields=['updated_at'], name='event_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 class ListsEvents(models.Model):
-    educational_program = models.ForeignKey(EducationalProgram, on_delete=models.CASCADE)
-    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    # Одиночные индексы FK заменены составными: (educational_program, event) и (event, educational_program)
+    educational_program = models.ForeignKey(EducationalProgram, on_delete=models.CASCADE, db_index=False)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, db_index=False)
 
     class Meta:
         unique_together = ('educational_program', 'event')
+        indexes = [
+            # Программы мероприятия (feeds.invalidate_events, удаление мероприятия) без обращения к таблице
+            models.Index(fields=['event', 'educational_program'], name='listsevents_event_program_idx'),
+        ]
 
 class AssignedEmployees(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
@@ -149,9 +214,71 @@ class AssignedEmployees(models.Model):
     class Meta:
         unique_together = ('group', 'employee')
 
+class ListParticipantsManager(models.Manager):
+    def register_for_parent(self, parent_id, pairs):
+        """
+        Записывает детей родителя на мероприятия одним запросом INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+        pairs - список пар (child_id, event_id). Пары, где ребёнок не принадлежит родителю,
+        мероприятия нет или запись уже существует, пропускаются без ошибки.
+        Записи создаются в листе ожидания, места занимает allocation.admit.
+        Возвращает список (id, event_id, child_id) созданных записей.
+        """
+        if not pairs:
+            return []
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        values = ', '.join(['(%s, %s)'] * len(pairs))
+        # auto_now_add/auto_now заполняет только ORM - время записи передаётся параметром
+        sql = (
+            f'INSERT INTO {quote(self.model._meta.db_table)} (event_id, child_id, status, created_at, updated_at) '
+            f'SELECT e.id, pc.child_id, %s, %s, %s '
+            f'FROM {quote(Event._meta.db_table)} e, {quote(ParentsChilds._meta.db_table)} pc '
+            f'WHERE pc.parent_id = %s AND (e.id, pc.child_id) IN (VALUES {values}) '
+            f'ON CONFLICT (event_id, child_id) DO NOTHING '
+            f'RETURNING id, event_id, child_id'
+        )
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        params = [ParticipantStatus.WAITLISTED, now, now, parent_id]
+        for child_id, event_id in pairs:
+            params.extend([event_id, child_id])
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
 class ListParticipants(models.Model):
-    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, db_index=False)  # покрыт unique_together (event, child)
     child = models.ForeignKey(Child, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=ParticipantStatus.choices, default=ParticipantStatus.REGISTERED)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ListParticipantsManager()
 
     class Meta:
         unique_together = ('event', 'child')
+        indexes = [
+            models.Index(fields=['updated_at'], name='listparticipants_updated_idx'),
+            # Очередь листа ожидания мероприятия в порядке записи (allocation.py)
+            models.Index(fields=['event', 'id'], condition=models.Q(status='waitlisted'),
+                         name='listparticipants_waitlist_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    Запись об удалённой строке для синхронизации (sync.py): клиент, чей курсор старше deleted_at,
+    получает object_id в списке удалённых. Хранится SYNC_TOMBSTONE_RETENTION_DAYS (prune_tombstones).
+    """
+    model = models.CharField(max_length=30)  # _meta.model_name удалённой модели
+    object_id = models.BigIntegerField()
+    # Ребёнок, к которому относилась строка: по нему удаления отбираются для родителя
+    child_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
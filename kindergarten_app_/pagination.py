@@ -0,0 +1,60 @@
+from asgiref.sync import sync_to_async
+from rest_framework.pagination import CursorPagination
+from rest_framework.request import Request
+
+from .fastserializers import fast_serializer_for, timed_build
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset-пагинация: страница выбирается условием WHERE по ключу сортировки,
+    а не через OFFSET, поэтому стоимость запроса не растёт с номером страницы.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'id'
+
+
+def wants_pagination(request):
+    # Пагинация включается только по запросу клиента, чтобы не ломать старые клиенты
+    params = request.query_params
+    return KeysetPagination.cursor_query_param in params or KeysetPagination.page_size_query_param in params
+
+
+def paginated_response(request, queryset, serializer_class, ordering='id'):
+    """
+    Возвращает Response со страницей и ссылкой next или None,
+    если клиент не запрашивал пагинацию.
+    """
+    if not wants_pagination(request):
+        return None
+
+    paginator = KeysetPagination()
+    paginator.ordering = ordering
+    ordering_fields = [name.lstrip('-') for name in ((ordering,) if isinstance(ordering, str) else ordering)]
+    fast = fast_serializer_for(request, serializer_class)
+    if fast is not None:
+        # Страница строк values(); курсор CursorPagination умеет брать позицию из словаря
+        rows = paginator.paginate_queryset(fast.values_queryset(queryset, *ordering_fields), request)
+        return paginator.get_paginated_response(timed_build(fast, rows))
+
+    field_names, defer = queryset.query.deferred_loading
+    if not defer:
+        # При ?fields= загружаются не все колонки (only()); поля сортировки нужны для курсора
+        queryset = queryset.only(*field_names, *ordering_fields)
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+async def apaginated_data(request, queryset, serializer_class, ordering='id'):
+    """
+    Вариант paginated_response для async-представлений (request - HttpRequest):
+    возвращает данные страницы или None. Запрос страницы выполняется в sync_to_async.
+    """
+    request = Request(request)
+    if not wants_pagination(request):
+        return None
+    response = await sync_to_async(paginated_response)(request, queryset, serializer_class, ordering)
+    return response.data
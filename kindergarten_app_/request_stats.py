@@ -0,0 +1,32 @@
+"""
+Статистика текущего запроса для QueryStatsMiddleware (middleware.py): число и время SQL-запросов
+и время сериализаторов. Хранится в contextvar, который middleware устанавливает на время запроса,
+а сериализаторы и обёртка execute соединения дополняют.
+"""
+from contextvars import ContextVar
+
+current_stats = ContextVar('query_stats', default=None)
+
+
+def current_request_stats():
+    """Статистика текущего запроса или None, если запрос не попал в выборку."""
+    return current_stats.get()
+
+
+class RequestStats:
+    __slots__ = ('queries', 'sql_time', 'slowest_time', 'slowest_sql', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_sql = sql
@@ -0,0 +1,390 @@
+"""
+Импорт списков детей (ростеров) из CSV/XLSX (manage.py import_roster, api/child/import/).
+
+Файл читается построчно (csv.reader, openpyxl в режиме read_only) и обрабатывается пачками
+по batch_size строк, поэтому в памяти находится только текущая пачка. Одна строка - один ребёнок:
+родитель (и второй родитель, если есть) ищется по номеру телефона, группа - по названию.
+Новые родители создаются вместе с пользователем без пароля (логин parent_<телефон>),
+пароль им назначает администратор. Строки с ошибками пропускаются и попадают в отчёт
+с номером строки файла, остальные строки пачки записываются через bulk_create в одной транзакции.
+
+Колонки (порядок любой, лишние игнорируются):
+    fname, lname, patronymic, gender, birthday, group, transfer_date - ребёнок;
+    parent_phone, parent_fname, parent_lname, parent_patronymic - родитель;
+    parent2_phone, parent2_fname, parent2_lname, parent2_patronymic - второй родитель (необязательно);
+    contraindications - противопоказания вида «КОД: описание; КОД2: описание» (необязательно).
+"""
+import csv
+import datetime
+import io
+from dataclasses import dataclass, field
+from itertools import chain, islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction, IntegrityError
+from rest_framework import serializers
+
+from . import counters, feeds, search
+from .models import User, Parent, Group, Child, ParentsChilds, MedicalContraindicationsChild, Roles, PHONE_MIN, \
+    PHONE_MAX
+
+BATCH_SIZE = 500
+MAX_ERRORS = 1000
+FILE_TYPES = ('csv', 'xlsx')
+
+DATE_FORMATS = ['%Y-%m-%d', '%d.%m.%Y']
+FEMALE_VALUES = {'ж', 'жен', 'женский', 'f', 'female', 'woman', 'true', '1'}
+MALE_VALUES = {'м', 'муж', 'мужской', 'm', 'male', 'man', 'false', '0'}
+PARENT_PREFIXES = ('parent', 'parent2')
+REQUIRED_COLUMNS = ('fname', 'lname', 'gender', 'birthday', 'group', 'transfer_date', 'parent_phone')
+
+
+class RosterError(Exception):
+    """Файл нельзя прочитать целиком (формат, заголовок, отсутствующий openpyxl)."""
+
+
+class GenderField(serializers.Field):
+    # Child.gender: True - женский (как gender_display в ChildSerializer)
+    default_error_messages = {'invalid': 'Пол должен быть «м» или «ж»'}
+
+    def to_internal_value(self, data):
+        value = str(data).strip().lower()
+        if value in FEMALE_VALUES:
+            return True
+        if value in MALE_VALUES:
+            return False
+        self.fail('invalid')
+
+    def to_representation(self, value):
+        return value
+
+
+class RosterRowSerializer(serializers.Serializer):
+    """Проверка строки без обращений к БД; связи с родителями и группой проверяются пачкой."""
+    fname = serializers.CharField(max_length=50)
+    lname = serializers.CharField(max_length=50)
+    patronymic = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    gender = GenderField()
+    birthday = serializers.DateField(input_formats=DATE_FORMATS)
+    group = serializers.CharField(max_length=50)
+    transfer_date = serializers.DateField(input_formats=DATE_FORMATS)
+    parent_phone = serializers.IntegerField(min_value=PHONE_MIN, max_value=PHONE_MAX)
+    parent_fname = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    parent_lname = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    parent_patronymic = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    parent2_phone = serializers.IntegerField(min_value=PHONE_MIN, max_value=PHONE_MAX, required=False,
+                                             allow_null=True)
+    parent2_fname = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    parent2_lname = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    parent2_patronymic = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    contraindications = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_contraindications(self, value):
+        items = []
+        for part in value.split(';'):
+            if not part.strip():
+                continue
+            code, separator, description = part.partition(':')
+            code, description = code.strip(), description.strip()
+            if not separator or not code or not description:
+                raise serializers.ValidationError('Ожидается «КОД: описание; КОД2: описание»')
+            if len(code) > 50:
+                raise serializers.ValidationError(f'Код {code[:50]}... длиннее 50 символов')
+            items.append((code, description))
+        if len({code for code, _ in items}) != len(items):
+            raise serializers.ValidationError('Коды повторяются')
+        return items
+
+
+@dataclass
+class RosterReport:
+    rows: int = 0
+    children_created: int = 0
+    parents_created: int = 0
+    parents_reused: int = 0
+    contraindications_created: int = 0
+    error_rows: int = 0
+    errors: list = field(default_factory=list)  # не больше MAX_ERRORS записей {'row': N, 'errors': {...}}
+    error: str = None  # чтение файла прервано; пачки до этого места уже записаны
+    dry_run: bool = False
+
+    def add_error(self, row, errors):
+        self.error_rows += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows, 'children_created': self.children_created,
+            'parents_created': self.parents_created, 'parents_reused': self.parents_reused,
+            'contraindications_created': self.contraindications_created,
+            'error_rows': self.error_rows, 'errors': self.errors, 'errors_truncated': self.error_rows > len(self.errors),
+            'error': self.error, 'dry_run': self.dry_run,
+        }
+
+
+def _clean(value):
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()  # ячейки дат в XLSX приходят как datetime
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)  # телефон из числовой ячейки
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _row_dict(header, values):
+    return {name: value for name, value in zip(header, map(_clean, values)) if name and value is not None}
+
+
+def _normalize_header(header):
+    header = [str(name).strip().lower() if name is not None else None for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise RosterError(f'Нет обязательных колонок: {", ".join(missing)}')
+    return header
+
+
+def _csv_rows(reader, header):
+    try:
+        for values in reader:
+            if any(value.strip() for value in values):
+                yield reader.line_num, _row_dict(header, values)
+    except (csv.Error, UnicodeDecodeError) as error:
+        raise RosterError(f'Ошибка чтения CSV после строки {reader.line_num}: {error}')
+
+
+def read_csv_rows(binary_file, encoding='utf-8-sig'):
+    """
+    Итератор (номер строки, словарь) для CSV; разделитель «,» или «;» определяется по заголовку.
+    Заголовок читается сразу, поэтому ошибки формата видны до начала импорта.
+    """
+    text = io.TextIOWrapper(binary_file, encoding=encoding, newline='')
+    try:
+        first_line = text.readline()
+    except UnicodeDecodeError:
+        raise RosterError(f'Файл не в кодировке {encoding}')
+    if not first_line.strip():
+        raise RosterError('Пустой файл')
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    reader = csv.reader(chain([first_line], text), delimiter=delimiter)
+    return _csv_rows(reader, _normalize_header(next(reader)))
+
+
+def _xlsx_rows(workbook, rows, header):
+    try:
+        for number, values in enumerate(rows, start=2):
+            if any(value is not None and value != '' for value in values):
+                yield number, _row_dict(header, values)
+    finally:
+        workbook.close()
+
+
+def read_xlsx_rows(binary_file):
+    """Итератор (номер строки, словарь) для первого листа XLSX; openpyxl читает лист потоком (read_only)."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RosterError('Для импорта XLSX нужен пакет openpyxl')
+    try:
+        workbook = load_workbook(binary_file, read_only=True, data_only=True)
+    except Exception as error:  # zipfile.BadZipFile, KeyError и т.п. для повреждённого файла
+        raise RosterError(f'Не удалось открыть XLSX: {error}')
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        workbook.close()
+        raise RosterError('Пустой файл')
+    try:
+        header = _normalize_header(header)
+    except RosterError:
+        workbook.close()
+        raise
+    return _xlsx_rows(workbook, rows, header)
+
+
+def read_rows(binary_file, file_type):
+    if file_type == 'csv':
+        return read_csv_rows(binary_file)
+    if file_type == 'xlsx':
+        return read_xlsx_rows(binary_file)
+    raise RosterError(f'Неизвестный тип файла {file_type}, допустимы: {", ".join(FILE_TYPES)}')
+
+
+def file_type_from_name(name):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return extension if extension in FILE_TYPES else None
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class RosterImporter:
+    """
+    Состояние импорта между пачками: группы по названию, id родителей по телефону
+    (найденные в БД и созданные этим импортом) и занятые коды противопоказаний.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.report = RosterReport(dry_run=dry_run)
+        self.groups = {}
+        self.ambiguous_groups = set()
+        for group_id, name in Group.objects.values_list('id', 'name'):
+            if name in self.groups:
+                self.ambiguous_groups.add(name)
+            self.groups[name] = group_id
+        self.parents = {}  # телефон -> id родителя (None - будет создан, для dry_run)
+        self.reused = set()  # телефоны существовавших до импорта родителей, к которым добавлены дети
+        self.created = set()  # телефоны родителей, созданных этим импортом
+        self.codes = set()  # коды противопоказаний из уже обработанных строк
+        # Общий «пароль» новых родителей: непригодный для входа, хешируется один раз
+        self.password_hash = make_password(None)
+
+    def run(self, rows):
+        try:
+            for batch in _batches(rows, self.batch_size):
+                self.report.rows += len(batch)
+                self._process(batch)
+        except RosterError as error:
+            self.report.error = str(error)
+        self.report.parents_reused = len(self.reused)
+        self.report.errors.sort(key=lambda item: item['row'])
+        return self.report
+
+    def _validate(self, batch):
+        valid = []
+        for number, data in batch:
+            serializer = RosterRowSerializer(data=data)
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                self.report.add_error(number, serializer.errors)
+        return valid
+
+    def _check_relations(self, valid):
+        # Один запрос на пачку для телефонов, один - для кодов противопоказаний
+        phones = {row[prefix + '_phone'] for _, row in valid for prefix in PARENT_PREFIXES
+                  if row.get(prefix + '_phone')} - self.parents.keys()
+        self.parents.update(Parent.objects.filter(phone_number__in=phones).values_list('phone_number', 'id'))
+        codes = {code for _, row in valid for code, _ in row.get('contraindications', [])}
+        taken = set(MedicalContraindicationsChild.objects.filter(C__in=codes).values_list('C', flat=True))
+        usernames = {f'parent_{phone}' for phone in phones - self.parents.keys()}
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+        accepted = []
+        pending = set()  # новые родители из уже принятых строк пачки
+        for number, row in valid:
+            errors = {}
+            group = row['group']
+            if group not in self.groups:
+                errors['group'] = f'Группа «{group}» не найдена'
+            elif group in self.ambiguous_groups:
+                errors['group'] = f'Несколько групп с названием «{group}»'
+            for prefix in PARENT_PREFIXES:
+                phone = row.get(prefix + '_phone')
+                if not phone or phone in self.parents or phone in pending:
+                    continue
+                if f'parent_{phone}' in taken_usernames:
+                    errors[prefix + '_phone'] = f'Пользователь parent_{phone} уже существует'
+                elif not row.get(prefix + '_fname') or not row.get(prefix + '_lname'):
+                    errors[prefix + '_phone'] = 'Родитель не найден; для нового родителя нужны имя и фамилия'
+            if row.get('parent2_phone') == row['parent_phone']:
+                errors['parent2_phone'] = 'Совпадает с parent_phone'
+            duplicates = [code for code, _ in row.get('contraindications', []) if code in taken or code in self.codes]
+            if duplicates:
+                errors['contraindications'] = f'Коды уже существуют: {", ".join(duplicates)}'
+
+            if errors:
+                self.report.add_error(number, errors)
+                continue
+            self.codes.update(code for code, _ in row.get('contraindications', []))
+            pending.update(row[prefix + '_phone'] for prefix in PARENT_PREFIXES if row.get(prefix + '_phone'))
+            accepted.append((number, row))
+        return accepted
+
+    def _new_parents(self, accepted):
+        new = {}
+        for _, row in accepted:
+            for prefix in PARENT_PREFIXES:
+                phone = row.get(prefix + '_phone')
+                if phone and phone not in self.parents and phone not in new:
+                    new[phone] = Parent(fname=row[prefix + '_fname'], lname=row[prefix + '_lname'],
+                                        patronymic=row.get(prefix + '_patronymic') or None, phone_number=phone)
+        return new
+
+    def _process(self, batch):
+        accepted = self._check_relations(self._validate(batch))
+        if not accepted:
+            return
+
+        new_parents = self._new_parents(accepted)
+        reused = {row[prefix + '_phone'] for _, row in accepted for prefix in PARENT_PREFIXES
+                  if row.get(prefix + '_phone')} - new_parents.keys() - self.created
+        if self.dry_run:
+            self.parents.update(dict.fromkeys(new_parents))
+            self._count(accepted, new_parents, reused, sum(len(row.get('contraindications', [])) for _, row in accepted))
+            return
+
+        try:
+            with transaction.atomic():
+                contraindications_total = self._write(accepted, new_parents)
+        except IntegrityError as error:
+            # Параллельная запись заняла телефон, логин или код - пачка не записана целиком
+            for phone in new_parents:
+                self.parents.pop(phone, None)
+            self.codes.difference_update(code for _, row in accepted for code, _ in row.get('contraindications', []))
+            for number, _ in accepted:
+                self.report.add_error(number, {'error': f'Пачка не записана из-за конфликта в БД: {error}'})
+            return
+        self._count(accepted, new_parents, reused, contraindications_total)
+
+    def _write(self, accepted, new_parents):
+        users = User.objects.bulk_create([
+            User(username=f'parent_{phone}', role=Roles.PARENT, password=self.password_hash) for phone in new_parents
+        ])
+        for user, parent in zip(users, new_parents.values()):
+            parent.user = user
+        Parent.objects.bulk_create(search.fill_search_names(new_parents.values()))
+        self.parents.update((phone, parent.id) for phone, parent in new_parents.items())
+
+        children = Child.objects.bulk_create(search.fill_search_names([
+            Child(fname=row['fname'], lname=row['lname'], patronymic=row.get('patronymic') or None,
+                  gender=row['gender'], birthday=row['birthday'], group_id=self.groups[row['group']],
+                  transfer_date=row['transfer_date'])
+            for _, row in accepted
+        ]))
+        counters.children_enrolled([child.group_id for child in children])
+
+        links = []
+        contraindications = []
+        for child, (_, row) in zip(children, accepted):
+            for prefix in PARENT_PREFIXES:
+                phone = row.get(prefix + '_phone')
+                if phone:
+                    links.append(ParentsChilds(parent_id=self.parents[phone], child_id=child.id))
+            contraindications.extend(MedicalContraindicationsChild(C=code, description=description, child_id=child.id)
+                                     for code, description in row.get('contraindications', []))
+        ParentsChilds.objects.bulk_create(links)
+        feeds.invalidate_parents({link.parent_id for link in links})
+        MedicalContraindicationsChild.objects.bulk_create(contraindications)
+        return len(contraindications)
+
+    def _count(self, accepted, new_parents, reused, contraindications_total):
+        self.report.children_created += len(accepted)
+        self.report.parents_created += len(new_parents)
+        self.created.update(new_parents)
+        self.reused |= reused
+        self.report.contraindications_created += contraindications_total
+
+
+def import_roster(binary_file, file_type, batch_size=BATCH_SIZE, dry_run=False):
+    """Импортирует файл и возвращает RosterReport. RosterError - если файл нельзя прочитать."""
+    return RosterImporter(batch_size=batch_size, dry_run=dry_run).run(read_rows(binary_file, file_type))
@@ -0,0 +1,337 @@
+"""
+Поиск детей, родителей и сотрудников по ФИО и номеру телефона: api/search/?q=.
+
+ФИО хранится в колонке search_name в нормализованном виде: «фамилия имя отчество» в нижнем
+регистре, ё заменена на е. Колонка заполняется сигналом pre_save, а в пакетных путях
+(bulk_create) - явным вызовом fill_search_names. Нормализация выполняется в Python, а не в БД:
+lower() в SQLite и в PostgreSQL с локалью C не меняет регистр кириллицы.
+
+Поиск по префиксу («елк», «елкина ан») использует индекс по search_name (миграция 0008):
+в PostgreSQL это LIKE 'префикс%' по индексу varchar_pattern_ops, в SQLite - диапазон
+search_name >= 'префикс' AND search_name < следующая строка по обычному индексу.
+Нечёткий поиск (опечатки, имя или отчество вместо фамилии) идёт в PostgreSQL через pg_trgm:
+оператор %> по GIN-индексу gin_trgm_ops. Если расширения нет (SQLite или PostgreSQL без pg_trgm),
+нечёткий поиск выполняется в процессе по NameIndex - триграммному индексу слов имён. Индекс
+строится один раз на процесс и сверяется с БД перед поиском по числу людей и максимальному
+updated_at: изменённые и добавленные строки (в том числе bulk_create и изменения из других
+процессов) дочитываются в индекс, и только после удаления индекс строится заново.
+
+Номер телефона (родители, сотрудники) ищется по префиксу цифр как диапазон значений
+phone_number по уникальному индексу: 8916 -> [89160000000, 89170000000).
+"""
+import bisect
+import datetime
+import heapq
+import itertools
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Case, Count, F, IntegerField, Max, Value, When
+
+from .fastserializers import serialize_list
+from .models import Child, Parent, Employee
+from .serializers import ChildSerializer, ParentSerializer, EmployeeSerializer
+
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MIN_LENGTH = 2
+FUZZY_MIN_LENGTH = 3
+FUZZY_THRESHOLD = 0.4  # порог сходства для нечёткого поиска в процессе (в pg_trgm - word_similarity_threshold)
+PHONE_DIGITS = 11
+PHONE_MIN_DIGITS = 3
+# Строки, сохранённые раньше последнего updated_at индекса не больше чем на столько,
+# дочитываются повторно: транзакция могла зафиксироваться уже после чтения индекса
+NAME_INDEX_MARGIN = datetime.timedelta(seconds=5)
+
+_SPACES = re.compile(r'\s+')
+_PHONE = re.compile(r'^[\d\s()+-]+$')
+
+
+class SearchError(ValueError):
+    pass
+
+
+def normalize_name(*parts):
+    """'Ёлкина', 'Анна', None -> 'елкина анна'."""
+    text = ' '.join(part for part in parts if part)
+    return _SPACES.sub(' ', text.lower().replace('ё', 'е')).strip()
+
+
+def fill_search_names(objects):
+    """Заполняет search_name объектов Child/Parent/Employee перед bulk_create."""
+    for obj in objects:
+        obj.search_name = normalize_name(obj.lname, obj.fname, obj.patronymic)
+    return objects
+
+
+def phone_range(query):
+    """Диапазон phone_number для префикса номера (+7 916 ... -> 8916...) или None, если это не номер."""
+    if not _PHONE.match(query):
+        return None
+    digits = re.sub(r'\D', '', query)
+    if digits.startswith('7'):
+        digits = '8' + digits[1:]
+    if len(digits) < PHONE_MIN_DIGITS or len(digits) > PHONE_DIGITS:
+        return None
+    scale = 10 ** (PHONE_DIGITS - len(digits))
+    return int(digits) * scale, (int(digits) + 1) * scale
+
+
+@dataclass
+class Target:
+    model: type
+    serializer_class: type
+    has_phone: bool
+
+
+TARGETS = {
+    'children': Target(Child, ChildSerializer, False),
+    'parents': Target(Parent, ParentSerializer, True),
+    'employees': Target(Employee, EmployeeSerializer, True),
+}
+
+
+def prefix_queryset(model, term):
+    """Люди, у которых search_name начинается с term, в порядке search_name."""
+    queryset = model.objects.all()
+    if connections[queryset.db].vendor == 'postgresql':
+        queryset = queryset.filter(search_name__startswith=term)
+    else:
+        # Двоичное сравнение строк SQLite совпадает с порядком символов Unicode
+        queryset = queryset.filter(search_name__gte=term, search_name__lt=term[:-1] + chr(ord(term[-1]) + 1))
+    return queryset.order_by('search_name', 'id')
+
+
+_trigram_available = {}
+
+
+def has_trigram(alias):
+    """Установлено ли в базе расширение pg_trgm (проверяется один раз на процесс)."""
+    if alias not in _trigram_available:
+        connection = connections[alias]
+        available = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+                available = cursor.fetchone()[0]
+        _trigram_available[alias] = available
+    return _trigram_available[alias]
+
+
+def _trigram_ids(model, term, limit, exclude):
+    queryset = (model.objects.filter(TrigramWordSimilar(F('search_name'), term)).exclude(id__in=exclude)
+                .annotate(similarity=TrigramWordSimilarity(term, 'search_name'))
+                .order_by('-similarity', 'search_name', 'id'))
+    return list(queryset.values_list('id', flat=True)[:limit])
+
+
+def _trigrams(word):
+    # Как в pg_trgm: два пробела в начале слова и один в конце
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Индекс имён в памяти процесса для нечёткого поиска без pg_trgm. Индексируются различные слова
+    (фамилий, имён и отчеств гораздо меньше, чем людей): слово -> позиции людей, триграмма -> слова.
+    Слово запроса сопоставляется словам по префиксу (сходство 1) или по доле общих триграмм.
+    """
+
+    def __init__(self, rows):
+        self.ids = []
+        self.names = []
+        self.positions = {}
+        self.postings = {}
+        for pk, name in rows:
+            self._append(pk, name)
+        self.words = sorted(self.postings)
+        self.word_grams = {}
+        self.grams = {}
+        for word in self.words:
+            self._index_word(word)
+
+    def _append(self, pk, name):
+        position = len(self.ids)
+        self.ids.append(pk)
+        self.names.append(name)
+        self.positions[pk] = position
+        for word in set(name.split()):
+            self.postings.setdefault(word, []).append(position)
+
+    def _index_word(self, word):
+        grams = _trigrams(word)
+        self.word_grams[word] = len(grams)
+        for gram in grams:
+            self.grams.setdefault(gram, []).append(word)
+
+    def update(self, rows):
+        """Добавляет людей или заменяет их имена: rows - (id, search_name)."""
+        for pk, name in rows:
+            position = self.positions.get(pk)
+            if position is not None:
+                if self.names[position] == name:
+                    continue
+                # Слово без людей остаётся в индексе с пустым списком позиций
+                for word in set(self.names[position].split()):
+                    self.postings[word].remove(position)
+                self.names[position] = name
+            else:
+                position = len(self.ids)
+                self.ids.append(pk)
+                self.names.append(name)
+                self.positions[pk] = position
+            for word in set(name.split()):
+                if word not in self.postings:
+                    self.postings[word] = []
+                    bisect.insort(self.words, word)
+                    self._index_word(word)
+                self.postings[word].append(position)
+
+    def word_scores(self, token):
+        """Слова индекса, похожие на token: {слово: сходство}."""
+        scores = {}
+        low = bisect.bisect_left(self.words, token)
+        high = bisect.bisect_left(self.words, token[:-1] + chr(ord(token[-1]) + 1))
+        for word in self.words[low:high]:
+            scores[word] = 1.0
+        grams = _trigrams(token)
+        shared = Counter(word for gram in grams for word in self.grams.get(gram, ()))
+        for word, count in shared.items():
+            score = count / (len(grams) + self.word_grams[word] - count)
+            if score >= FUZZY_THRESHOLD and score > scores.get(word, 0):
+                scores[word] = score
+        return scores
+
+    def search(self, term, limit, exclude=()):
+        """id людей, у которых каждому слову term соответствует похожее слово имени, по убыванию сходства."""
+        matches = [self.word_scores(token) for token in term.split()]
+        if not matches or not all(matches):
+            return []
+        if len(matches) == 1:
+            return self._search_word(matches[0], limit, exclude)
+        # Кандидаты - люди, у которых есть слово, похожее на каждое слово запроса
+        matches.sort(key=lambda scores: sum(len(self.postings[word]) for word in scores))
+        candidates = None
+        for scores in matches:
+            positions = {position for word in scores for position in self.postings[word]}
+            candidates = positions if candidates is None else candidates & positions
+        scored = []
+        for position in candidates:
+            pk = self.ids[position]
+            if pk in exclude:
+                continue
+            words = self.names[position].split()
+            score = 1.0
+            for scores in matches:
+                score *= max((scores.get(word, 0) for word in words), default=0)
+            if score:
+                scored.append((-score, self.names[position], pk))
+        return [pk for _, _, pk in heapq.nsmallest(limit, scored)]
+
+    def _search_word(self, scores, limit, exclude):
+        # Одно слово запроса: люди берутся группами слов с одинаковым сходством, начиная с лучшей,
+        # пока не наберётся limit - без подсчёта сходства для всех кандидатов
+        found, seen = [], set()
+        ordered = sorted(scores.items(), key=lambda item: -item[1])
+        for _, group in itertools.groupby(ordered, key=lambda item: item[1]):
+            rows = []
+            for word, _ in group:
+                for position in self.postings[word]:
+                    if position not in seen and self.ids[position] not in exclude:
+                        seen.add(position)
+                        rows.append((self.names[position], self.ids[position]))
+            found.extend(pk for _, pk in heapq.nsmallest(limit - len(found), rows))
+            if len(found) >= limit:
+                break
+        return found
+
+
+_indexes = {}  # модель -> (NameIndex, число людей, максимальный updated_at)
+_indexes_lock = threading.Lock()
+
+
+def name_index(model):
+    """NameIndex модели, сверенный с БД: дочитывает изменённых людей или строится заново после удаления."""
+    state = model.objects.aggregate(count=Count('id'), last=Max('updated_at'))
+    loaded = _indexes.get(model)
+    if loaded is not None and loaded[1:] == (state['count'], state['last']):
+        return loaded[0]
+    with _indexes_lock:
+        loaded = _indexes.get(model)
+        if loaded is not None and loaded[1:] == (state['count'], state['last']):
+            return loaded[0]
+        index = None
+        if loaded is not None and loaded[2] is not None:
+            index = loaded[0]
+            changed = model.objects.filter(updated_at__gte=loaded[2] - NAME_INDEX_MARGIN)
+            index.update(changed.values_list('id', 'search_name').iterator(chunk_size=5000))
+            # Людей в индексе больше, чем в БД, - кого-то удалили
+            if len(index.ids) != state['count']:
+                index = None
+        if index is None:
+            index = NameIndex(model.objects.values_list('id', 'search_name').iterator(chunk_size=5000))
+        _indexes[model] = (index, state['count'], state['last'])
+    return index
+
+
+def _fuzzy_ids(model, term, limit, exclude):
+    if has_trigram(model.objects.db):
+        return _trigram_ids(model, term, limit, exclude)
+    return name_index(model).search(term, limit, set(exclude))
+
+
+def find_ids(target, query, limit):
+    """id людей target по запросу: сначала совпадения по префиксу, затем нечёткие."""
+    numbers = phone_range(query)
+    if numbers is not None:
+        if not target.has_phone:
+            return []
+        low, high = numbers
+        queryset = target.model.objects.filter(phone_number__gte=low, phone_number__lt=high).order_by('phone_number')
+        return list(queryset.values_list('id', flat=True)[:limit])
+
+    term = normalize_name(query)
+    ids = list(prefix_queryset(target.model, term).values_list('id', flat=True)[:limit])
+    if len(ids) < limit and len(term) >= FUZZY_MIN_LENGTH:
+        ids += _fuzzy_ids(target.model, term, limit - len(ids), ids)
+    return ids
+
+
+def parse_params(params):
+    """(query, kinds, limit) из ?q=, ?type= и ?limit=. SearchError при неверных значениях."""
+    query = (params.get('q') or '').strip()
+    if len(query) < SEARCH_MIN_LENGTH:
+        raise SearchError(f'Параметр q должен содержать не менее {SEARCH_MIN_LENGTH} символов')
+    kinds = [kind for kind in (params.get('type') or ','.join(TARGETS)).split(',') if kind]
+    unknown = [kind for kind in kinds if kind not in TARGETS]
+    if unknown or not kinds:
+        raise SearchError(f'Параметр type - список из {", ".join(TARGETS)}')
+    try:
+        limit = int(params.get('limit', SEARCH_LIMIT))
+    except ValueError:
+        raise SearchError('Параметр limit должен быть числом')
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        raise SearchError(f'Параметр limit должен быть от 1 до {SEARCH_MAX_LIMIT}')
+    return query, kinds, limit
+
+
+def search(request, query, kinds, limit):
+    """Найденные люди по видам: {'children': [...], ...} в порядке релевантности."""
+    result = {}
+    for kind in kinds:
+        target = TARGETS[kind]
+        ids = find_ids(target, query, limit)
+        if not ids:
+            result[kind] = []
+            continue
+        position = Case(*[When(id=pk, then=Value(index)) for index, pk in enumerate(ids)], output_field=IntegerField())
+        queryset = target.model.objects.filter(id__in=ids).order_by(position)
+        queryset = target.serializer_class.optimize_queryset(queryset, request)
+        result[kind] = serialize_list(request, queryset, target.serializer_class)
+    return result
@@ -1,8 +1,169 @@
+import time
+
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import User, Employee, Parent, Event,\
+from .models import User, Employee, Parent, Event, ParentsChilds,\
     EducationalProgram, Group, Child, MedicalContraindicationsChild, AssignedEmployees, ListParticipants
+from .request_stats import current_request_stats
+
+
+def _paths_tree(value):
+    # 'id,child.fname,child.group' -> {'id': {}, 'child': {'fname': {}, 'group': {}}}
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+class Selection:
+    """
+    Выборка полей из параметров запроса ?fields= и ?expand=.
+    fields - дерево выводимых полей (None - все поля), expand - дерево раскрываемых
+    вложенных объектов (None - раскрываются все, как без параметров).
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        """Выборка запроса или None, если клиент не передал ни fields, ни expand."""
+        if not hasattr(request, '_field_selection'):
+            fields = request.GET.get('fields')
+            expand = request.GET.get('expand')
+            if not fields and expand is None:
+                request._field_selection = None
+            else:
+                request._field_selection = cls(_paths_tree(fields) if fields else None,
+                                               _paths_tree(expand) if expand is not None else None)
+        return request._field_selection
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        # Поле вида fields=child.fname раскрывает child и без expand
+        if not self.includes(name):
+            return False
+        return self.expand is None or name in self.expand or bool(self.fields and self.fields.get(name))
+
+    def child(self, name):
+        fields = self.fields.get(name) or None if self.fields is not None else None
+        expand = self.expand.get(name, {}) if self.expand is not None else None
+        return Selection(fields, expand)
+
+
+def _includes(selection, name):
+    return selection is None or selection.includes(name)
+
+
+def _expands(selection, name):
+    return selection is None or selection.expands(name)
+
+
+def _child(selection, name):
+    return selection.child(name) if selection is not None else None
+
+
+class SparseFieldsMixin:
+    """
+    Ограничение вывода по ?fields= и ?expand= (выборка берётся из context['request']
+    или context['selection']; вложенные сериализаторы получают свою часть выборки).
+    fields=id,name,educational_program.description - точкой выбираются поля вложенного объекта.
+    expand=child,event.employee - раскрываемые вложенные объекты; остальные из expandable_fields
+    выводятся как id, а связи «ко многим» не выводятся. Без параметров вывод не меняется.
+    optimize_queryset по той же выборке загружает только нужные колонки и связи.
+    """
+    # Вложенное поле -> атрибут с id для нераскрытого вида (None - поле не выводится)
+    expandable_fields = {}
+    # Поля модели, которые читает SerializerMethodField
+    method_field_sources = {}
+    # SerializerMethodField со списком связанных объектов: (accessor обратной связи, FK к объекту, сериализатор).
+    # Нужен быстрому пути fastserializers, который не вызывает такие методы
+    method_field_lists = {}
+
+    def get_selection(self):
+        parent, name = self.parent, self.field_name
+        if isinstance(parent, serializers.ListSerializer):
+            parent, name = parent.parent, parent.field_name
+        if isinstance(parent, SparseFieldsMixin):
+            return _child(parent.get_selection(), name)
+        if 'selection' in self.context:
+            return self.context['selection']
+        request = self.context.get('request')
+        return Selection.from_request(request) if request is not None else None
+
+    def nested_context(self, name):
+        # Контекст для сериализатора, который создаётся вручную внутри SerializerMethodField
+        return {'selection': _child(self.get_selection(), name)}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.get_selection()
+        if selection is None:
+            return fields
+        fields = {name: field for name, field in fields.items() if field.write_only or selection.includes(name)}
+        for name, id_attr in self.expandable_fields.items():
+            if name in fields and not selection.expands(name):
+                if id_attr is None:
+                    del fields[name]
+                else:
+                    fields[name] = serializers.ReadOnlyField(source=id_attr)
+        return fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix='', selection=None):
+        return queryset
+
+    @classmethod
+    def only_columns(cls, selection, prefix=''):
+        """Поля модели для QuerySet.only(), которых достаточно для вывода по selection."""
+        columns = set()
+        for name, field in cls(context={'selection': selection}).fields.items():
+            if field.write_only or isinstance(field, serializers.ListSerializer):
+                continue  # связи «ко многим» загружаются через prefetch_related
+            if isinstance(field, SparseFieldsMixin):
+                columns.add(prefix + field.source)
+                columns |= type(field).only_columns(selection.child(name), prefix + field.source + '__')
+            elif isinstance(field, serializers.SerializerMethodField):
+                columns.update(prefix + source for source in cls.method_field_sources.get(name, ()))
+            elif field.source != '*':
+                # group.name -> group, group__name (FK нужен для select_related)
+                parts = field.source.split('.')
+                columns.update(prefix + '__'.join(parts[:i]) for i in range(1, len(parts) + 1))
+        return columns
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request):
+        """setup_eager_loading и only() с учётом ?fields= и ?expand= запроса."""
+        selection = Selection.from_request(request)
+        queryset = cls.setup_eager_loading(queryset, selection=selection)
+        if selection is not None:
+            queryset = queryset.only(*cls.only_columns(selection))
+        return queryset
+
+
+class BaseModelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Учитывает время сериализации в статистике QueryStatsMiddleware.
+    # Вложенные сериализаторы не считаются повторно.
+    def to_representation(self, instance):
+        stats = current_request_stats()
+        if stats is None or stats.serializer_depth:
+            return super().to_representation(instance)
 
-class UserSerializer(serializers.ModelSerializer):
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_depth -= 1
+            stats.serializer_time += time.perf_counter() - start
+
+class UserSerializer(BaseModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'password', 'role']
@@ -13,11 +174,13 @@ class UserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(password=password, **validated_data)
         return user
 
-class EmployeeSerializer(serializers.ModelSerializer):
-    user_id = serializers.IntegerField(source='user.id', read_only=True)
+class EmployeeSerializer(BaseModelSerializer):
+    user_id = serializers.IntegerField(read_only=True)  # без обращения к user, чтобы не было лишнего запроса
     gender = serializers.BooleanField(write_only=True)  # Принимается при создании/обновлении, но не выводится
     gender_display = serializers.SerializerMethodField(read_only=True)  # Выводится только для чтения
 
+    method_field_sources = {'gender_display': ['gender']}
+
     class Meta:
         model = Employee
         fields = ['id', 'user_id', 'fname', 'lname', 'patronymic', 'gender', 'gender_display',
@@ -26,8 +189,8 @@ class EmployeeSerializer(serializers.ModelSerializer):
     def get_gender_display(self, obj):
         return "woman" if obj.gender else "man"
 
-class ParentSerializer(serializers.ModelSerializer):
-    user_id = serializers.IntegerField(source='user.id', read_only=True)
+class ParentSerializer(BaseModelSerializer):
+    user_id = serializers.IntegerField(read_only=True)
     class Meta:
         model = Parent
         fields = ['id', 'user_id', 'fname', 'lname', 'patronymic', 'phone_number']
@@ -36,24 +199,41 @@ class ParentSerializer(serializers.ModelSerializer):
         user = self.context.get('user')
         return Parent.objects.create(user=user, **validated_data)
 
-class EducationalProgramSerializer(serializers.ModelSerializer):
+class EducationalProgramSerializer(BaseModelSerializer):
 
     class Meta:
         model = EducationalProgram
         fields = ['id', 'description', 'age_category_children']
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(BaseModelSerializer):
     educational_program = EducationalProgramSerializer(read_only=True)
+
+    expandable_fields = {'educational_program': 'educational_program_id'}
+
     class Meta:
         model = Group
         fields = ['id', 'name', 'age_group', 'count_children', 'educational_program']
 
-class MedicalContraindicationsChildSerializer(serializers.ModelSerializer):
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix='', selection=None):
+        if _expands(selection, 'educational_program'):
+            queryset = queryset.select_related(prefix + 'educational_program')
+        return queryset
+
+class MedicalContraindicationsChildSerializer(BaseModelSerializer):
     class Meta:
         model = MedicalContraindicationsChild
         fields = ['C', 'description', 'child']
 
-class ChildSerializer(serializers.ModelSerializer):
+class MedicalContraindicationItemSerializer(BaseModelSerializer):
+    # Используется при массовом зачислении, когда ребёнок ещё не создан.
+    # Уникальность кода проверяется одним запросом на весь пакет, а не для каждой записи.
+    class Meta:
+        model = MedicalContraindicationsChild
+        fields = ['C', 'description']
+        extra_kwargs = {'C': {'validators': []}}
+
+class ChildSerializer(BaseModelSerializer):
     gender_display = serializers.SerializerMethodField()
     gender = serializers.BooleanField(write_only=True)
     medical_contraindications = MedicalContraindicationsChildSerializer(
@@ -64,6 +244,10 @@ class ChildSerializer(serializers.ModelSerializer):
     # добавляем связанных родителей, связанных через ParentsChilds
     parents = serializers.SerializerMethodField()
 
+    expandable_fields = {'medical_contraindications': None, 'parents': None}
+    method_field_sources = {'gender_display': ['gender']}
+    method_field_lists = {'parents': ('parentschilds_set', 'parent', ParentSerializer)}
+
     class Meta:
         model = Child
         fields = ['id', 'fname', 'lname', 'patronymic', 'gender', 'gender_display', 'birthday',
@@ -73,28 +257,103 @@ class ChildSerializer(serializers.ModelSerializer):
         return "woman" if obj.gender else "man"
 
     def get_parents(self, obj):
-        parents_qs = Parent.objects.filter(parentschilds__child=obj)
-        return ParentSerializer(parents_qs, many=True).data
+        # Если связи загружены через setup_eager_loading, дополнительных запросов нет
+        links = getattr(obj, 'parent_links', None)
+        if links is not None:
+            parents = [link.parent for link in links]
+        else:
+            parents = Parent.objects.filter(parentschilds__child=obj)
+        return ParentSerializer(parents, many=True, context=self.nested_context('parents')).data
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix='', selection=None):
+        # prefix позволяет подгружать детей как вложенный объект (например, 'child__')
+        if _includes(selection, 'group_name'):
+            queryset = queryset.select_related(prefix + 'group')
+        if _expands(selection, 'medical_contraindications'):
+            queryset = queryset.prefetch_related(prefix + 'medicalcontraindicationschild_set')
+        if _expands(selection, 'parents'):
+            queryset = queryset.prefetch_related(
+                Prefetch(prefix + 'parentschilds_set',
+                         queryset=ParentsChilds.objects.select_related('parent'),
+                         to_attr='parent_links'),
+            )
+        return queryset
 
-class AssignedEmployeesSerializer(serializers.ModelSerializer):
+class AssignedEmployeesSerializer(BaseModelSerializer):
     employee = EmployeeSerializer(read_only=True)
     group = GroupSerializer(read_only=True)
 
+    expandable_fields = {'group': 'group_id', 'employee': 'employee_id'}
+
     class Meta:
         model = AssignedEmployees
         fields = ['group', 'employee', 'role']
 
-class EventSerializer(serializers.ModelSerializer):
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix='', selection=None):
+        if _expands(selection, 'employee'):
+            queryset = queryset.select_related(prefix + 'employee')
+        if _expands(selection, 'group'):
+            queryset = GroupSerializer.setup_eager_loading(queryset.select_related(prefix + 'group'),
+                                                           prefix + 'group__', _child(selection, 'group'))
+        return queryset
+
+class EventSerializer(BaseModelSerializer):
     employee = EmployeeSerializer(read_only=True)
 
+    expandable_fields = {'employee': 'employee_id'}
+
     class Meta:
         model = Event
-        fields = ['id', 'name', 'date_event', 'employee', 'count_participants']
-        read_only_fields = ['employee']
+        fields = ['id', 'name', 'date_event', 'employee', 'count_participants', 'capacity']
+        # Счётчик занятых мест ведёт allocation.py
+        read_only_fields = ['employee', 'count_participants']
 
-class ListParticipantsSerializer  (serializers.ModelSerializer):
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix='', selection=None):
+        if _expands(selection, 'employee'):
+            queryset = queryset.select_related(prefix + 'employee')
+        return queryset
+
+class ListParticipantsSerializer  (BaseModelSerializer):
     child = ChildSerializer(read_only=True)
     event = EventSerializer(read_only=True)
+
+    expandable_fields = {'event': 'event_id', 'child': 'child_id'}
+
+    class Meta:
+        model = ListParticipants
+        fields = ['id', 'event', 'child', 'status']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix='', selection=None):
+        if _expands(selection, 'event'):
+            queryset = EventSerializer.setup_eager_loading(queryset.select_related(prefix + 'event'),
+                                                           prefix + 'event__', _child(selection, 'event'))
+        if _expands(selection, 'child'):
+            queryset = ChildSerializer.setup_eager_loading(queryset.select_related(prefix + 'child'),
+                                                           prefix + 'child__', _child(selection, 'child'))
+        return queryset
+
+class ParentChildSerializer(ChildSerializer):
+    # Ребёнок в синхронизации родителя (sync.py): без данных других родителей
+    parents = None
+
+    method_field_lists = {}
+
+    class Meta(ChildSerializer.Meta):
+        fields = [name for name in ChildSerializer.Meta.fields if name != 'parents']
+
+class ParentsChildsSerializer(BaseModelSerializer):
+    class Meta:
+        model = ParentsChilds
+        fields = ['id', 'parent', 'child']
+        read_only_fields = ['parent', 'child']
+
+class ParticipantLinkSerializer(BaseModelSerializer):
+    # Запись на мероприятие без вложенных объектов - они синхронизируются отдельно
     class Meta:
         model = ListParticipants
-        fields = ['id', 'event', 'child']
\ No newline at end of file
+        fields = ['id', 'event', 'child', 'status']
+        read_only_fields = ['event', 'child', 'status']
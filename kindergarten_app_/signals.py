@@ -0,0 +1,128 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import allocation, counters, feeds, search
+from .authentication import token_cache
+from .models import Child, ListParticipants, ParentsChilds, Group, ListsEvents, Event, Parent, Employee, \
+    EducationalProgram, MedicalContraindicationsChild, Tombstone, ParticipantStatus, User
+
+
+# Удаления могут прийти не только из views (админка, каскадное удаление),
+# поэтому счётчики при удалении поддерживаются через сигналы
+
+
+@receiver(post_delete, sender=Child)
+def child_deleted(sender, instance, **kwargs):
+    counters.children_removed([instance.group_id])
+
+
+@receiver(post_delete, sender=ListParticipants)
+def participant_deleted(sender, instance, **kwargs):
+    # Место занимают только записи registered; освободившееся место получает первый из листа ожидания
+    if instance.status == ParticipantStatus.REGISTERED:
+        allocation.release_seat(instance.event_id)
+
+
+# Кэш токенов (authentication.py) хранит role и is_active пользователя: записи пользователя
+# сбрасываются при любом его сохранении или удалении, запись токена - при удалении токена.
+# Кэш свой в каждом процессе, в остальных процессах запись живёт до TOKEN_AUTH_CACHE['TTL'].
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+# Ленты мероприятий родителей (feeds.py) сбрасываются при любом сохранении или удалении
+# зависимых строк. bulk_create сигналы не отправляет - там feeds вызывается явно.
+
+
+@receiver([post_save, post_delete], sender=ParentsChilds)
+def parent_child_link_changed(sender, instance, **kwargs):
+    feeds.invalidate_parents([instance.parent_id])
+
+
+@receiver(post_save, sender=Child)
+def child_saved(sender, instance, created, **kwargs):
+    if not created:
+        feeds.invalidate_children([instance.id])
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        feeds.invalidate_groups([instance.id])
+
+
+@receiver([post_save, post_delete], sender=ListsEvents)
+def program_events_changed(sender, instance, **kwargs):
+    feeds.invalidate_programs([instance.educational_program_id])
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, created, **kwargs):
+    if not created:
+        feeds.invalidate_events([instance.id])
+
+
+# Синхронизация (sync.py) отдаёт строки с updated_at позже курсора и записи Tombstone об удалениях.
+# Ответ для строки включает вложенные объекты, поэтому их изменение сдвигает updated_at владельца.
+
+
+@receiver(post_delete, sender=Child)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=ListParticipants)
+@receiver(post_delete, sender=ParentsChilds)
+def synced_row_deleted(sender, instance, **kwargs):
+    child_id = instance.id if sender is Child else getattr(instance, 'child_id', None)
+    Tombstone.objects.create(model=sender._meta.model_name, object_id=instance.id, child_id=child_id)
+
+
+@receiver([post_save, post_delete], sender=MedicalContraindicationsChild)
+def contraindication_changed(sender, instance, **kwargs):
+    Child.objects.filter(id=instance.child_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=ParentsChilds)
+def child_parents_changed(sender, instance, **kwargs):
+    Child.objects.filter(id=instance.child_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Parent)
+def parent_saved(sender, instance, created, **kwargs):
+    if not created:
+        Child.objects.filter(parentschilds__parent_id=instance.id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=EducationalProgram)
+def program_saved(sender, instance, created, **kwargs):
+    if not created:
+        Group.objects.filter(educational_program_id=instance.id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Employee)
+def employee_saved(sender, instance, created, **kwargs):
+    if not created:
+        # Мероприятия в лентах родителей включают сотрудника, а update() сигналов не отправляет
+        event_ids = list(Event.objects.filter(employee_id=instance.id).values_list('id', flat=True))
+        Event.objects.filter(id__in=event_ids).update(updated_at=timezone.now())
+        feeds.invalidate_events(event_ids)
+
+
+# Поиск по ФИО (search.py): нормализованное имя пересчитывается при каждом сохранении.
+# bulk_create сигналы не отправляет - там search.fill_search_names вызывается явно.
+
+
+@receiver(pre_save, sender=Child)
+@receiver(pre_save, sender=Parent)
+@receiver(pre_save, sender=Employee)
+def person_saving(sender, instance, **kwargs):
+    search.fill_search_names([instance])
@@ -0,0 +1,66 @@
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from .fastserializers import fast_serializer_for
+
+STREAM_CHUNK_SIZE = 500
+
+# Как JSONRenderer DRF: без \u-экранирования и без пробелов, тело совпадает с ответом без потока
+_encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def wants_stream(request):
+    return request.query_params.get('stream') in ('1', 'json', 'ndjson')
+
+
+def _fast_chunks(queryset, fast, chunk_size):
+    chunk = []
+    for row in fast.values_queryset(queryset).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield fast.build(chunk)
+            chunk = []
+    if chunk:
+        yield fast.build(chunk)
+
+
+def _serialized_chunks(queryset, serializer_class, chunk_size, context):
+    # iterator(chunk_size) читает курсором и выполняет prefetch_related порциями
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield serializer_class(chunk, many=True, context=context).data
+            chunk = []
+    if chunk:
+        yield serializer_class(chunk, many=True, context=context).data
+
+
+def _json_array(chunks):
+    yield '['
+    first = True
+    for items in chunks:
+        for item in items:
+            yield _encoder.encode(item) if first else ',' + _encoder.encode(item)
+            first = False
+    yield ']'
+
+
+def _ndjson(chunks):
+    for items in chunks:
+        yield ''.join(_encoder.encode(item) + '\n' for item in items)
+
+
+def streaming_response(request, queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Отдаёт весь queryset потоком: JSON-массивом (?stream=1) или NDJSON (?stream=ndjson).
+    В памяти одновременно находится не больше chunk_size объектов.
+    """
+    fast = fast_serializer_for(request, serializer_class)
+    if fast is not None:
+        chunks = _fast_chunks(queryset.order_by('id'), fast, chunk_size)
+    else:
+        chunks = _serialized_chunks(queryset.order_by('id'), serializer_class, chunk_size, {'request': request})
+    if request.query_params.get('stream') == 'ndjson':
+        return StreamingHttpResponse(_ndjson(chunks), content_type='application/x-ndjson; charset=utf-8')
+    return StreamingHttpResponse(_json_array(chunks), content_type='application/json; charset=utf-8')
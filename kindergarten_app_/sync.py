@@ -0,0 +1,223 @@
+"""
+Синхронизация изменений для мобильного клиента: api/sync/?cursor=.
+
+Клиент хранит курсор из прошлого ответа и получает только строки с updated_at позже него
+и id удалённых строк (Tombstone). Ответ без изменений - {"full": false, "cursor": ...}.
+Разделы: links (ParentsChilds), children, groups, events, participants (ListParticipants),
+в каждом updated - строки в том же виде, что и в списках API, deleted - id удалённых строк.
+
+Набор строк зависит от роли. Администратор и сотрудник видят все строки. Родитель видит
+свои связи с детьми, своих детей, их группы, мероприятия программ этих групп (из ленты feeds.py)
+и записи своих детей на мероприятия. Если набор детей, групп или мероприятий родителя
+изменился с прошлого курсора, ответ приходит полным (full: true). Клиент тогда заменяет
+все разделы, отсутствующий раздел означает пустой. Так же отвечаем без курсора и на курсор
+старше срока хранения Tombstone.
+
+Ответ содержит не больше SYNC_PAGE_SIZE строк updated. Разделы отдаются по порядку, строки
+внутри раздела - по id. Если строки остались, в ответе more: true, а cursor продолжает выборку
+с места остановки, в том числе посреди раздела. Клиент запрашивает страницы, пока more не станет
+false. full: true бывает только у первой страницы полной выборки, следующие страницы дополняют её
+как upsert. Если у родителя во время постраничной выборки сменился набор строк, выборка
+начинается заново с full: true.
+
+Курсор последней страницы берётся на SYNC_CURSOR_MARGIN раньше начала первой: строки из
+транзакций, которые зафиксировались во время синхронизации, придут повторно, а не потеряются.
+Клиент применяет updated как upsert по id, поэтому повтор безопасен.
+"""
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+from dataclasses import dataclass
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import feeds
+from .fastserializers import serialize_list
+from .models import Child, Group, Event, ListParticipants, ParentsChilds, Parent, Tombstone
+from .serializers import ChildSerializer, ParentChildSerializer, GroupSerializer, EventSerializer, \
+    ParentsChildsSerializer, ParticipantLinkSerializer
+
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+SYNC_CURSOR_MARGIN = datetime.timedelta(seconds=5)
+SYNC_PAGE_SIZE = 1000
+
+
+class CursorError(ValueError):
+    pass
+
+
+def _parse_time(value):
+    since = parse_datetime(value) if isinstance(value, str) else None
+    if since is None or timezone.is_naive(since):
+        raise CursorError('Неверный курсор синхронизации')
+    return since
+
+
+@dataclass
+class Cursor:
+    since: datetime.datetime  # None - полная выборка, продолжаемая курсором со страницами
+    scope: str = None  # отпечаток набора строк родителя
+    # Продолжение выборки: раздел и последний отданный id в нём, курсор после последней страницы
+    section: str = None
+    after: int = None
+    next_since: datetime.datetime = None
+
+    @property
+    def resumes(self):
+        return self.section is not None
+
+    def encode(self):
+        data = {'t': self.since and self.since.isoformat(), 's': self.scope}
+        if self.resumes:
+            data['c'] = [self.section, self.after, self.next_since.isoformat()]
+        data = json.dumps(data, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    @classmethod
+    def decode(cls, value):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+            since, scope, position = data['t'], data['s'], data.get('c')
+        except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+            raise CursorError('Неверный курсор синхронизации')
+        if not (scope is None or isinstance(scope, str)):
+            raise CursorError('Неверный курсор синхронизации')
+        if position is None:
+            return cls(_parse_time(since), scope)
+        if not (isinstance(position, list) and len(position) == 3 and isinstance(position[0], str)
+                and (position[1] is None or type(position[1]) is int)):
+            raise CursorError('Неверный курсор синхронизации')
+        since = None if since is None else _parse_time(since)
+        return cls(since, scope, position[0], position[1], _parse_time(position[2]))
+
+
+@dataclass
+class Section:
+    name: str
+    queryset: object
+    serializer_class: type
+
+
+class StaffScope:
+    """Все строки - для администратора и сотрудника."""
+    key = None
+
+    def sections(self):
+        return [
+            Section('links', ParentsChilds.objects.all(), ParentsChildsSerializer),
+            Section('children', Child.objects.all(), ChildSerializer),
+            Section('groups', Group.objects.all(), GroupSerializer),
+            Section('events', Event.objects.all(), EventSerializer),
+            Section('participants', ListParticipants.objects.all(), ParticipantLinkSerializer),
+        ]
+
+    def deleted(self, section, since):
+        model = section.queryset.model._meta.model_name
+        return Tombstone.objects.filter(model=model, deleted_at__gt=since)
+
+
+class ParentScope:
+    """Строки, которые видит родитель; key меняется при изменении набора детей, групп или мероприятий."""
+
+    def __init__(self, user):
+        # Бросает Parent.DoesNotExist, если у пользователя нет профиля родителя
+        parent_id = Parent.objects.values_list('id', flat=True).get(user_id=user.id)
+        links = sorted(ParentsChilds.objects.filter(parent_id=parent_id).values_list('id', 'child_id'))
+        self.link_ids = [link_id for link_id, _ in links]
+        self.child_ids = sorted({child_id for _, child_id in links})
+        self.group_ids = sorted(set(Child.objects.filter(id__in=self.child_ids).values_list('group_id', flat=True)))
+        # Мероприятия программ групп уже собраны в кэшированной ленте родителя
+        entry = feeds.get_parent_feed_entry(user.id)
+        self.event_ids = sorted(event['id'] for event in entry['events'] or [])
+        scope = (self.link_ids, self.child_ids, self.group_ids, self.event_ids)
+        self.key = hashlib.md5(repr(scope).encode()).hexdigest()[:16]
+
+    def sections(self):
+        return [
+            Section('links', ParentsChilds.objects.filter(id__in=self.link_ids), ParentsChildsSerializer),
+            Section('children', Child.objects.filter(id__in=self.child_ids), ParentChildSerializer),
+            Section('groups', Group.objects.filter(id__in=self.group_ids), GroupSerializer),
+            Section('events', Event.objects.filter(id__in=self.event_ids), EventSerializer),
+            Section('participants', ListParticipants.objects.filter(child_id__in=self.child_ids),
+                    ParticipantLinkSerializer),
+        ]
+
+    def deleted(self, section, since):
+        # Удаление связи, ребёнка или мероприятия меняет key и даёт полный ответ;
+        # без смены набора удаляются только записи на мероприятия
+        if section.name != 'participants' or not self.child_ids:
+            return None
+        return Tombstone.objects.filter(model='listparticipants', child_id__in=self.child_ids, deleted_at__gt=since)
+
+
+def changes(request, cursor_value=None, page_size=None):
+    """
+    Страница изменений для пользователя запроса с курсора cursor_value (None - полная выборка).
+    CursorError при неверном курсоре, Parent.DoesNotExist - если у родителя нет профиля.
+    """
+    started = timezone.now()
+    page_size = page_size or SYNC_PAGE_SIZE
+    cursor = Cursor.decode(cursor_value) if cursor_value else None
+    scope = ParentScope(request.user) if request.user.role == 'Parent' else StaffScope()
+    sections = scope.sections()
+
+    retention = datetime.timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    if cursor is not None and cursor.resumes and cursor.scope == scope.key:
+        if cursor.section not in [section.name for section in sections]:
+            raise CursorError('Неверный курсор синхронизации')
+        since, next_since, full = cursor.since, cursor.next_since, False
+        position = (cursor.section, cursor.after)
+    else:
+        full = (cursor is None or cursor.resumes or cursor.since is None or cursor.since < started - retention
+                or cursor.scope != scope.key)
+        since = None if full else cursor.since
+        next_since, position = started - SYNC_CURSOR_MARGIN, None
+
+    data = {'full': full}
+    remaining = page_size
+    for section in sections:
+        if position is not None:
+            if section.name != position[0]:
+                continue
+            after, position = position[1], None
+        else:
+            after = None
+        if not remaining:
+            # Страница заполнена - следующая начнётся с этого раздела
+            data['more'] = True
+            data['cursor'] = Cursor(since, scope.key, section.name, None, next_since).encode()
+            return data
+        queryset = section.queryset
+        if since is not None:
+            queryset = queryset.filter(updated_at__gt=since)
+        if after is not None:
+            queryset = queryset.filter(id__gt=after)
+        # На строку больше страницы - чтобы знать, остались ли строки в разделе
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:remaining + 1])
+        last = ids[remaining - 1] if len(ids) > remaining else None
+        ids = ids[:remaining]
+        remaining -= len(ids)
+
+        result = {}
+        if ids:
+            queryset = section.serializer_class.optimize_queryset(
+                section.queryset.model.objects.filter(id__in=ids).order_by('id'), request)
+            result['updated'] = serialize_list(request, queryset, section.serializer_class)
+        # Удаления раздела отдаются с его первой страницей
+        deleted = None if since is None or after is not None else scope.deleted(section, since)
+        if deleted is not None:
+            deleted_ids = sorted(set(deleted.values_list('object_id', flat=True)))
+            if deleted_ids:
+                result['deleted'] = deleted_ids
+        if result:
+            data[section.name] = result
+        if last is not None:
+            data['more'] = True
+            data['cursor'] = Cursor(since, scope.key, section.name, last, next_since).encode()
+            return data
+    data['more'] = False
+    data['cursor'] = Cursor(next_since, scope.key).encode()
+    return data
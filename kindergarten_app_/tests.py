@@ -1,3 +1,1561 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import importlib.util
+import io
+import threading
+import json
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import async_views, batch, counters, event_ranges, exports, ical, roster, search, streaming, sync
+from .authentication import token_cache
+from .fastserializers import fast_serializer
+from .hashing import HashingPool, HashingPoolBusy
+from .middleware import registry as query_stats_registry
+from .models import User, Employee, Parent, EducationalProgram, Group, Child, ParentsChilds, \
+    MedicalContraindicationsChild, Event, ListParticipants, ListsEvents, ParticipantStatus, QualificationEmployees
+from .serializers import BaseModelSerializer, EmployeeSerializer, ParentSerializer, ChildSerializer, \
+    EventSerializer, GroupSerializer, ListParticipantsSerializer
+
+_encoder = JSONEncoder(ensure_ascii=False)
+
+
+def _create_dataset():
+    employees = []
+    for i, qualification in enumerate([QualificationEmployees.TEACHER, QualificationEmployees.SENIOR_TEACHER]):
+        user = User.objects.create_user(username=f'employee{i}', password='pw', role='Employee')
+        employees.append(Employee.objects.create(
+            user=user, fname='Ирина', lname='Петрова', patronymic='Олеговна' if i else None, gender=bool(i),
+            birthday=datetime.date(1990, 1, 1 + i), phone_number=80000000000 + i,
+            qualification=qualification, work_experience=i))
+    parents = []
+    for i in range(3):
+        user = User.objects.create_user(username=f'parent{i}', password='pw', role='Parent')
+        parents.append(Parent.objects.create(user=user, fname='Анна', lname='Ёлкина',
+                                             patronymic=None if i else 'Ивановна', phone_number=81000000000 + i))
+    program = EducationalProgram.objects.create(description='Программа', age_category_children=3)
+    group = Group.objects.create(name='Солнышко', age_group='Младшая', educational_program=program)
+    children = []
+    for i in range(5):
+        child = Child.objects.create(fname='Миша', lname='Ёжиков', patronymic=None if i % 2 else 'Петрович',
+                                     gender=bool(i % 2), birthday=datetime.date(2020, 1, 1 + i), group=group,
+                                     transfer_date=datetime.date(2021, 9, 1))
+        children.append(child)
+        # У последнего ребёнка нет ни родителей, ни противопоказаний
+        if i < 4:
+            ParentsChilds.objects.create(parent=parents[i % 3], child=child)
+            MedicalContraindicationsChild.objects.create(C=f'C{i}', description='Аллергия', child=child)
+    ParentsChilds.objects.create(parent=parents[2], child=children[0])
+    MedicalContraindicationsChild.objects.create(C='C-extra', description='Астма', child=children[0])
+    events = [
+        Event.objects.create(name=f'Праздник {i}', employee=employees[i % 2],
+                             date_event=timezone.now() + datetime.timedelta(days=i, microseconds=i * 1234))
+        for i in range(3)
+    ]
+    for child in children[:3]:
+        ListParticipants.objects.create(event=events[0], child=child)
+    ListParticipants.objects.create(event=events[1], child=children[4])
+
+
+class FastSerializerEquivalenceTests(TestCase):
+    """Быстрый путь (fastserializers) выдаёт то же, что и DRF-сериализаторы, включая порядок ключей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+
+    def assertSameOutput(self, serializer_class, queryset):
+        expected = serializer_class(serializer_class.setup_eager_loading(queryset), many=True).data
+        actual = fast_serializer(serializer_class).serialize(queryset)
+        self.assertEqual(_encoder.encode(actual), _encoder.encode(expected))
+
+    def test_employee(self):
+        self.assertSameOutput(EmployeeSerializer, Employee.objects.order_by('id'))
+
+    def test_parent(self):
+        self.assertSameOutput(ParentSerializer, Parent.objects.order_by('id'))
+
+    def test_child(self):
+        self.assertSameOutput(ChildSerializer, Child.objects.order_by('id'))
+
+    def test_event(self):
+        self.assertSameOutput(EventSerializer, Event.objects.order_by('date_event', 'id'))
+
+    def test_group(self):
+        self.assertSameOutput(GroupSerializer, Group.objects.order_by('id'))
+
+    def test_list_participants(self):
+        self.assertSameOutput(ListParticipantsSerializer, ListParticipants.objects.order_by('id'))
+
+    def test_empty_queryset(self):
+        self.assertSameOutput(ChildSerializer, Child.objects.none())
+
+    def test_child_queries(self):
+        # Дети, противопоказания и родители - по одному запросу
+        with self.assertNumQueries(3):
+            fast_serializer(ChildSerializer).serialize(Child.objects.all())
+
+    def test_unsupported_serializer(self):
+        class OpaqueSerializer(BaseModelSerializer):
+            title = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Group
+                fields = ['id', 'title']
+
+            def get_title(self, obj):
+                return obj.name.upper()
+
+        self.assertIsNone(fast_serializer(OpaqueSerializer))
+
+
+class FastSerializerEndpointTests(TestCase):
+    """Списки через API: без параметров работает быстрый путь, ?fields= обслуживает DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+        cls.token = Token.objects.create(user=admin).key
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def test_list_matches_serializer(self):
+        for url, serializer_class, queryset in [
+            ('/api/child/list/', ChildSerializer, Child.objects.order_by('id')),
+            ('/api/parent/list/', ParentSerializer, Parent.objects.order_by('id')),
+            ('/api/employee/list/', EmployeeSerializer, Employee.objects.order_by('id')),
+        ]:
+            expected = serializer_class(serializer_class.setup_eager_loading(queryset), many=True).data
+            for params in ['', '?stream=1']:
+                response = self.client.get(url + params)
+                self.assertEqual(response.status_code, 200)
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                # Без пагинации и потока порядок строк не задан (в PostgreSQL меняется после UPDATE)
+                actual = sorted(json.loads(content), key=lambda item: item['id'])
+                self.assertEqual(actual, json.loads(_encoder.encode(expected)))
+
+    def test_paginated_list(self):
+        response = self.client.get('/api/child/list/', {'page_size': 2})
+        expected = ChildSerializer(ChildSerializer.setup_eager_loading(Child.objects.order_by('id')[:2]),
+                                   many=True).data
+        self.assertEqual(response.data['results'], json.loads(_encoder.encode(expected)))
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         list(Child.objects.order_by('id').values_list('id', flat=True)[2:4]))
+
+    def test_fields_fallback(self):
+        response = self.client.get('/api/child/list/', {'fields': 'id,fname'})
+        child_ids = Child.objects.order_by('id').values_list('id', flat=True)
+        self.assertEqual(sorted(response.data, key=lambda item: item['id']),
+                         [{'id': child_id, 'fname': 'Миша'} for child_id in child_ids])
+
+
+class TokenCacheTests(TestCase):
+    """Кэш токенов: повторный запрос обходится без запросов к токенам, изменения пользователя сбрасывают запись."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', password='pw', role='Admin')
+        cls.token = Token.objects.create(user=cls.user).key
+
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def test_miss_then_hit(self):
+        before = token_cache.stats()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/stats/queries/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/stats/queries/').status_code, 200)
+        after = token_cache.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_unknown_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+        self.assertEqual(self.client.get('/api/stats/queries/').status_code, 401)
+        self.assertIsNone(token_cache.get('unknown'))
+
+    def test_user_saved(self):
+        self.client.get('/api/stats/queries/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(token_cache.get(self.token))
+        self.assertEqual(self.client.get('/api/stats/queries/').status_code, 401)
+
+    def test_role_changed(self):
+        self.client.get('/api/stats/queries/')
+        self.user.role = 'Parent'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/stats/queries/').status_code, 403)
+
+    def test_token_deleted(self):
+        self.client.get('/api/stats/queries/')
+        Token.objects.filter(key=self.token).delete()
+        self.assertEqual(self.client.get('/api/stats/queries/').status_code, 401)
+
+    def test_logout(self):
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/stats/queries/').status_code, 401)
+
+
+class BulkEnrollmentTests(TestCase):
+    """api/child/bulk_add/: пакет проверяется целиком и записывается только без ошибок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+        cls.token = Token.objects.create(user=admin).key
+        cls.group = Group.objects.get()
+        cls.parent = Parent.objects.order_by('id')[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def item(self, fname, codes=(), parent_id=None):
+        return {
+            'child': {'fname': fname, 'lname': 'Соколов', 'gender': False, 'birthday': '2021-03-04',
+                      'group': self.group.id, 'transfer_date': '2022-09-01'},
+            'parent_id': self.parent.id if parent_id is None else parent_id,
+            'medical_contraindications': [{'C': code, 'description': 'Аллергия'} for code in codes],
+        }
+
+    def post(self, items):
+        return self.client.post('/api/child/bulk_add/', {'children': items}, format='json')
+
+    def test_created(self):
+        children, count_children = Child.objects.count(), self.group.count_children
+        response = self.post([self.item('Олег', ['B1']), self.item('Пётр', ['B2', 'B3'])])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([child['fname'] for child in response.data], ['Олег', 'Пётр'])
+        self.assertEqual([len(child['medical_contraindications']) for child in response.data], [1, 2])
+        self.assertEqual(Child.objects.count(), children + 2)
+        self.assertEqual(ParentsChilds.objects.filter(parent=self.parent, child__fname='Пётр').count(), 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.count_children, count_children + 2)
+
+    def test_all_or_nothing(self):
+        children = Child.objects.count()
+        bad = self.item('Иван', parent_id=10 ** 6)
+        del bad['child']['birthday']
+        response = self.post([self.item('Олег', ['B1']), bad])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertEqual(set(response.data['errors'][0]['errors']), {'child', 'parent_id'})
+        self.assertEqual(Child.objects.count(), children)
+        self.assertFalse(MedicalContraindicationsChild.objects.filter(C='B1').exists())
+
+    def test_duplicate_codes_in_request(self):
+        response = self.post([self.item('Олег', ['B1']), self.item('Пётр', ['B2', 'B1'])])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{'index': 1, 'errors': {'medical_contraindications': {
+            1: {'C': ['Такой код уже существует или повторяется в запросе']}}}}])
+        self.assertFalse(Child.objects.filter(fname__in=['Олег', 'Пётр']).exists())
+
+    def test_existing_code(self):
+        response = self.post([self.item('Олег', ['C0'])])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('medical_contraindications', response.data['errors'][0]['errors'])
+
+    def test_not_a_list(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post(['Олег']).data['errors'], [{'index': 0, 'errors': {'error': 'Ожидается объект'}}])
+
+
+class RegisterForParentTests(TestCase):
+    """ListParticipants.objects.register_for_parent: один INSERT ... SELECT ... ON CONFLICT DO NOTHING."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        cls.parent = Parent.objects.order_by('id')[0]
+        cls.own = list(Child.objects.filter(parentschilds__parent=cls.parent).order_by('id'))
+        cls.other = Child.objects.exclude(parentschilds__parent=cls.parent).order_by('id')[0]
+        cls.events = list(Event.objects.order_by('id'))
+
+    def register(self, pairs):
+        return ListParticipants.objects.register_for_parent(self.parent.id, pairs)
+
+    def test_multiple_children_and_events(self):
+        pairs = [(child.id, event.id) for child in self.own[1:] for event in self.events[1:]]
+        created = self.register(pairs)
+        self.assertEqual(sorted((child_id, event_id) for _, event_id, child_id in created), sorted(pairs))
+        rows = ListParticipants.objects.filter(id__in=[row[0] for row in created])
+        self.assertEqual(sorted(rows.values_list('id', 'event_id', 'child_id')), sorted(map(tuple, created)))
+        self.assertEqual(set(rows.values_list('status', flat=True)), {ParticipantStatus.WAITLISTED})
+        self.assertTrue(all(row.created_at and row.updated_at for row in rows))
+
+    def test_duplicates_skipped(self):
+        existing = ListParticipants.objects.get(event=self.events[0], child=self.own[0])
+        pair = (self.own[1].id, self.events[0].id)
+        created = self.register([(self.own[0].id, self.events[0].id), pair, pair])
+        self.assertEqual([(child_id, event_id) for _, event_id, child_id in created], [pair])
+        existing.refresh_from_db()
+        self.assertEqual(existing.status, ParticipantStatus.REGISTERED)
+        self.assertEqual(self.register([pair]), [])
+
+    def test_foreign_child_skipped(self):
+        self.assertEqual(self.register([(self.other.id, self.events[2].id)]), [])
+        self.assertFalse(ListParticipants.objects.filter(child=self.other, event=self.events[2]).exists())
+
+    def test_unknown_event_skipped(self):
+        created = self.register([(self.own[0].id, 10 ** 6), (self.own[0].id, self.events[2].id)])
+        self.assertEqual([(child_id, event_id) for _, event_id, child_id in created],
+                         [(self.own[0].id, self.events[2].id)])
+
+    def test_empty(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.register([]), [])
+
+
+class EventRegistrationEndpointTests(TestCase):
+    """api/event_participants/add/: причины отказа выясняются только для незаписанных пар."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        cls.parent = Parent.objects.order_by('id')[0]
+        cls.token = Token.objects.create(user=cls.parent.user).key
+        cls.own = list(Child.objects.filter(parentschilds__parent=cls.parent).order_by('id'))
+        cls.other = Child.objects.exclude(parentschilds__parent=cls.parent).order_by('id')[0]
+        cls.events = list(Event.objects.order_by('id'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def post(self, data):
+        return self.client.post('/api/event_participants/add/', data, format='json')
+
+    def test_single(self):
+        response = self.post({'child_id': self.own[0].id, 'event_id': self.events[2].id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], ParticipantStatus.REGISTERED)
+        self.assertEqual(self.post({'child_id': self.own[0].id, 'event_id': self.events[2].id}).status_code, 400)
+        self.assertEqual(self.post({'child_id': self.other.id, 'event_id': self.events[2].id}).status_code, 403)
+        self.assertEqual(self.post({'child_id': self.own[0].id, 'event_id': 10 ** 6}).status_code, 404)
+        self.assertEqual(self.post({'child_id': 'x', 'event_id': self.events[2].id}).status_code, 400)
+
+    def test_batch(self):
+        response = self.post({'registrations': [
+            {'child_id': self.own[0].id, 'event_id': self.events[0].id},
+            {'child_id': self.own[0].id, 'event_id': self.events[2].id},
+            {'child_id': self.own[1].id, 'event_id': self.events[2].id},
+            {'child_id': self.other.id, 'event_id': self.events[2].id},
+            {'child_id': self.own[1].id, 'event_id': 10 ** 6},
+        ]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([(item['child']['id'], item['event']['id']) for item in response.data['created']],
+                         [(self.own[0].id, self.events[2].id), (self.own[1].id, self.events[2].id)])
+        self.assertEqual([item['error'] for item in response.data['skipped']], [
+            'Ребенок уже добавлен в список участников мероприятия',
+            'Ребенок не найден или не принадлежит этому родителю',
+            'Мероприятие не найдено',
+        ])
+        self.events[2].refresh_from_db()
+        self.assertEqual(self.events[2].count_participants, 2)
+
+
+class EventCapacityTests(TestCase):
+    """Места на мероприятии с вместимостью и лист ожидания (allocation.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        cls.parent = Parent.objects.order_by('id')[0]
+        for child in Child.objects.exclude(parentschilds__parent=cls.parent):
+            ParentsChilds.objects.create(parent=cls.parent, child=child)
+        cls.children = list(Child.objects.order_by('id')[:4])
+        cls.employee = Employee.objects.order_by('id')[0]
+        cls.event = Event.objects.create(name='Экскурсия', employee=cls.employee, capacity=2,
+                                         date_event=timezone.now() + datetime.timedelta(days=5))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.parent.user)
+
+    def register(self, child):
+        response = self.client.post('/api/event_participants/add/', {'child_id': child.id, 'event_id': self.event.id},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['status']
+
+    def statuses(self):
+        return list(ListParticipants.objects.filter(event=self.event).order_by('id').values_list('status', flat=True))
+
+    def assertSeats(self, count):
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.count_participants, count)
+
+    def test_waitlisted_past_capacity(self):
+        self.assertEqual([self.register(child) for child in self.children[:3]],
+                         [ParticipantStatus.REGISTERED, ParticipantStatus.REGISTERED, ParticipantStatus.WAITLISTED])
+        self.assertSeats(2)
+
+    def test_cancel_promotes_earliest_waitlisted(self):
+        for child in self.children:
+            self.register(child)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/event_participants/cancel/',
+                                        {'child_id': self.children[0].id, 'event_id': self.event.id}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.statuses(), [ParticipantStatus.REGISTERED, ParticipantStatus.REGISTERED,
+                                           ParticipantStatus.WAITLISTED])
+        self.assertEqual(ListParticipants.objects.get(event=self.event, child=self.children[2]).status,
+                         ParticipantStatus.REGISTERED)
+        self.assertSeats(2)
+
+    def test_capacity_increase_promotes_in_order(self):
+        Event.objects.filter(id=self.event.id).update(capacity=1)
+        for child in self.children:
+            self.register(child)
+        self.client.force_authenticate(self.employee.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/event/edit/{self.event.id}/', {'capacity': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(), [ParticipantStatus.REGISTERED] * 3 + [ParticipantStatus.WAITLISTED])
+        self.assertSeats(3)
+
+    def test_batch_signup_does_not_overbook(self):
+        response = self.client.post('/api/event_participants/add/', {'registrations': [
+            {'child_id': child.id, 'event_id': self.event.id} for child in self.children
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['status'] for item in response.data['created']],
+                         [ParticipantStatus.REGISTERED] * 2 + [ParticipantStatus.WAITLISTED] * 2)
+        self.assertSeats(2)
+
+
+class ParentFeedTests(TestCase):
+    """Лента мероприятий родителя (feeds.py) строится заново после изменения того, что в неё входит."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        program = EducationalProgram.objects.get()
+        for event in Event.objects.all():
+            ListsEvents.objects.create(educational_program=program, event=event)
+        cls.parent = Parent.objects.order_by('id')[0]
+        cls.token = Token.objects.create(user=cls.parent.user).key
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def feed(self):
+        response = self.client.get('/api/events/group/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cached(self):
+        self.assertEqual(len(self.feed()), 3)
+        with self.assertNumQueries(0):
+            self.feed()
+
+    def test_event_saved(self):
+        self.feed()
+        event = Event.objects.order_by('date_event')[0]
+        event.name = 'Утренник'
+        event.save()
+        self.assertEqual(self.feed()[0]['name'], 'Утренник')
+
+    def test_employee_saved(self):
+        self.feed()
+        employee = Employee.objects.get(event__date_event=Event.objects.order_by('date_event')[0].date_event)
+        employee.lname = 'Сидорова'
+        employee.save()
+        self.assertEqual(self.feed()[0]['employee']['lname'], 'Сидорова')
+
+
+class KeysetPaginationTests(TestCase):
+    """Keyset-пагинация списков (pagination.py) по ?cursor= и ?page_size=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        program = EducationalProgram.objects.get()
+        employee = Employee.objects.order_by('id')[0]
+        # Мероприятия в порядке даты не совпадают с порядком id
+        for i in range(5):
+            Event.objects.create(name=f'Занятие {i}', employee=employee,
+                                 date_event=timezone.now() - datetime.timedelta(days=i))
+        for event in Event.objects.all():
+            ListsEvents.objects.create(educational_program=program, event=event)
+        cls.program = program
+        cls.admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def follow(self, url, params):
+        pages = [self.client.get(url, params)]
+        while pages[-1].status_code == 200 and pages[-1].data['next']:
+            pages.append(self.client.get(pages[-1].data['next']))
+        self.assertTrue(all(page.status_code == 200 for page in pages))
+        return pages
+
+    def test_pages_cover_rows_once(self):
+        pages = self.follow('/api/parent/list/', {'page_size': 2})
+        self.assertEqual(len(pages), 2)
+        self.assertEqual([row['id'] for page in pages for row in page.data['results']],
+                         list(Parent.objects.order_by('id').values_list('id', flat=True)))
+        pages = self.follow('/api/child/list/', {'page_size': 2, 'fields': 'id,lname'})
+        rows = [row for page in pages for row in page.data['results']]
+        self.assertEqual([row['id'] for row in rows], list(Child.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(set(rows[0]), {'id', 'lname'})
+
+    def test_date_ordering(self):
+        pages = self.follow(f'/api/events/educational_program/{self.program.id}/', {'page_size': 3})
+        self.assertEqual([row['id'] for page in pages for row in page.data['results']],
+                         list(Event.objects.order_by('date_event', 'id').values_list('id', flat=True)))
+
+    def test_page_size_capped(self):
+        users = User.objects.bulk_create([User(username=f'bulk{i}', role='Parent') for i in range(520)])
+        Parent.objects.bulk_create(search.fill_search_names([
+            Parent(user=user, fname='Анна', lname='Пакетная', phone_number=82000000000 + i)
+            for i, user in enumerate(users)]))
+        response = self.client.get('/api/parent/list/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 500)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_plain_list_without_parameters(self):
+        response = self.client.get('/api/parent/list/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), Parent.objects.count())
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/parent/list/', {'cursor': 'x'}).status_code, 404)
+
+
+class HashingPoolTests(TestCase):
+    """Пул хеширования (hashing.py): ограничение очереди и метрики."""
+
+    def blocking_pool(self, max_queue):
+        pool = HashingPool(workers=1, max_queue=max_queue)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+        self.addCleanup(release.set)
+        return pool, block, started, release
+
+    async def test_queue_limit(self):
+        pool, block, started, release = self.blocking_pool(max_queue=2)
+        first = asyncio.ensure_future(pool.run(block))
+        await asyncio.to_thread(started.wait, 5)
+        second = asyncio.ensure_future(pool.run(len, 'abc'))
+        await asyncio.sleep(0)
+        with self.assertRaises(HashingPoolBusy):
+            await pool.run(len, 'abc')
+        stats = pool.stats()
+        self.assertEqual((stats['active'], stats['pending'], stats['max_pending'], stats['rejected']), (1, 1, 1, 1))
+        release.set()
+        self.assertEqual(await second, 3)
+        await first
+        stats = pool.stats()
+        self.assertEqual((stats['active'], stats['pending'], stats['completed']), (0, 0, 2))
+        self.assertGreater(stats['avg_wait_ms'], 0)
+
+    async def test_passwords(self):
+        pool = HashingPool(workers=2, max_queue=4)
+        encoded = await pool.make_password('secret-password-1')
+        self.assertTrue(await pool.check_password('secret-password-1', encoded))
+        self.assertFalse(await pool.check_password('other', encoded))
+        self.assertEqual(pool.stats()['completed'], 3)
+
+
+class AsyncAuthViewTests(TestCase):
+    """Вход, регистрация и смена пароля через async-представления (async_views.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='admin', password='old-password-1', role='Admin')
+
+    def setUp(self):
+        token_cache.clear()
+
+    async def post(self, url, data, **headers):
+        return await self.async_client.post(url, data, content_type='application/json', headers=headers)
+
+    async def login(self, password):
+        return await self.post('/api/async/login/', {'username': 'admin', 'password': password})
+
+    async def test_login_and_register(self):
+        with mock.patch.object(async_views, 'hashing_pool', HashingPool(workers=1, max_queue=2)):
+            response = await self.login('old-password-1')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(await Token.objects.filter(key=response.json()['token'], user=self.user).aexists())
+            self.assertEqual((await self.login('wrong')).status_code, 401)
+            response = await self.post('/api/async/register/', {'username': 'parent_new', 'password': 'pw-new-12345',
+                                                                 'role': 'Parent'})
+            self.assertEqual(response.status_code, 201)
+            user = await User.objects.aget(username='parent_new')
+            self.assertTrue(user.check_password('pw-new-12345'))
+
+    async def test_busy_pool(self):
+        # Пул без мест отклоняет каждую задачу
+        pool = HashingPool(workers=1, max_queue=0)
+        with mock.patch.object(async_views, 'hashing_pool', pool):
+            for response in [await self.login('old-password-1'),
+                             await self.post('/api/async/register/', {'username': 'parent_new',
+                                                                      'password': 'pw-new-12345', 'role': 'Parent'})]:
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response['Retry-After'], str(async_views.HASHING_RETRY_AFTER))
+        self.assertEqual(pool.stats()['rejected'], 2)
+        self.assertFalse(await User.objects.filter(username='parent_new').aexists())
+
+    async def test_change_password_invalidates_token_cache(self):
+        token = (await self.login('old-password-1')).json()['token']
+        headers = {'Authorization': 'Token ' + token}
+        response = await self.async_client.get('/api/async/group/list/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(token_cache.get(token))
+        response = await self.post('/api/async/change-password/', {
+            'old_password': 'old-password-1', 'new_password': 'new-password-2',
+            'new_password_confirm': 'new-password-2'}, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(token_cache.get(token))
+        self.assertEqual((await self.login('old-password-1')).status_code, 401)
+        self.assertEqual((await self.login('new-password-2')).status_code, 200)
+
+
+class AsyncReadViewTests(TestCase):
+    """async-представления чтения (async_views.py) отвечают тем же статусом и телом, что и синхронные."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        program = EducationalProgram.objects.get()
+        for event in Event.objects.all():
+            ListsEvents.objects.create(educational_program=program, event=event)
+        admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+        cls.event = Event.objects.order_by('id')[0]
+        cls.tokens = {
+            'Admin': Token.objects.create(user=admin).key,
+            'Employee': Token.objects.create(user=Employee.objects.order_by('id')[0].user).key,
+            'Parent': Token.objects.create(user=Parent.objects.order_by('id')[0].user).key,
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    async def compare(self, role, path, **params):
+        headers = {'Authorization': 'Token ' + self.tokens[role]}
+        expected = await sync_to_async(self.client.get)(f'/api{path}', params, headers=headers)
+        response = await self.async_client.get(f'/api/async{path}', params, headers=headers)
+        self.assertEqual(response.status_code, expected.status_code, (role, path, params))
+        # Ссылки next ведут на тот же вариант представления
+        body = json.loads(response.content.decode().replace('/api/async/', '/api/'))
+        self.assertEqual(body, json.loads(expected.content), (role, path, params))
+        return response
+
+    async def test_same_responses(self):
+        event_id = self.event.id
+        cases = [
+            ('Admin', '/group/list/', {}),
+            ('Employee', '/group/list/', {'page_size': 1}),
+            ('Parent', '/group/list/', {}),
+            ('Parent', f'/event/{event_id}/', {}),
+            ('Employee', f'/event/{event_id}/', {'fields': 'id,name'}),
+            ('Admin', f'/event/{event_id}/', {}),
+            ('Employee', '/event/1000000/', {}),
+            ('Parent', '/events/group/', {}),
+            ('Employee', '/events/group/', {}),
+            ('Parent', '/groups/children/', {}),
+            ('Employee', f'/event/{event_id}/participants/', {}),
+            ('Employee', f'/event/{event_id}/participants/', {'page_size': 2}),
+            ('Parent', f'/event/{event_id}/participants/', {}),
+        ]
+        for role, path, params in cases:
+            with self.subTest(role=role, path=path, params=params):
+                await self.compare(role, path, **params)
+
+    async def test_event_not_modified(self):
+        response = await self.compare('Parent', f'/event/{self.event.id}/')
+        headers = {'Authorization': 'Token ' + self.tokens['Parent'], 'If-None-Match': response['ETag']}
+        self.assertEqual((await self.async_client.get(f'/api/async/event/{self.event.id}/', headers=headers))
+                         .status_code, 304)
+        self.assertEqual((await sync_to_async(self.client.get)(f'/api/event/{self.event.id}/', headers=headers))
+                         .status_code, 304)
+        headers['Authorization'] = 'Token ' + self.tokens['Admin']
+        self.assertEqual((await self.async_client.get(f'/api/async/event/{self.event.id}/', headers=headers))
+                         .status_code, 403)
+
+
+class StreamingResponseTests(TestCase):
+    """Потоковые списки (streaming.py): ?stream=1 - JSON-массив, ?stream=ndjson - объект на строку."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Строк больше STREAM_CHUNK_SIZE - ответ собирается из нескольких порций
+        users = User.objects.bulk_create([User(username=f'bulk{i}', role='Parent')
+                                          for i in range(streaming.STREAM_CHUNK_SIZE + 20)])
+        Parent.objects.bulk_create(search.fill_search_names([
+            Parent(user=user, fname='Анна', lname='Ёлкина', phone_number=82000000000 + i)
+            for i, user in enumerate(users)]))
+        cls.admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+        cls.ids = list(Parent.objects.order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def stream(self, **params):
+        response = self.client.get('/api/parent/list/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_json_array_matches_plain_response(self):
+        for fields in [None, 'id,lname']:
+            params = {'fields': fields} if fields else {}
+            _, content = self.stream(stream='1', **params)
+            plain = json.loads(self.client.get('/api/parent/list/', params).content)
+            # Тот же ответ без потока, в порядке id и в формате JSONRenderer - байт в байт
+            self.assertEqual(content, JSONRenderer().render(sorted(plain, key=lambda item: item['id'])), fields)
+            self.assertEqual([item['id'] for item in json.loads(content)], self.ids)
+
+    def test_ndjson(self):
+        for fields in [None, 'id,lname']:
+            params = {'fields': fields} if fields else {}
+            response, content = self.stream(stream='ndjson', **params)
+            self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+            lines = content.decode().split('\n')
+            self.assertEqual(lines.pop(), '')
+            items = [json.loads(line) for line in lines]
+            self.assertEqual([item['id'] for item in items], self.ids)
+            self.assertEqual(items[0]['lname'], 'Ёлкина')
+            self.assertIn('"lname":"Ёлкина"', lines[0])
+
+
+class GenerateDatasetTests(TestCase):
+    """Команда generate_dataset (dataset.py): согласованный набор и повторный запуск с тем же префиксом."""
+
+    def generate(self, *args):
+        out = io.StringIO()
+        call_command('generate_dataset', '--parents', '5', '--children', '8', '--groups', '2', '--employees', '1',
+                     '--events', '2', '--participants-per-event', '3', *args, stdout=out)
+        return out.getvalue()
+
+    def test_generate(self):
+        self.assertIn('Готово', self.generate())
+        self.assertEqual((Parent.objects.count(), Child.objects.count(), Group.objects.count()), (5, 8, 2))
+        self.assertEqual(ListParticipants.objects.count(), 6)
+        self.assertTrue(all(child.search_name for child in Child.objects.all()))
+
+    def test_repeated_prefix(self):
+        self.generate()
+        with self.assertRaisesMessage(CommandError, 'gen1'):
+            self.generate()
+        self.assertEqual(Parent.objects.count(), 5)
+        self.generate('--prefix', 'second')
+        self.assertEqual(Parent.objects.count(), 10)
+
+
+class CounterTests(TestCase):
+    """Счётчики Group.count_children и Event.count_participants (counters.py) и команда check_counters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        # Набор создан через ORM без счётчиков - выравниваем их командой
+        call_command('check_counters', '--fix', stdout=io.StringIO())
+        cls.admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+        cls.group = Group.objects.get()
+        cls.other_group = Group.objects.create(name='Радуга', age_group='Средняя',
+                                               educational_program=cls.group.educational_program)
+
+    def counts(self):
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        return self.group.count_children, self.other_group.count_children
+
+    def check_counters(self, *args):
+        out = io.StringIO()
+        call_command('check_counters', *args, stdout=out)
+        return out.getvalue()
+
+    def test_baseline(self):
+        self.assertEqual(self.counts(), (5, 0))
+        self.assertEqual(Event.objects.order_by('id')[0].count_participants, 3)
+        self.assertIn('Расхождений не найдено', self.check_counters())
+
+    def test_transfer(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        child = Child.objects.order_by('id')[0]
+        response = client.patch(f'/api/child/edit/{child.id}/', {'group': self.other_group.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts(), (4, 1))
+        # Сохранение без смены группы счётчики не трогает
+        client.patch(f'/api/child/edit/{child.id}/', {'fname': 'Коля'}, format='json')
+        self.assertEqual(self.counts(), (4, 1))
+
+    def test_deletes(self):
+        Child.objects.order_by('id')[4].delete()
+        self.assertEqual(self.counts(), (4, 0))
+        event = Event.objects.order_by('id')[0]
+        ListParticipants.objects.filter(event=event).order_by('id')[0].delete()
+        event.refresh_from_db()
+        self.assertEqual(event.count_participants, 2)
+
+    def test_floor_at_zero(self):
+        counters.children_removed([self.other_group.id, self.other_group.id])
+        self.assertEqual(self.counts(), (5, 0))
+
+    def test_check_and_fix(self):
+        Group.objects.filter(id=self.group.id).update(count_children=42)
+        event = Event.objects.order_by('id')[0]
+        Event.objects.filter(id=event.id).update(count_participants=0)
+        output = self.check_counters()
+        self.assertIn(f'Group {self.group.id}: count_children=42, фактически 5', output)
+        self.assertIn(f'Event {event.id}: count_participants=0, фактически 3', output)
+        self.assertEqual(self.counts(), (42, 0))
+        self.check_counters('--fix')
+        event.refresh_from_db()
+        self.assertEqual((self.counts(), event.count_participants), ((5, 0), 3))
+        self.assertIn('Расхождений не найдено', self.check_counters())
+
+
+class SparseFieldsTests(TestCase):
+    """?fields= и ?expand= (SparseFieldsMixin): состав вывода и загружаемые колонки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        cls.event = Event.objects.order_by('id')[0]
+        cls.employee = Employee.objects.order_by('id')[0]
+        cls.admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def groups(self, **params):
+        response = self.client.get('/api/group/list/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def participants(self, **params):
+        self.client.force_authenticate(self.employee.user)
+        response = self.client.get(f'/api/event/{self.event.id}/participants/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(response.data, key=lambda item: item['id'])
+
+    def test_fields(self):
+        self.assertEqual([set(group) for group in self.groups(fields='id,name')], [{'id', 'name'}])
+        group = self.groups(fields='id,educational_program.age_category_children')[0]
+        self.assertEqual(group['educational_program'], {'age_category_children': 3})
+        child = self.client.get(f'/api/child/{Child.objects.order_by("id")[0].id}/', {'fields': 'id,lname'}).data
+        self.assertEqual(set(child), {'id', 'lname'})
+
+    def test_group_expand(self):
+        program = EducationalProgram.objects.get()
+        self.assertEqual(self.groups(expand='')[0]['educational_program'], program.id)
+        self.assertEqual(self.groups(expand='educational_program')[0]['educational_program']['description'],
+                         'Программа')
+        self.assertIsInstance(self.groups()[0]['educational_program'], dict)
+
+    def test_participants_expand(self):
+        participant = self.participants(expand='')[0]
+        self.assertEqual((participant['event'], type(participant['child'])), (self.event.id, int))
+        participant = self.participants(expand='event')[0]
+        self.assertEqual(participant['event']['employee'], self.event.employee_id)
+        self.assertIsInstance(participant['child'], int)
+        participant = self.participants(expand='event.employee,child')[0]
+        self.assertEqual(participant['event']['employee']['id'], self.event.employee_id)
+        # Связи «ко многим» ребёнка не раскрыты и не выводятся
+        self.assertEqual(participant['child']['fname'], 'Миша')
+        self.assertFalse({'parents', 'medical_contraindications'} & set(participant['child']))
+        participant = self.participants(expand='child.parents')[0]
+        self.assertIsInstance(participant['child']['parents'], list)
+        participant = self.participants(fields='id,child.fname')[0]
+        self.assertEqual(participant, {'id': participant['id'], 'child': {'fname': 'Миша'}})
+
+    def test_unselected_columns_not_loaded(self):
+        for params in [{'fields': 'id,name'}, {'fields': 'id,educational_program.age_category_children'},
+                       {'expand': ''}]:
+            with CaptureQueriesContext(connection) as queries:
+                self.groups(**params)
+            sql = ' '.join(query['sql'] for query in queries.captured_queries)
+            self.assertIn('kindergarten_app__group', sql, params)
+            self.assertNotIn('description', sql, params)
+        with CaptureQueriesContext(connection) as queries:
+            self.groups(fields='id,name')
+        self.assertNotIn('age_group', ' '.join(query['sql'] for query in queries.captured_queries))
+        with CaptureQueriesContext(connection) as queries:
+            self.groups()
+        self.assertIn('description', ' '.join(query['sql'] for query in queries.captured_queries))
+
+    def test_unknown_names_ignored(self):
+        self.assertEqual([set(group) for group in self.groups(fields='id,unknown,name.unknown')], [{'id', 'name'}])
+        self.assertEqual(self.groups(expand='unknown'), self.groups(expand=''))
+        participant = self.participants(expand='unknown.path')[0]
+        self.assertIsInstance(participant['event'], int)
+
+
+class ConditionalGetTests(TestCase):
+    """Условный GET detail-представлений (conditional.py): 304 по ETag и Last-Modified, смена ETag после изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        cls.admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+        cls.employee = Employee.objects.order_by('id')[0]
+        cls.parent = Parent.objects.order_by('id')[0]
+        cls.child = Child.objects.filter(parentschilds__parent=cls.parent).order_by('id')[0]
+        cls.event = Event.objects.filter(employee=cls.employee).order_by('id')[0]
+        cls.group = Group.objects.get()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee.user)
+
+    def urls(self):
+        return [
+            f'/api/group/{self.group.id}/',
+            f'/api/education_program/{self.group.educational_program_id}/',
+            f'/api/event/{self.event.id}/',
+            f'/api/child/{self.child.id}/',
+            f'/api/employee/list/{self.employee.user_id}/',
+        ]
+
+    def etag(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        return response['ETag']
+
+    def test_not_modified(self):
+        for url in self.urls():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304, url)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+                             304, url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200, url)
+
+    def test_representation_in_etag(self):
+        url = f'/api/child/{self.child.id}/'
+        etag = self.etag(url)
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_changes_after_save(self):
+        url = f'/api/child/{self.child.id}/'
+        etag = self.etag(url)
+        self.child.fname = 'Коля'
+        self.child.save()
+        self.assertNotEqual(self.etag(url), etag)
+
+    def test_child_etag_follows_parent_and_contraindications(self):
+        url = f'/api/child/{self.child.id}/'
+        etag = self.etag(url)
+        self.parent.fname = 'Ольга'
+        self.parent.save()
+        changed = self.etag(url)
+        self.assertNotEqual(changed, etag)
+        MedicalContraindicationsChild.objects.create(C='C-new', description='Аллергия', child=self.child)
+        self.assertNotEqual(self.etag(url), changed)
+
+    def test_event_etag_follows_employee(self):
+        url = f'/api/event/{self.event.id}/'
+        etag = self.etag(url)
+        self.employee.lname = 'Сидорова'
+        self.employee.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['employee']['lname'], 'Сидорова')
+
+    def test_group_etag_follows_program(self):
+        url = f'/api/group/{self.group.id}/'
+        etag = self.etag(url)
+        program = self.group.educational_program
+        program.description = 'Новая программа'
+        program.save()
+        self.assertNotEqual(self.etag(url), etag)
+
+    def test_forbidden_role_gets_403(self):
+        child_url, event_url = f'/api/child/{self.child.id}/', f'/api/event/{self.event.id}/'
+        child_etag, event_etag = self.etag(child_url), self.etag(event_url)
+        self.client.force_authenticate(self.parent.user)
+        self.assertEqual(self.client.get(child_url, HTTP_IF_NONE_MATCH=child_etag).status_code, 403)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(event_url, HTTP_IF_NONE_MATCH=event_etag).status_code, 403)
+
+
+@override_settings(QUERY_STATS={'SAMPLE_RATE': 1.0, 'DIR': None})
+class QueryStatsMiddlewareTests(TestCase):
+    """Статистика QueryStatsMiddleware: у потоковых ответов запросы и размер учитываются при чтении тела."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+        cls.token = Token.objects.create(user=admin).key
+
+    def setUp(self):
+        query_stats_registry.reset()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def test_plain_response(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/child/list/')
+        entry = query_stats_registry.snapshot()['list_children']
+        self.assertEqual(entry['requests'], 1)
+        self.assertEqual(entry['queries'], len(queries))
+        self.assertEqual(entry['response_bytes'], len(response.content))
+
+    def test_streaming_response(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/child/list/', {'stream': '1'})
+            self.assertNotIn('list_children', query_stats_registry.snapshot())
+            content = b''.join(response.streaming_content)
+        entry = query_stats_registry.snapshot()['list_children']
+        self.assertEqual(entry['requests'], 1)
+        self.assertEqual(entry['queries'], len(queries))
+        self.assertEqual(entry['response_bytes'], len(content))
+
+    def test_unresolved_paths_share_entry(self):
+        for path in ['/api/unknown/', '/wp-login.php']:
+            self.assertEqual(self.client.get(path).status_code, 404)
+        self.assertEqual(list(query_stats_registry.snapshot()), ['unresolved:404'])
+        self.assertEqual(query_stats_registry.snapshot()['unresolved:404']['requests'], 2)
+
+
+ROSTER_HEADER = ['fname', 'lname', 'gender', 'birthday', 'group', 'transfer_date', 'parent_phone', 'parent_fname',
+                 'parent_lname', 'contraindications']
+ROSTER_ROWS = [
+    ['Олег', 'Соколов', 'м', '04.03.2021', 'Солнышко', '2022-09-01', '81000000000', '', '', 'R1: Астма'],
+    ['Вера', 'Соколова', 'ж', '2021-05-06', 'Солнышко', '2022-09-01', '85000000000', 'Нина', 'Соколова', ''],
+    ['Ира', 'Соколова', 'x', '2021-05-06', 'Луна', '2022-09-01', '85000000001', '', '', 'R2 Астма'],
+    ['Лев', 'Соколов', 'м', '2021-05-06', 'Солнышко', '2022-09-01', '85000000000', '', '', 'R1: Аллергия'],
+]
+
+
+def _roster_csv(rows, delimiter=','):
+    lines = [delimiter.join(ROSTER_HEADER)] + [delimiter.join(row) for row in rows]
+    return io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8-sig'))
+
+
+class RosterImportTests(TestCase):
+    """Импорт ростеров (roster.py): чтение CSV/XLSX, отчёт об ошибках строк и dry_run."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+
+    def assertImported(self, report):
+        self.assertIsNone(report.error)
+        self.assertEqual((report.rows, report.children_created, report.error_rows), (4, 2, 2))
+        self.assertEqual((report.parents_created, report.parents_reused, report.contraindications_created), (1, 1, 1))
+        self.assertEqual([item['row'] for item in report.errors], [4, 5])
+        self.assertEqual(set(report.errors[0]['errors']), {'gender', 'contraindications'})
+        self.assertEqual(report.errors[1]['errors'], {'contraindications': 'Коды уже существуют: R1'})
+
+    def test_csv(self):
+        children = Child.objects.count()
+        self.assertImported(roster.import_roster(_roster_csv(ROSTER_ROWS), 'csv', batch_size=2))
+        self.assertEqual(Child.objects.count(), children + 2)
+        oleg = Child.objects.get(fname='Олег')
+        self.assertEqual(oleg.birthday, datetime.date(2021, 3, 4))
+        self.assertEqual(list(oleg.parentschilds_set.values_list('parent__phone_number', flat=True)), [81000000000])
+        self.assertEqual(oleg.medicalcontraindicationschild_set.get().C, 'R1')
+        parent = Parent.objects.get(phone_number=85000000000)
+        self.assertEqual((parent.fname, parent.user.username), ('Нина', 'parent_85000000000'))
+        self.assertFalse(parent.user.has_usable_password())
+
+    def test_semicolon_csv(self):
+        self.assertImported(roster.import_roster(_roster_csv(ROSTER_ROWS, ';'), 'csv'))
+
+    @unittest.skipUnless(importlib.util.find_spec('openpyxl'), 'нужен openpyxl')
+    def test_xlsx(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(ROSTER_HEADER)
+        for row in ROSTER_ROWS:
+            # Даты и телефоны - ячейки с типами, как в файлах из Excel
+            values = list(row)
+            values[6] = int(values[6])
+            values[5] = datetime.datetime.strptime(values[5], '%Y-%m-%d')
+            sheet.append(values)
+        content = io.BytesIO()
+        workbook.save(content)
+        content.seek(0)
+        self.assertImported(roster.import_roster(content, 'xlsx'))
+        self.assertEqual(Child.objects.get(fname='Вера').transfer_date, datetime.date(2022, 9, 1))
+
+    def test_dry_run(self):
+        children, parents = Child.objects.count(), Parent.objects.count()
+        report = roster.import_roster(_roster_csv(ROSTER_ROWS), 'csv', batch_size=2, dry_run=True)
+        self.assertTrue(report.dry_run)
+        self.assertImported(report)
+        self.assertEqual((Child.objects.count(), Parent.objects.count()), (children, parents))
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(roster.RosterError, 'Нет обязательных колонок: parent_phone'):
+            roster.import_roster(io.BytesIO('fname,lname,gender,birthday,group,transfer_date\n'.encode()), 'csv')
+        with self.assertRaises(roster.RosterError):
+            roster.import_roster(io.BytesIO(b'not a workbook'), 'xlsx')
+
+    def test_endpoint(self):
+        admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+        client = APIClient()
+        client.force_authenticate(admin)
+        upload = SimpleUploadedFile('roster.csv', _roster_csv(ROSTER_ROWS).getvalue(), content_type='text/csv')
+        response = client.post('/api/child/import/', {'file': upload, 'dry_run': 'true'}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['children_created'], response.data['dry_run']), (2, True))
+        self.assertFalse(Child.objects.filter(fname='Олег').exists())
+        upload = SimpleUploadedFile('roster.txt', b'fname\n')
+        self.assertEqual(client.post('/api/child/import/', {'file': upload}, format='multipart').status_code, 400)
+
+
+class ExportTests(TestCase):
+    """Выгрузки CSV/XLSX (exports.py): заголовки, порядок строк и преобразование значений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        user = User.objects.get(username='employee0')
+        cls.token = Token.objects.create(user=user).key
+        cls.event = Event.objects.order_by('id')[0]
+        cls.waitlisted = ListParticipants.objects.filter(event=cls.event).order_by('id').last()
+        cls.waitlisted.status = ParticipantStatus.WAITLISTED
+        cls.waitlisted.save()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def csv_rows(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:]), delimiter=';'))
+
+    def test_children_csv(self):
+        rows = self.csv_rows('/api/child/export/')
+        self.assertEqual(rows[0], ['ID', 'Фамилия', 'Имя', 'Отчество', 'Пол', 'Дата рождения', 'Группа',
+                                   'Дата зачисления'])
+        children = list(Child.objects.order_by('lname', 'fname', 'id'))
+        self.assertEqual([int(row[0]) for row in rows[1:]], [child.id for child in children])
+        first = children[0]
+        self.assertEqual(rows[1], [str(first.id), 'Ёжиков', 'Миша', 'Петрович', 'м',
+                                   first.birthday.strftime('%d.%m.%Y'), 'Солнышко', '01.09.2021'])
+        self.assertEqual(rows[2][3:5], ['', 'ж'])
+
+    def test_children_by_group(self):
+        group = Group.objects.get()
+        self.assertEqual(len(self.csv_rows('/api/child/export/', {'group': group.id})), Child.objects.count() + 1)
+        response = self.client.get('/api/child/export/', {'group': 10 ** 6})
+        self.assertEqual(response.status_code, 404)
+
+    def test_participants_csv(self):
+        rows = self.csv_rows(f'/api/event/{self.event.id}/participants/export/')
+        self.assertEqual(rows[0][-1], 'Статус')
+        statuses = {int(row[0]): row[-1] for row in rows[1:]}
+        self.assertEqual(len(statuses), 3)
+        self.assertEqual(statuses.pop(self.waitlisted.child_id), 'лист ожидания')
+        self.assertEqual(set(statuses.values()), {'записан'})
+        self.assertEqual(self.client.get('/api/event/1000000/participants/export/').status_code, 404)
+
+    def test_employees_csv(self):
+        rows = self.csv_rows('/api/employee/export/')
+        self.assertEqual(rows[0][-3:], ['Телефон', 'Квалификация', 'Стаж'])
+        self.assertEqual([row[6] for row in rows[1:]], ['80000000000', '80000000001'])
+
+    @unittest.skipUnless(importlib.util.find_spec('openpyxl'), 'нужен openpyxl')
+    def test_children_xlsx(self):
+        from openpyxl import load_workbook
+        response = self.client.get('/api/child/export/', {'file_type': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], exports.XLSX_CONTENT_TYPE)
+        self.assertIn('children.xlsx', response['Content-Disposition'])
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.worksheets[0].iter_rows(values_only=True))
+        workbook.close()
+        self.assertEqual(rows[0][:3], ('ID', 'Фамилия', 'Имя'))
+        self.assertEqual(len(rows), Child.objects.count() + 1)
+        # В XLSX даты остаются датами, а не строками
+        self.assertEqual(rows[1][5].date(), Child.objects.get(id=rows[1][0]).birthday)
+
+    def test_unknown_file_type(self):
+        self.assertEqual(self.client.get('/api/child/export/', {'file_type': 'pdf'}).status_code, 400)
+
+    def test_forbidden(self):
+        parent = Parent.objects.order_by('id')[0]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=parent.user).key)
+        self.assertEqual(self.client.get('/api/child/export/').status_code, 403)
+
+
+class CalendarFeedTests(TestCase):
+    """Лента iCalendar (ical.py): токен HMAC, тело календаря, условный GET и диапазоны ?from=/?to=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        program = EducationalProgram.objects.get()
+        for event in Event.objects.all():
+            ListsEvents.objects.create(educational_program=program, event=event)
+        cls.employee = Employee.objects.get(user__username='employee0')
+        cls.parent = Parent.objects.order_by('id')[0]
+        cls.event = Event.objects.filter(employee=cls.employee).order_by('date_event')[0]
+        cls.event.name = 'Праздник, весна; день'
+        cls.event.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self, user, **params):
+        return self.client.get('/api/calendar/feed.ics', {'token': ical.calendar_token(user), **params})
+
+    def test_token_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.employee.user)
+        response = client.get('/api/calendar/token/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['token'], ical.calendar_token(self.employee.user))
+        self.assertTrue(response.data['url'].startswith('http://testserver/api/calendar/feed.ics?token='))
+        client.force_authenticate(User.objects.create_user(username='admin', password='pw', role='Admin'))
+        self.assertEqual(client.get('/api/calendar/token/').status_code, 403)
+
+    def test_token_validation(self):
+        user = self.employee.user
+        token = ical.calendar_token(user)
+        self.assertEqual(ical.user_from_token(token), user)
+        for bad in ['', 'x', f'{user.pk}-', f'{user.pk}-{"0" * 40}', f'{self.parent.user_id}-{token.split("-")[1]}']:
+            self.assertIsNone(ical.user_from_token(bad), bad)
+        self.assertEqual(self.client.get('/api/calendar/feed.ics', {'token': token + '0'}).status_code, 404)
+
+    def test_token_revoked(self):
+        user = self.employee.user
+        token = ical.calendar_token(user)
+        user.set_password('new')
+        user.save()
+        self.assertIsNone(ical.user_from_token(token))
+        user.is_active = False
+        user.save()
+        self.assertIsNone(ical.user_from_token(ical.calendar_token(user)))
+
+    def test_employee_feed(self):
+        response = self.feed(self.employee.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], ical.ICAL_CONTENT_TYPE)
+        self.assertIn('private', response['Cache-Control'])
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        uids = [line for line in body.split('\r\n') if line.startswith('UID:')]
+        own = Event.objects.filter(employee=self.employee).order_by('date_event', 'id')
+        self.assertEqual(uids, [f'UID:event-{event.id}@{ical.UID_DOMAIN}' for event in own])
+        self.assertIn('SUMMARY:Праздник\\, весна\; день\r\n', body)
+        self.assertIn('DTSTART:' + self.event.date_event.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
+                      body)
+
+    def test_parent_feed(self):
+        body = b''.join(self.feed(self.parent.user).streaming_content).decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), Event.objects.count())
+
+    def test_conditional_get(self):
+        response = self.feed(self.employee.user)
+        etag = response['ETag']
+        response = self.client.get('/api/calendar/feed.ics', {'token': ical.calendar_token(self.employee.user)},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.event.name = 'Утренник'
+        self.event.save()
+        self.assertNotEqual(self.feed(self.employee.user)['ETag'], etag)
+
+    def test_range(self):
+        day = timezone.localtime(self.event.date_event).date()
+        body = b''.join(self.feed(self.employee.user, **{'from': day.isoformat(), 'to': day.isoformat()})
+                        .streaming_content).decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:event-{self.event.id}@', body)
+
+    def test_range_errors(self):
+        for params in [{'from': 'вчера'}, {'to': '2026-13-01'}, {'from': '2026-09-02', 'to': '2026-09-01'}]:
+            response = self.feed(self.employee.user, **params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    def test_parse_range(self):
+        start, end = event_ranges.parse_range({'from': '2026-09-01', 'to': '2026-09-01'})
+        self.assertEqual(end - start, datetime.timedelta(days=1))
+        self.assertTrue(timezone.is_aware(start))
+        start, end = event_ranges.parse_range({'from': '2026-09-01T10:00:00+03:00'})
+        self.assertEqual(start, datetime.datetime(2026, 9, 1, 7, tzinfo=datetime.timezone.utc))
+        self.assertIsNone(end)
+        self.assertEqual(event_ranges.parse_range({}), (None, None))
+
+    def test_fold(self):
+        line = 'SUMMARY:' + 'ё' * 60
+        folded = ical._fold(line)
+        parts = folded[:-2].split('\r\n')
+        self.assertTrue(all(len(part.encode()) <= 75 for part in parts))
+        self.assertEqual(parts[0] + ''.join(part[1:] for part in parts[1:]), line)
+
+
+class SyncTests(TestCase):
+    """Синхронизация (sync.py): курсор, страницы выборки, удаления и смена набора строк родителя."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+        program = EducationalProgram.objects.get()
+        for event in Event.objects.all():
+            ListsEvents.objects.create(educational_program=program, event=event)
+        cls.employee = Employee.objects.get(user__username='employee0')
+        cls.parent = Parent.objects.order_by('id')[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee.user)
+
+    def sync(self, cursor=None):
+        response = self.client.get('/api/sync/', {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def pages(self, cursor=None):
+        pages = [self.sync(cursor)]
+        while pages[-1]['more']:
+            pages.append(self.sync(pages[-1]['cursor']))
+        return pages
+
+    def test_cursor_round_trip(self):
+        now = timezone.now()
+        for cursor in [sync.Cursor(now), sync.Cursor(now, 'abc'), sync.Cursor(None, None, 'events', 7, now),
+                       sync.Cursor(now, 'abc', 'links', None, now)]:
+            self.assertEqual(sync.Cursor.decode(cursor.encode()), cursor)
+        bad = ['x', 'e30', sync.Cursor(now).encode()[:-3],
+               sync.Cursor(None, None, 'events', 7, now).encode().replace('Ijp', 'Ija')]
+        for value in bad:
+            with self.assertRaises(sync.CursorError, msg=value):
+                sync.Cursor.decode(value)
+        self.assertEqual(self.client.get('/api/sync/', {'cursor': 'x'}).status_code, 400)
+
+    def test_paged_full_snapshot(self):
+        with mock.patch.object(sync, 'SYNC_PAGE_SIZE', 3):
+            pages = self.pages()
+        self.assertTrue(pages[0]['full'])
+        self.assertFalse(any(page['full'] for page in pages[1:]))
+        self.assertTrue(all(sum(len(page.get(name, {}).get('updated', [])) for name in
+                                ['links', 'children', 'groups', 'events', 'participants']) <= 3 for page in pages))
+        models = {'links': ParentsChilds, 'children': Child, 'groups': Group, 'events': Event,
+                  'participants': ListParticipants}
+        for name, model in models.items():
+            ids = [row['id'] for page in pages for row in page.get(name, {}).get('updated', [])]
+            self.assertEqual(ids, list(model.objects.order_by('id').values_list('id', flat=True)), name)
+        self.assertFalse(sync.Cursor.decode(pages[-1]['cursor']).resumes)
+
+    def test_delta_and_tombstones(self):
+        cursor = sync.Cursor(timezone.now()).encode()
+        data = self.sync(cursor)
+        self.assertEqual(set(data), {'full', 'more', 'cursor'})
+        self.assertFalse(data['full'] or data['more'])
+        child = Child.objects.order_by('id')[0]
+        child.fname = 'Коля'
+        child.save()
+        participant = ListParticipants.objects.order_by('id')[0]
+        participant_id = participant.id
+        participant.delete()
+        data = self.sync(cursor)
+        self.assertFalse(data['full'])
+        self.assertEqual([row['fname'] for row in data['children']['updated']], ['Коля'])
+        self.assertEqual(data['participants']['deleted'], [participant_id])
+
+    def test_parent_scope_change_forces_full(self):
+        self.client.force_authenticate(self.parent.user)
+        key = sync.Cursor.decode(self.sync()['cursor']).scope
+        cursor = sync.Cursor(timezone.now(), key).encode()
+        self.assertFalse(self.sync(cursor)['full'])
+        resumed = sync.Cursor(None, key, 'events', None, timezone.now()).encode()
+        self.assertFalse(self.sync(resumed)['full'])
+        ParentsChilds.objects.create(parent=self.parent, child=Child.objects.order_by('id')[4])
+        data = self.sync(cursor)
+        self.assertTrue(data['full'])
+        self.assertEqual(len(data['children']['updated']), 3)
+        # Набор сменился посреди постраничной выборки - она начинается заново
+        self.assertTrue(self.sync(resumed)['full'])
+
+
+class NameIndexTests(TestCase):
+    """Индекс имён для нечёткого поиска (search.py) сверяется с БД и дочитывает изменения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_dataset()
+
+    def setUp(self):
+        search._indexes.clear()
+
+    def test_rename_updates_index(self):
+        index = search.name_index(Parent)
+        with self.assertNumQueries(1):
+            self.assertIs(search.name_index(Parent), index)
+        parent = Parent.objects.order_by('id')[0]
+        parent.lname = 'Сидорова'
+        parent.save()
+        self.assertIs(search.name_index(Parent), index)
+        self.assertEqual(index.search('сидорва', 5), [parent.id])
+        self.assertNotIn(parent.id, index.search('елкина', 5))
+
+    def test_bulk_create_and_delete(self):
+        index = search.name_index(Child)
+        child = Child.objects.order_by('id')[0]
+        Child.objects.bulk_create(search.fill_search_names([
+            Child(fname='Оля', lname='Тарасова', gender=False, birthday=datetime.date(2020, 2, 2),
+                  group=child.group, transfer_date=datetime.date(2021, 9, 1))]))
+        self.assertIs(search.name_index(Child), index)
+        self.assertEqual(len(index.search('тарасва', 5)), 1)
+        child.delete()
+        rebuilt = search.name_index(Child)
+        self.assertIsNot(rebuilt, index)
+        self.assertNotIn(child.id, rebuilt.ids)
+        self.assertEqual(len(rebuilt.ids), Child.objects.count())
+
+    def test_incremental_matches_rebuild(self):
+        rows = [(1, 'елкина анна ивановна'), (2, 'петрова ирина'), (3, 'ежиков миша')]
+        index = search.NameIndex(rows[:2])
+        index.update([(3, 'ежиков миша'), (1, 'елкина анна ивановна'), (2, 'петрова ирина')])
+        index.update([(2, 'петрова ирина олеговна')])
+        rebuilt = search.NameIndex([rows[0], (2, 'петрова ирина олеговна'), rows[2]])
+        for term in ['елкна', 'олеговна', 'петрова ирина', 'ежик', 'анна ив']:
+            self.assertEqual(index.search(term, 5), rebuilt.search(term, 5), term)
+
+
+class BatchTests(TestCase):
+    """Пакет запросов (batch.py): операции выполняются по порядку, каждая в своей транзакции."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='pw', role='Admin')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def batch(self, operations, atomic=False):
+        return self.client.post('/api/batch/', {'atomic': atomic, 'operations': operations}, format='json')
+
+    @staticmethod
+    def add_parent(fname, number):
+        return {'method': 'POST', 'path': '/api/parent/add/', 'body': {
+            'user': {'username': f'batch_parent{number}', 'password': 'batch-password-1', 'role': 'Parent'},
+            'parent': {'fname': fname, 'lname': 'Пакетная', 'phone_number': 84000000000 + number}}}
+
+    def test_exception_rolls_back_operation(self):
+        save = ParentSerializer.save
+
+        def failing_save(serializer, **kwargs):
+            if serializer.initial_data['fname'] == 'Сбой':
+                raise RuntimeError('сбой')
+            return save(serializer, **kwargs)
+
+        with mock.patch.object(ParentSerializer, 'save', failing_save), self.assertLogs('django.request', 'ERROR'):
+            response = self.batch([self.add_parent('Сбой', 1), self.add_parent('Ольга', 2)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']], [500, 201])
+        # Пользователь первой операции создан до исключения и откатился вместе с ней
+        self.assertFalse(User.objects.filter(username='batch_parent1').exists())
+        self.assertTrue(Parent.objects.filter(user__username='batch_parent2').exists())
+
+        with mock.patch.object(ParentSerializer, 'save', failing_save), self.assertLogs('django.request', 'ERROR'):
+            response = self.batch([self.add_parent('Ольга', 3), self.add_parent('Сбой', 4)], atomic=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertFalse(User.objects.filter(username__in=['batch_parent3', 'batch_parent4']).exists())
+
+    def test_reference_substitution(self):
+        response = self.batch([
+            {'id': 'parent', **self.add_parent('Ольга', 1)},
+            {'id': 'read', 'method': 'GET', 'path': '/api/parent/list/{{parent.user_id}}/'},
+            {'method': 'GET', 'path': '/api/parent/list/{{ read.user_id }}/'},
+            {'method': 'GET', 'path': '/api/parent/list/{{parent.missing}}/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], [201, 200, 200, 400])
+        self.assertEqual(results[0]['id'], 'parent')
+        self.assertEqual(results[1]['body']['fname'], 'Ольга')
+        self.assertEqual(results[2]['body']['user_id'], results[0]['body']['user_id'])
+        self.assertIn('missing', results[3]['body']['error'])
+
+        # Строка из одной ссылки подставляется как есть, ссылка внутри строки - как текст
+        results = {'parent': {'status': 201, 'body': {'id': 7, 'children': [{'name': 'Миша'}]}}}
+        self.assertEqual(batch._substitute({'id': '{{parent.id}}', 'path': '/x/{{parent.id}}/',
+                                            'name': ['{{parent.children.0.name}}']}, results),
+                         {'id': 7, 'path': '/x/7/', 'name': ['Миша']})
+        for value in ['{{other.id}}', '{{parent.children.1}}']:
+            with self.assertRaises(batch.BatchError, msg=value):
+                batch._substitute(value, results)
+        with self.assertRaises(batch.BatchError):
+            batch._substitute('{{parent.id}}', {'parent': {'status': 400, 'body': {'id': 7}}})
+
+    def test_atomic_rollback(self):
+        invalid = self.add_parent('Ольга', 2)
+        invalid['body']['parent']['phone_number'] = 1
+        response = self.batch([self.add_parent('Ольга', 1), invalid, self.add_parent('Ольга', 3)], atomic=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 400])
+        self.assertFalse(User.objects.filter(username__startswith='batch_parent').exists())
+
+        response = self.batch([self.add_parent('Ольга', 1), invalid, self.add_parent('Ольга', 3)])
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 400, 201])
+        self.assertEqual(Parent.objects.filter(user__username__startswith='batch_parent').count(), 2)
+
+    def test_invalid_batches(self):
+        child_export = {'method': 'GET', 'path': '/api/child/export/'}
+        too_many = [{'method': 'GET', 'path': '/api/parent/list/'}] * (batch.BATCH_MAX_OPERATIONS + 1)
+        for operations, atomic in [
+            ([{'method': 'POST', 'path': '/api/login/', 'body': {}}], False),
+            ([child_export], False),
+            ([{'method': 'GET', 'path': '/api/calendar/feed.ics'}], False),
+            ([{'method': 'GET', 'path': '/api/unknown/'}], False),
+            ([{'method': 'GET', 'path': '/api/parent/list/'}], True),
+            ([{'id': 'a', **child_export}, {'id': 'a', **child_export}], False),
+            ([], False),
+            (too_many, False),
+        ]:
+            response = self.batch(operations, atomic)
+            self.assertEqual(response.status_code, 400, operations[:1])
+            self.assertIn('error', response.data)
+        self.assertEqual(self.batch(too_many[1:]).status_code, 200)
+
+        # Путь со ссылкой проверяется после подстановки
+        response = self.batch([{'id': 'parent', **self.add_parent('Ольга', 1)},
+                               {'method': 'GET', 'path': '/api/child/export/?parent={{parent.id}}'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][1]['status'], 400)
+        self.assertIn('не поддерживается', response.data['results'][1]['body']['error'])
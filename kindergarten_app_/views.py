@@ -1,15 +1,32 @@
+import os
+
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import transaction
-from .models import User, Employee, Parent, EducationalProgram, Group, Child, ParentsChilds, \
-    AssignedEmployees, QualificationEmployees, ListsEvents, Event, ListParticipants
+from django.db import transaction, connections
+from .models import User, Employee, Parent, EducationalProgram, Group, Child, ParentsChilds, MedicalContraindicationsChild, \
+    AssignedEmployees, QualificationEmployees, ListsEvents, Event, ListParticipants, ParticipantStatus
 from .serializers import UserSerializer, EmployeeSerializer, AssignedEmployeesSerializer, EventSerializer, ListParticipantsSerializer,\
-    ParentSerializer, EducationalProgramSerializer, GroupSerializer, ChildSerializer, MedicalContraindicationsChildSerializer
+    ParentSerializer, EducationalProgramSerializer, GroupSerializer, ChildSerializer, MedicalContraindicationsChildSerializer, \
+    MedicalContraindicationItemSerializer
 from django.shortcuts import get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import condition, require_GET
+from .pagination import paginated_response
+from .fastserializers import serialize_list
+from .streaming import wants_stream, streaming_response
+from .authentication import token_cache
+from .hashing import hashing_pool
+from . import allocation, batch, counters, event_ranges, exports, feeds, ical, roster, search, sync
+from .middleware import registry as query_stats_registry, with_averages
+from .conditional import conditional_view, group_validators, educational_program_validators, event_validators, \
+    child_validators, employee_validators, CHILD_VIEW_ROLES, EVENT_VIEW_ROLES
 
 @api_view(['POST'])
 def register_user(request):
@@ -90,9 +107,15 @@ def list_parents(request):
     if request.user.role != 'Admin':
         return Response({'error': 'Доступ запрещён, требуется роль администратора'}, status=status.HTTP_403_FORBIDDEN)
 
-    parents = Parent.objects.all()
-    serializer = ParentSerializer(parents, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    parents = ParentSerializer.optimize_queryset(Parent.objects.all(), request)
+    if wants_stream(request):
+        return streaming_response(request, parents, ParentSerializer)
+
+    page = paginated_response(request, parents, ParentSerializer)
+    if page is not None:
+        return page
+
+    return Response(serialize_list(request, parents, ParentSerializer), status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -101,9 +124,15 @@ def list_employees(request):
     if request.user.role not in ['Admin', 'Employee']:
         return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
 
-    employees = Employee.objects.all()
-    serializer = EmployeeSerializer(employees, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    employees = EmployeeSerializer.optimize_queryset(Employee.objects.all(), request)
+    if wants_stream(request):
+        return streaming_response(request, employees, EmployeeSerializer)
+
+    page = paginated_response(request, employees, EmployeeSerializer)
+    if page is not None:
+        return page
+
+    return Response(serialize_list(request, employees, EmployeeSerializer), status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -111,8 +140,8 @@ def get_parent_by_user_id(request, user_id):
     if request.user.role not in ['Admin', 'Employee']:
         return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
 
-    parent = get_object_or_404(Parent, user__id=user_id)
-    serializer = ParentSerializer(parent)
+    parent = get_object_or_404(ParentSerializer.optimize_queryset(Parent.objects.all(), request), user__id=user_id)
+    serializer = ParentSerializer(parent, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 @api_view(['PUT', 'PATCH'])
@@ -132,9 +161,10 @@ def edit_parent(request, parent_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_view(employee_validators)
 def get_employee_by_user_id(request, user_id):
-    employee = get_object_or_404(Employee, user__id=user_id)
-    serializer = EmployeeSerializer(employee)
+    employee = get_object_or_404(EmployeeSerializer.optimize_queryset(Employee.objects.all(), request), user__id=user_id)
+    serializer = EmployeeSerializer(employee, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 @api_view(['PUT', 'PATCH'])
@@ -167,9 +197,11 @@ def create_educational_program(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_view(educational_program_validators)
 def get_educational_program_by_id(request, program_id):
-    program = get_object_or_404(EducationalProgram, id=program_id)
-    serializer = EducationalProgramSerializer(program)
+    program = get_object_or_404(
+        EducationalProgramSerializer.optimize_queryset(EducationalProgram.objects.all(), request), id=program_id)
+    serializer = EducationalProgramSerializer(program, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
@@ -190,15 +222,19 @@ def list_groups(request):
     if request.user.role not in ['Admin', 'Employee']:
         return Response({'error': 'Доступ запрещен'}, status=status.HTTP_403_FORBIDDEN)
 
-    groups = Group.objects.all()
-    serializer = GroupSerializer(groups, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    groups = GroupSerializer.optimize_queryset(Group.objects.all(), request)
+    page = paginated_response(request, groups, GroupSerializer)
+    if page is not None:
+        return page
+
+    return Response(serialize_list(request, groups, GroupSerializer), status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_view(group_validators)
 def get_group_by_id(request, group_id):
-    group = get_object_or_404(Group, id=group_id)
-    serializer = GroupSerializer(group)
+    group = get_object_or_404(GroupSerializer.optimize_queryset(Group.objects.all(), request), id=group_id)
+    serializer = GroupSerializer(group, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 @api_view(['PUT', 'PATCH'])
@@ -240,10 +276,12 @@ def add_child(request):
     try:
         parent = Parent.objects.get(id=parent_id)
     except Parent.DoesNotExist:
+        transaction.set_rollback(True)  # ребёнок без родителя не должен попасть в группу и её счётчик
         return Response({'error': 'Родитель с таким id не найден'}, status=status.HTTP_400_BAD_REQUEST)
 
     # Проверяем, что такая связь уникальна, либо создаём новую
     ParentsChilds.objects.get_or_create(parent=parent, child=child)
+    counters.children_enrolled([child.group_id])
 
     # Сохраняем медицинские противопоказания если переданы
     for contraindication_data in contraindications_data:
@@ -255,20 +293,147 @@ def add_child(request):
             transaction.set_rollback(True)
             return Response(contraindication_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    child = ChildSerializer.setup_eager_loading(Child.objects.all()).get(id=child.id)
     output_serializer = ChildSerializer(child)
     return Response(output_serializer.data, status=status.HTTP_201_CREATED)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@transaction.atomic
+def add_children_bulk(request):
+    if request.user.role != 'Admin':
+        return Response({'error': 'Доступ запрещён, требуется роль администратора'}, status=status.HTTP_403_FORBIDDEN)
+
+    items = request.data.get('children')
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'Необходимо передать непустой список children'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Всех родителей проверяем одним запросом
+    parent_ids = set()
+    for item in items:
+        if isinstance(item, dict) and str(item.get('parent_id', '')).isdigit():
+            parent_ids.add(int(item['parent_id']))
+    existing_parent_ids = set(Parent.objects.filter(id__in=parent_ids).values_list('id', flat=True))
+
+    # И уже занятые коды противопоказаний тоже
+    codes = set()
+    for item in items:
+        if isinstance(item, dict):
+            for contraindication_data in item.get('medical_contraindications') or []:
+                if isinstance(contraindication_data, dict) and contraindication_data.get('C'):
+                    codes.add(str(contraindication_data['C']))
+    seen_codes = set(MedicalContraindicationsChild.objects.filter(C__in=codes).values_list('C', flat=True))
+
+    errors = []
+    validated = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'errors': {'error': 'Ожидается объект'}})
+            continue
+
+        item_errors = {}
+        child_serializer = ChildSerializer(data=item.get('child'))
+        if not child_serializer.is_valid():
+            item_errors['child'] = child_serializer.errors
+
+        parent_id = item.get('parent_id')
+        if not parent_id:
+            item_errors['parent_id'] = 'parent_id обязателен'
+        elif not str(parent_id).isdigit() or int(parent_id) not in existing_parent_ids:
+            item_errors['parent_id'] = 'Родитель с таким id не найден'
+
+        contraindications = []
+        contraindication_errors = {}
+        for position, contraindication_data in enumerate(item.get('medical_contraindications') or []):
+            contraindication_serializer = MedicalContraindicationItemSerializer(data=contraindication_data)
+            if not contraindication_serializer.is_valid():
+                contraindication_errors[position] = contraindication_serializer.errors
+            elif contraindication_serializer.validated_data['C'] in seen_codes:
+                contraindication_errors[position] = {'C': ['Такой код уже существует или повторяется в запросе']}
+            else:
+                seen_codes.add(contraindication_serializer.validated_data['C'])
+                contraindications.append(contraindication_serializer.validated_data)
+        if contraindication_errors:
+            item_errors['medical_contraindications'] = contraindication_errors
+
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+        else:
+            validated.append((child_serializer.validated_data, int(parent_id), contraindications))
+
+    if errors:
+        return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    # bulk_create возвращает объекты с id (PostgreSQL, SQLite 3.35+)
+    children = Child.objects.bulk_create(search.fill_search_names([Child(**child_data) for child_data, _, _ in validated]))
+    counters.children_enrolled([child.group_id for child in children])
+    ParentsChilds.objects.bulk_create([
+        ParentsChilds(parent_id=parent_id, child=child)
+        for child, (_, parent_id, _) in zip(children, validated)
+    ])
+    feeds.invalidate_parents([parent_id for _, parent_id, _ in validated])
+    MedicalContraindicationsChild.objects.bulk_create([
+        MedicalContraindicationsChild(child=child, **contraindication_data)
+        for child, (_, _, contraindications) in zip(children, validated)
+        for contraindication_data in contraindications
+    ])
+
+    created = ChildSerializer.setup_eager_loading(Child.objects.filter(id__in=[child.id for child in children]))
+    serializer = ChildSerializer(created.order_by('id'), many=True)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_roster_file(request):
+    # Без transaction.atomic: каждая пачка записывается в своей транзакции, ошибки строк - в отчёте
+    if request.user.role != 'Admin':
+        return Response({'error': 'Доступ запрещён, требуется роль администратора'}, status=status.HTTP_403_FORBIDDEN)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Необходимо передать файл в поле file'}, status=status.HTTP_400_BAD_REQUEST)
+    file_type = request.data.get('file_type') or roster.file_type_from_name(upload.name)
+    if file_type not in roster.FILE_TYPES:
+        return Response({'error': f'Допустимые типы файла: {", ".join(roster.FILE_TYPES)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+
+    # Большие загрузки Django хранит во временном файле, и импорт читает его построчно
+    try:
+        report = roster.import_roster(upload.file, file_type, dry_run=dry_run)
+    except roster.RosterError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(report.as_dict(), status=status.HTTP_200_OK)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_view(child_validators, roles=CHILD_VIEW_ROLES)
 def get_child(request, child_id):
-    if request.user.role not in ['Admin', 'Employee']:
+    if request.user.role not in CHILD_VIEW_ROLES:
         return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
 
-    child = get_object_or_404(Child, id=child_id)
-    serializer = ChildSerializer(child)
+    child = get_object_or_404(ChildSerializer.optimize_queryset(Child.objects.all(), request), id=child_id)
+    serializer = ChildSerializer(child, context={'request': request})
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_children(request):
+    if request.user.role not in ['Admin', 'Employee']:
+        return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
+
+    children = ChildSerializer.optimize_queryset(Child.objects.all(), request)
+    if wants_stream(request):
+        return streaming_response(request, children, ChildSerializer)
+
+    page = paginated_response(request, children, ChildSerializer)
+    if page is not None:
+        return page
+
+    return Response(serialize_list(request, children, ChildSerializer), status=status.HTTP_200_OK)
+
+
 @api_view(['PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
 @transaction.atomic
@@ -276,14 +441,16 @@ def edit_child(request, child_id):
     if request.user.role != 'Admin':
         return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
 
-    child = get_object_or_404(Child, id=child_id)
+    child = get_object_or_404(ChildSerializer.setup_eager_loading(Child.objects.all()), id=child_id)
 
     partial = request.method == 'PATCH'  # поддержка частичного обновления
 
     serializer = ChildSerializer(child, data=request.data, partial=partial)
+    old_group_id = child.group_id
 
     if serializer.is_valid():
         serializer.save()
+        counters.child_transferred(old_group_id, child.group_id)
         return Response(serializer.data)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -318,6 +485,7 @@ def assign_employee_role(request):
         defaults={'role': role},
     )
 
+    assigned = AssignedEmployeesSerializer.setup_eager_loading(AssignedEmployees.objects.all()).get(id=assigned.id)
     serializer = AssignedEmployeesSerializer(assigned)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -368,20 +536,29 @@ def events_by_educational_program(request, educational_program_id):
     except EducationalProgram.DoesNotExist:
         return Response({'error': 'Образовательная программа не найдена'}, status=status.HTTP_404_NOT_FOUND)
 
+    try:
+        start, end = event_ranges.parse_range(request.query_params)
+    except event_ranges.RangeError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
     event_ids = ListsEvents.objects.filter(educational_program=educational_program).values_list('event_id', flat=True)
-    events = Event.objects.filter(id__in=event_ids)
+    events = event_ranges.filter_range(Event.objects.filter(id__in=event_ids), start, end).order_by('date_event', 'id')
+    events = EventSerializer.optimize_queryset(events, request)
+    page = paginated_response(request, events, EventSerializer, ordering=('date_event', 'id'))
+    if page is not None:
+        return page
 
-    serializer = EventSerializer(events, many=True)
-    return Response(serializer.data)
+    return Response(serialize_list(request, events, EventSerializer))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_view(event_validators, roles=EVENT_VIEW_ROLES)
 def get_event(request, event_id):
-    if request.user.role not in ['Parent', 'Employee']:
+    if request.user.role not in EVENT_VIEW_ROLES:
         return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
 
-    event = get_object_or_404(Event, id=event_id)
-    serializer = EventSerializer(event)
+    event = get_object_or_404(EventSerializer.optimize_queryset(Event.objects.all(), request), id=event_id)
+    serializer = EventSerializer(event, context={'request': request})
     return Response(serializer.data)
 
 
@@ -392,7 +569,7 @@ def edit_event(request, event_id):
     if request.user.role != 'Employee':
         return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
 
-    event = get_object_or_404(Event, id=event_id)
+    event = get_object_or_404(EventSerializer.setup_eager_loading(Event.objects.all()), id=event_id)
 
     partial = request.method == 'PATCH'
 
@@ -400,6 +577,9 @@ def edit_event(request, event_id):
 
     if serializer.is_valid():
         serializer.save()
+        if 'capacity' in serializer.validated_data:
+            # Увеличенная вместимость сразу достаётся листу ожидания
+            allocation.schedule_fill([event.id])
         return Response(serializer.data)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -411,29 +591,21 @@ def get_events_by_parent(request):
         return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
 
     try:
-        parent = request.user.parent
-    except AttributeError:
+        start, end = event_ranges.parse_range(request.query_params)
+    except event_ranges.RangeError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Лента берётся из кэша и строится заново, только если изменились дети родителя,
+    # их группы, программы групп или мероприятия программ (см. feeds.py); диапазон выбирается из неё bisect
+    try:
+        events = feeds.get_parent_event_feed(request.user.id, start, end)
+    except Parent.DoesNotExist:
         return Response({'error': 'Родитель не определён'}, status=status.HTTP_400_BAD_REQUEST)
 
-    child_ids = ParentsChilds.objects.filter(parent=parent).values_list('child_id', flat=True)
-    if not child_ids:
+    if events is None:
         return Response({'error': 'У родителя нет детей'}, status=status.HTTP_404_NOT_FOUND)
 
-    group_ids = Child.objects.filter(id__in=child_ids).values_list('group_id', flat=True).distinct()
-
-    # Получаем образовательные программы, связанные с этими группами, если есть связь
-    # Пример для модели ListsEvents с правильным related_name - возможно 'listsevents' или 'listevents_set'
-    educational_program_ids = EducationalProgram.objects.filter(
-        group__id__in=group_ids
-    ).values_list('id', flat=True)
-
-    # В фильтре обратный ключ к Events через field related_name в ListsEvents. Уточните spelling related_name
-    events = Event.objects.filter(
-        listsevents__educational_program__id__in=educational_program_ids
-    ).distinct()
-
-    serializer = EventSerializer(events, many=True)
-    return Response(serializer.data)
+    return Response(events)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -450,16 +622,15 @@ def get_group_by_parent(request):
     if not child_ids:
         return Response({'error': 'У родителя нет детей'}, status=status.HTTP_404_NOT_FOUND)
 
-    groups = Group.objects.filter(child__id__in=child_ids).distinct()
+    groups = GroupSerializer.optimize_queryset(Group.objects.filter(child__id__in=child_ids).distinct(), request)
     if not groups:
         return Response({'error': 'Группы не найдены'}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = GroupSerializer(groups, many=True)
+    serializer = GroupSerializer(groups, many=True, context={'request': request})
     return Response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-@transaction.atomic
 def add_child_to_event_participants(request):
     if request.user.role != 'Parent':
         return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
@@ -468,32 +639,117 @@ def add_child_to_event_participants(request):
     if not parent:
         return Response({'error': 'Родитель не определён'}, status=status.HTTP_400_BAD_REQUEST)
 
+    registrations = request.data.get('registrations')
+    if registrations is not None:
+        return _register_children_batch(parent, registrations)
+
     child_id = request.data.get('child_id')
     event_id = request.data.get('event_id')
 
     if not child_id or not event_id:
         return Response({'error': 'Не переданы необходимые параметры child_id и event_id'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Проверяем, что ребенок принадлежит родителю
-    if not ParentsChilds.objects.filter(parent=parent, child_id=child_id).exists():
-        return Response({'error': 'Ребенок не найден или не принадлежит этому родителю'}, status=status.HTTP_403_FORBIDDEN)
+    if not str(child_id).isdigit() or not str(event_id).isdigit():
+        return Response({'error': 'child_id и event_id должны быть целыми числами'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Проверяем существование мероприятия
-    try:
-        event = Event.objects.get(id=event_id)
-    except Event.DoesNotExist:
-        return Response({'error': 'Мероприятие не найдено'}, status=status.HTTP_404_NOT_FOUND)
+    # Проверки принадлежности ребенка, существования мероприятия и дубликата выполняет сам INSERT;
+    # гонку между параллельными запросами разрешает ограничение unique_together
+    created = _register_and_admit(parent, [(int(child_id), int(event_id))])
 
-    # Проверяем, что такой участник еще не добавлен
-    if ListParticipants.objects.filter(event=event, child_id=child_id).exists():
+    if not created:
+        # Запись не создана - выясняем причину (только для неуспешных запросов)
+        if not ParentsChilds.objects.filter(parent=parent, child_id=child_id).exists():
+            return Response({'error': 'Ребенок не найден или не принадлежит этому родителю'}, status=status.HTTP_403_FORBIDDEN)
+        if not Event.objects.filter(id=event_id).exists():
+            return Response({'error': 'Мероприятие не найдено'}, status=status.HTTP_404_NOT_FOUND)
         return Response({'error': 'Ребенок уже добавлен в список участников мероприятия'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Создаём запись
-    participant = ListParticipants.objects.create(event=event, child_id=child_id)
+    participant = ListParticipantsSerializer.setup_eager_loading(ListParticipants.objects.all()).get(id=created[0][0])
 
     serializer = ListParticipantsSerializer(participant)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+
+def _register_and_admit(parent, pairs):
+    # Транзакция держит строки мероприятий заблокированными (allocation.py), поэтому в неё входят
+    # только вставка и распределение мест, а ответ собирается после фиксации
+    with transaction.atomic():
+        created = ListParticipants.objects.register_for_parent(parent.id, pairs)
+        allocation.admit(created)
+    return created
+
+
+def _register_children_batch(parent, registrations):
+    if not isinstance(registrations, list) or not registrations:
+        return Response({'error': 'registrations должен быть непустым списком'}, status=status.HTTP_400_BAD_REQUEST)
+
+    pairs = []
+    for item in registrations:
+        if not isinstance(item, dict) or not str(item.get('child_id', '')).isdigit() \
+                or not str(item.get('event_id', '')).isdigit():
+            return Response({'error': 'Каждая запись должна содержать целые child_id и event_id'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        pairs.append((int(item['child_id']), int(item['event_id'])))
+
+    created = _register_and_admit(parent, pairs)
+    created_pairs = {(child_id, event_id) for _, event_id, child_id in created}
+
+    skipped = []
+    missing = [pair for pair in dict.fromkeys(pairs) if pair not in created_pairs]
+    if missing:
+        own_child_ids = set(ParentsChilds.objects.filter(
+            parent=parent, child_id__in=[child_id for child_id, _ in missing]
+        ).values_list('child_id', flat=True))
+        existing_event_ids = set(Event.objects.filter(
+            id__in=[event_id for _, event_id in missing]
+        ).values_list('id', flat=True))
+        for child_id, event_id in missing:
+            if child_id not in own_child_ids:
+                error = 'Ребенок не найден или не принадлежит этому родителю'
+            elif event_id not in existing_event_ids:
+                error = 'Мероприятие не найдено'
+            else:
+                error = 'Ребенок уже добавлен в список участников мероприятия'
+            skipped.append({'child_id': child_id, 'event_id': event_id, 'error': error})
+
+    participants = ListParticipantsSerializer.setup_eager_loading(
+        ListParticipants.objects.filter(id__in=[row[0] for row in created])
+    ).order_by('id')
+    serializer = ListParticipantsSerializer(participants, many=True)
+    return Response({'created': serializer.data, 'skipped': skipped},
+                    status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@transaction.atomic
+def cancel_event_participation(request):
+    if request.user.role != 'Parent':
+        return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
+
+    parent = getattr(request.user, 'parent', None)
+    if not parent:
+        return Response({'error': 'Родитель не определён'}, status=status.HTTP_400_BAD_REQUEST)
+
+    child_id = request.data.get('child_id')
+    event_id = request.data.get('event_id')
+
+    if not child_id or not event_id:
+        return Response({'error': 'Не переданы необходимые параметры child_id и event_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not str(child_id).isdigit() or not str(event_id).isdigit():
+        return Response({'error': 'child_id и event_id должны быть целыми числами'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not ParentsChilds.objects.filter(parent=parent, child_id=child_id).exists():
+        return Response({'error': 'Ребенок не найден или не принадлежит этому родителю'}, status=status.HTTP_403_FORBIDDEN)
+
+    participant = ListParticipants.objects.filter(event_id=event_id, child_id=child_id).first()
+    if participant is None:
+        return Response({'error': 'Ребенок не записан на это мероприятие'}, status=status.HTTP_404_NOT_FOUND)
+
+    # Сигнал освобождает место, а после фиксации его получает первый из листа ожидания
+    participant.delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def participants_list_by_event(request, event_id):
@@ -506,8 +762,130 @@ def participants_list_by_event(request, event_id):
         return Response({'error': 'Мероприятие не найдено'}, status=status.HTTP_404_NOT_FOUND)
 
     participants = ListParticipants.objects.filter(event=event)
-    serializer = ListParticipantsSerializer(participants, many=True)
-    return Response(serializer.data)
+    participant_status = request.query_params.get('status')
+    if participant_status:
+        if participant_status not in ParticipantStatus.values:
+            return Response({'error': f'Параметр status должен быть одним из: {", ".join(ParticipantStatus.values)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        participants = participants.filter(status=participant_status)
+    participants = ListParticipantsSerializer.optimize_queryset(participants, request)
+    page = paginated_response(request, participants, ListParticipantsSerializer)
+    if page is not None:
+        return page
+
+    return Response(serialize_list(request, participants, ListParticipantsSerializer))
+
+def _export(request, queryset, columns, filename):
+    try:
+        return exports.export_response(request, queryset, columns, filename)
+    except exports.ExportError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_event_participants(request, event_id):
+    if request.user.role != 'Employee':
+        return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
+
+    if not Event.objects.filter(id=event_id).exists():
+        return Response({'error': 'Мероприятие не найдено'}, status=status.HTTP_404_NOT_FOUND)
+
+    participants = ListParticipants.objects.filter(event_id=event_id).order_by('child__lname', 'child__fname', 'id')
+    return _export(request, participants, exports.PARTICIPANT_COLUMNS, f'event_{event_id}_participants')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_children(request):
+    if request.user.role not in ['Admin', 'Employee']:
+        return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
+
+    children = Child.objects.all()
+    filename = 'children'
+    group_id = request.query_params.get('group')
+    if group_id is not None:
+        if not group_id.isdigit() or not Group.objects.filter(id=group_id).exists():
+            return Response({'error': 'Группа не найдена'}, status=status.HTTP_404_NOT_FOUND)
+        children = children.filter(group_id=group_id)
+        filename = f'group_{group_id}_children'
+    return _export(request, children.order_by('group__name', 'lname', 'fname', 'id'), exports.CHILD_COLUMNS, filename)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_employees(request):
+    if request.user.role not in ['Admin', 'Employee']:
+        return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
+
+    employees = Employee.objects.order_by('lname', 'fname', 'id')
+    return _export(request, employees, exports.EMPLOYEE_COLUMNS, 'employees')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_people(request):
+    if request.user.role not in ['Admin', 'Employee']:
+        return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
+
+    # ?q= - начало или часть ФИО (без учёта регистра и ё/е, с опечатками) или начало номера телефона
+    try:
+        query, kinds, limit = search.parse_params(request.query_params)
+    except search.SearchError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(search.search(request, query, kinds, limit))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    # Изменения с курсора ?cursor= в рамках роли пользователя (см. sync.py)
+    try:
+        data = sync.changes(request, request.query_params.get('cursor'))
+    except sync.CursorError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    except Parent.DoesNotExist:
+        return Response({'error': 'Родитель не определён'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_requests(request):
+    # Операции к маршрутам API одним запросом, при atomic - в одной транзакции (см. batch.py)
+    try:
+        operations, atomic = batch.parse_operations(request.data)
+    except batch.BatchError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    results, failed = batch.execute(request, operations, atomic)
+    if failed is not None:
+        return Response({'error': f'Операция {failed} завершилась ошибкой, изменения пакета отменены',
+                         'failed': failed, 'results': results}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': results})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def calendar_token(request):
+    if request.user.role not in ical.ICAL_ROLES:
+        return Response({'error': 'Доступ запрещён'}, status=status.HTTP_403_FORBIDDEN)
+
+    # Ссылка действует до смены пароля
+    token = ical.calendar_token(request.user)
+    url = request.build_absolute_uri(f"{reverse('calendar_feed')}?{urlencode({'token': token})}")
+    return Response({'token': token, 'url': url})
+
+# Календарные приложения не передают заголовков авторизации - доступ по токену из ссылки (см. ical.py)
+@require_GET
+@condition(etag_func=ical.calendar_etag)
+def calendar_feed(request):
+    try:
+        feed = ical.calendar_feed(request)
+    except event_ranges.RangeError as error:
+        return JsonResponse({'error': str(error)}, status=400, json_dumps_params={'ensure_ascii': False})
+    if feed is None:
+        return JsonResponse({'error': 'Календарь не найден'}, status=404, json_dumps_params={'ensure_ascii': False})
+
+    response = StreamingHttpResponse(feed.chunks(), content_type=ical.ICAL_CONTENT_TYPE)
+    patch_cache_control(response, private=True, max_age=ical.ICAL_MAX_AGE)
+    return response
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -543,4 +921,28 @@ def logout_view(request):
         token.delete()
         return Response({'message': 'Вы успешно вышли из аккаунта'}, status=status.HTTP_200_OK)
     except Token.DoesNotExist:
-        return Response({'error': 'Токен не найден'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'error': 'Токен не найден'}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def query_stats(request):
+    if request.user.role != 'Admin':
+        return Response({'error': 'Доступ запрещён, требуется роль администратора'}, status=status.HTTP_403_FORBIDDEN)
+
+    # Статистика текущего процесса; по всем процессам - manage.py query_stats
+    return Response({
+        'pid': os.getpid(),
+        'endpoints': with_averages(query_stats_registry.snapshot()),
+        'token_cache': token_cache.stats(),
+        'hashing_pool': hashing_pool.stats(),
+        'db_pools': _db_pool_stats(),
+    })
+
+
+def _db_pool_stats():
+    # Статистика пула psycopg (DB_POOL=1) по каждой базе; None, если пул не настроен
+    stats = {}
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        stats[connection.alias] = pool.get_stats() if pool is not None else None
+    return stats
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'kindergarten_app_.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,14 +80,60 @@ WSGI_APPLICATION = 'kindergarten_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Параметры берутся из переменных окружения, значения по умолчанию - для локальной разработки
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'kindergarten_KP',      # имя базы данных
-        'USER': 'postgres',      # имя пользователя
-        'PASSWORD': '70esadel', # пароль пользователя
-        'HOST': 'localhost',         # сервер базы (localhost или IP)
-        'PORT': '5432',              # порт PostgreSQL (по умолчанию 5432)
+        'NAME': os.environ.get('DB_NAME', 'kindergarten_KP'),      # имя базы данных
+        'USER': os.environ.get('DB_USER', 'postgres'),      # имя пользователя
+        'PASSWORD': os.environ.get('DB_PASSWORD', '70esadel'), # пароль пользователя
+        'HOST': os.environ.get('DB_HOST', 'localhost'),         # сервер базы (localhost или IP)
+        'PORT': os.environ.get('DB_PORT', '5432'),              # порт PostgreSQL (по умолчанию 5432)
+        # Постоянные соединения: секунды жизни соединения (0 - новое соединение на каждый запрос)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        # Проверять постоянное соединение перед повторным использованием
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+    }
+}
+
+# DB_POOL=1 - пул соединений psycopg (пакет psycopg[pool]). Пул заменяет постоянные соединения,
+# поэтому CONN_MAX_AGE при нём всегда 0: закрытое Django соединение возвращается в пул.
+# Каждый процесс держит свой пул, всего соединений до DB_POOL_MAX_SIZE * число процессов.
+# Проверку соединения при выдаче из пула Django включает по CONN_HEALTH_CHECKS.
+if os.environ.get('DB_POOL') == '1':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Сколько секунд ждать свободное соединение, прежде чем запрос завершится ошибкой
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            # Лишние простаивающие соединения закрываются через max_idle, любые - через max_lifetime
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+        },
+    }
+
+# DB_ENGINE=sqlite - локальная база SQLite без PostgreSQL (например, для manage.py benchmark_api)
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Ленты мероприятий родителей (kindergarten_app_/feeds.py) хранятся в кэше. Локальный кэш
+# подходит для одного процесса; при нескольких воркерах нужен общий бэкенд (Redis, Memcached),
+# иначе сброс ленты в одном воркере не увидят остальные.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
@@ -132,8 +181,30 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'kindergarten_app_.authentication.CachedTokenAuthentication',
     ],
 }
 
+# Статистика SQL по эндпоинтам (kindergarten_app_.middleware.QueryStatsMiddleware).
+# SAMPLE_RATE - доля учитываемых запросов; DIR - куда процессы сбрасывают статистику
+# раз в FLUSH_INTERVAL секунд для команды manage.py query_stats
+QUERY_STATS = {
+    'SAMPLE_RATE': 1.0 if DEBUG else 0.05,
+    'DIR': Path(tempfile.gettempdir()) / 'kindergarten_query_stats',
+    'FLUSH_INTERVAL': 30,
+}
+
+# Кэш токенов в памяти процесса: размер (число токенов) и время жизни записи в секундах
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+}
+
+# Пул потоков для хеширования паролей в асинхронных views (api/async/...):
+# WORKERS - число потоков (по умолчанию число CPU), MAX_QUEUE - максимум задач в пуле, сверх него ответ 503
+PASSWORD_HASHING_POOL = {
+    'WORKERS': int(os.environ.get('HASHING_POOL_WORKERS', 0)) or None,
+    'MAX_QUEUE': int(os.environ.get('HASHING_POOL_MAX_QUEUE', 64)),
+}
+
 AUTH_USER_MODEL = 'kindergarten_app_.User'
@@ -17,10 +17,15 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from kindergarten_app_.views import register_user, user_login, add_employee, get_educational_program_by_id, \
-    add_parent, list_parents, list_employees, get_parent_by_user_id, create_group, edit_parent, add_child, logout_view,\
+    add_parent, list_parents, list_employees, get_parent_by_user_id, create_group, edit_parent, add_child, add_children_bulk, logout_view,\
     get_employee_by_user_id, create_educational_program, list_groups, get_group_by_id, edit_group, edit_employee, \
-    get_child, edit_child, assign_employee_role, add_event, participants_list_by_event, change_password,\
-    events_by_educational_program, get_event, edit_event, get_events_by_parent, get_group_by_parent, add_child_to_event_participants
+    get_child, list_children, edit_child, assign_employee_role, add_event, participants_list_by_event, change_password,\
+    events_by_educational_program, get_event, edit_event, get_events_by_parent, get_group_by_parent, add_child_to_event_participants, \
+    query_stats, import_roster_file, export_children, export_event_participants, export_employees, calendar_token, \
+    calendar_feed, sync_changes, search_people, cancel_event_participation, batch_requests
+from kindergarten_app_.async_views import register_user_async, user_login_async, change_password_async, \
+    list_groups_async, get_event_async, get_events_by_parent_async, get_group_by_parent_async, \
+    participants_list_by_event_async
 
 
 urlpatterns = [
@@ -32,6 +37,7 @@ urlpatterns = [
     path('api/parent/list/', list_parents, name='list_parents'),
     path('api/parent/edit/<int:parent_id>/', edit_parent, name='edit_parent'),
     path('api/employee/list/', list_employees, name='list_employees'),
+    path('api/employee/export/', export_employees, name='export_employees'),
     path('api/employee/list/<int:user_id>/', get_employee_by_user_id, name='get_employee_by_user_id'),
     path('api/employee/edit/<int:employee_id>/', edit_employee, name='edit_employee'),
     path('api/parent/list/<int:user_id>/', get_parent_by_user_id, name='get_parent_by_user_id'),
@@ -42,7 +48,11 @@ urlpatterns = [
     path('api/group/<int:group_id>/', get_group_by_id, name='get_group_by_id'),
     path('api/group/edit/<int:group_id>/', edit_group, name='edit_group'),
     path('api/child/add/', add_child, name='add_child'),
+    path('api/child/bulk_add/', add_children_bulk, name='add_children_bulk'),
+    path('api/child/import/', import_roster_file, name='import_roster_file'),
+    path('api/child/export/', export_children, name='export_children'),
     path('api/child/<int:child_id>/', get_child, name='get_child'),
+    path('api/child/list/', list_children, name='list_children'),
     path('api/child/edit/<int:child_id>/', edit_child, name='edit_child'),
     path('api/group/role/', assign_employee_role, name='assign_employee_role'),
     path('api/event/add/', add_event, name='create_event'),
@@ -52,9 +62,27 @@ urlpatterns = [
     path('api/events/group/', get_events_by_parent, name='events_by_parent_children_groups'),
     path('api/groups/children/', get_group_by_parent, name='group_info_by_parent_children'),
     path('api/event_participants/add/', add_child_to_event_participants, name='add_child_to_additional_event'),
+    path('api/event_participants/cancel/', cancel_event_participation, name='cancel_event_participation'),
     path('api/event/<int:event_id>/participants/', participants_list_by_event, name='participants_list_by_event'),
+    path('api/event/<int:event_id>/participants/export/', export_event_participants,
+         name='export_event_participants'),
+    path('api/batch/', batch_requests, name='batch'),
+    path('api/search/', search_people, name='search_people'),
+    path('api/sync/', sync_changes, name='sync_changes'),
+    path('api/calendar/token/', calendar_token, name='calendar_token'),
+    path('api/calendar/feed.ics', calendar_feed, name='calendar_feed'),
     path('api/change-password/', change_password, name='change_password'),
     path('api/logout/', logout_view, name='logout'),
+    path('api/stats/queries/', query_stats, name='query_stats'),
+    path('api/async/register/', register_user_async, name='register_async'),
+    path('api/async/login/', user_login_async, name='login_async'),
+    path('api/async/change-password/', change_password_async, name='change_password_async'),
+    path('api/async/group/list/', list_groups_async, name='list_groups_async'),
+    path('api/async/event/<int:event_id>/', get_event_async, name='view_event_by_id_for_parent_async'),
+    path('api/async/events/group/', get_events_by_parent_async, name='events_by_parent_children_groups_async'),
+    path('api/async/groups/children/', get_group_by_parent_async, name='group_info_by_parent_children_async'),
+    path('api/async/event/<int:event_id>/participants/', participants_list_by_event_async,
+         name='participants_list_by_event_async'),
 
 
 ]